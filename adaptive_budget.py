@@ -0,0 +1,124 @@
+# adaptive_budget.py - Learn max_tokens and timeouts from recorded completion lengths and latencies
+#
+# Call sites start from a static guess (e.g. layout's 1500/1800/2500 tokens by table count).
+# Once a task has enough samples for a prompt-size bucket, max_tokens becomes the p95
+# completion length plus a margin, raised past any recent truncation, and the timeout
+# becomes the p95 latency times a margin - never above the static guess, so slots held
+# for a stuck call are released sooner. Timed-out calls count at their full timeout,
+# which pushes the learned timeout back up when it was cut too far.
+
+import os
+import math
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Learned budgets are rounded up to this step so cache keys (which include max_tokens) stay stable
+TOKEN_STEP = 128
+# Prompt sizes are grouped in half-octave buckets: 1024, 1448, 2048, 2896, ...
+MIN_BUCKET_TOKENS = 256
+
+
+class _Sample(NamedTuple):
+    completion_tokens: int
+    latency_seconds: float
+    max_tokens: int
+    truncated: bool
+    timed_out: bool
+
+
+def bucket(prompt_tokens: int) -> int:
+    """Upper bound of the half-octave prompt-size bucket holding `prompt_tokens`"""
+    tokens = max(MIN_BUCKET_TOKENS, prompt_tokens)
+    return int(round(2 ** (math.ceil(math.log2(tokens) * 2) / 2)))
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class AdaptiveBudgets:
+    """Per (task, prompt-size bucket) completion and latency history that sizes the next call"""
+
+    def __init__(self, tasks: Iterable[str], percentile: float = 95.0, token_margin: float = 1.25,
+                 truncation_growth: float = 1.5, timeout_margin: float = 2.0, min_timeout: float = 30.0,
+                 min_samples: int = 5, window: int = 200, enabled: bool = True):
+        self.tasks = set(tasks)
+        self.percentile = percentile
+        self.token_margin = token_margin
+        self.truncation_growth = truncation_growth
+        self.timeout_margin = timeout_margin
+        self.min_timeout = min_timeout
+        self.min_samples = min_samples
+        self.window = window
+        self.enabled = enabled
+        self._samples: Dict[Tuple[str, int], Deque[_Sample]] = {}
+        self.suggestions = {"learned": 0, "default": 0}
+
+    def tracks(self, task: Optional[str]) -> bool:
+        return self.enabled and (task or "default") in self.tasks
+
+    def observe(self, task: Optional[str], prompt_tokens: int, completion_tokens: int, latency_seconds: float,
+                max_tokens: int, finish_reason: Optional[str] = None, timed_out: bool = False):
+        if not self.tracks(task):
+            return
+        key = (task or "default", bucket(prompt_tokens))
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(_Sample(
+            completion_tokens, latency_seconds, max_tokens, finish_reason == "length", timed_out
+        ))
+
+    def suggest(self, task: Optional[str], prompt_tokens: int, max_tokens: int, timeout: float,
+                minimum: int = 0) -> Tuple[int, float]:
+        """(max_tokens, timeout) for the next call; the given defaults until the bucket has history.
+
+        `minimum` is a floor the caller knows the answer needs (e.g. DDL -> JSON never shrinks).
+        """
+        samples = self._samples.get((task or "default", bucket(prompt_tokens)), ()) if self.tracks(task) else ()
+        finished = [s for s in samples if not s.timed_out]
+        if len(finished) < self.min_samples:
+            self.suggestions["default"] += 1
+            return max_tokens, timeout
+        self.suggestions["learned"] += 1
+
+        tokens = _percentile([s.completion_tokens for s in finished], self.percentile) * self.token_margin
+        truncated = [s.max_tokens for s in finished if s.truncated]
+        if truncated:
+            # p95 of cut-off answers understates what they needed
+            tokens = max(tokens, max(truncated) * self.truncation_growth)
+        learned_tokens = int(math.ceil(max(tokens, minimum) / TOKEN_STEP) * TOKEN_STEP)
+
+        latency = _percentile([s.latency_seconds for s in samples], self.percentile) * self.timeout_margin
+        learned_timeout = min(timeout, max(self.min_timeout, round(latency, 1)))
+        return learned_tokens, learned_timeout
+
+    def stats(self) -> Dict[str, Any]:
+        buckets = {}
+        for (task, size), samples in sorted(self._samples.items()):
+            finished = [s for s in samples if not s.timed_out]
+            buckets[f"{task}:{size}"] = {
+                "samples": len(samples),
+                "p95_completion_tokens": _percentile([s.completion_tokens for s in finished], 95) if finished else None,
+                "p95_latency_seconds": round(_percentile([s.latency_seconds for s in samples], 95), 3),
+                "truncated": sum(s.truncated for s in samples),
+                "timed_out": sum(s.timed_out for s in samples),
+            }
+        return {"enabled": self.enabled, "tasks": sorted(self.tasks), "suggestions": dict(self.suggestions),
+                "buckets": buckets}
+
+
+def build_adaptive_budgets_from_env() -> AdaptiveBudgets:
+    return AdaptiveBudgets(
+        tasks=[t.strip() for t in os.getenv("ADAPTIVE_BUDGET_TASKS", "layout,data_model,ddl_chunk").split(",") if t.strip()],
+        percentile=float(os.getenv("ADAPTIVE_BUDGET_PERCENTILE", "95")),
+        token_margin=float(os.getenv("ADAPTIVE_BUDGET_TOKEN_MARGIN", "1.25")),
+        timeout_margin=float(os.getenv("ADAPTIVE_BUDGET_TIMEOUT_MARGIN", "2.0")),
+        min_timeout=float(os.getenv("ADAPTIVE_BUDGET_MIN_TIMEOUT_SECONDS", "30")),
+        min_samples=int(os.getenv("ADAPTIVE_BUDGET_MIN_SAMPLES", "5")),
+        enabled=os.getenv("ADAPTIVE_BUDGET_ENABLED", "true").lower() in ("1", "true", "yes"),
+    )
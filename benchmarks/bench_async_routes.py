@@ -0,0 +1,105 @@
+# benchmarks/bench_async_routes.py
+"""
+Concurrency benchmark for the async LLM call layer in main.py.
+
+Fires N parallel /api/v1/parse-unstructured-kpis requests at the FastAPI app
+in-process and compares the wall time against a single request. The upstream
+completion is replaced by a fixed-latency coroutine so the numbers only reflect
+how well requests overlap on one event loop.
+
+Usage:
+    python benchmarks/bench_async_routes.py --requests 8 --latency 2.0
+"""
+
+import os
+import sys
+import json
+import logging
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import httpx
+import main
+import llm_gateway
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+KPI_REPLY = json.dumps({
+    "kpi_list": [{"name": "Net Sales", "description": "Total sales after returns"}],
+    "parsing_notes": "benchmark"
+})
+
+
+class FakeStream:
+    """Minimal stand-in for openai's AsyncStream: one content chunk, then the finish"""
+
+    def __init__(self, text: str):
+        self.chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text), finish_reason=None)], usage=None),
+            SimpleNamespace(choices=[SimpleNamespace(delta=None, finish_reason="stop")], usage=None),
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def install_fake_completion(latency: float):
+    """Replace the upstream completion with a coroutine that only sleeps"""
+    async def fake_create(**kwargs):
+        await asyncio.sleep(latency)
+        return FakeStream(KPI_REPLY)
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    llm_gateway.get_async_client = lambda: fake_client
+
+
+async def run_batch(n: int) -> float:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        # Distinct notes per request so single-flight coalescing doesn't merge them
+        payloads = [{"notes_text": f"Net sales should be at least $2M monthly (store {i})"} for i in range(n)]
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            http.post("/api/v1/parse-unstructured-kpis", json=payload) for payload in payloads
+        ])
+        elapsed = time.perf_counter() - start
+    failed = [r.status_code for r in responses if r.status_code != 200]
+    if failed:
+        raise SystemExit(f"Benchmark requests failed: {failed}")
+    return elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=8, help="number of parallel requests")
+    parser.add_argument("--latency", type=float, default=2.0, help="simulated upstream latency in seconds")
+    args = parser.parse_args()
+
+    install_fake_completion(args.latency)
+
+    single = asyncio.run(run_batch(1))
+    parallel = asyncio.run(run_batch(args.requests))
+
+    print(f"1 request:            {single:.2f}s")
+    print(f"{args.requests} parallel requests: {parallel:.2f}s")
+    print(f"overlap ratio:        {parallel / single:.2f}x the time of one (ideal: 1.00x, blocking: {args.requests:.2f}x)")
+
+
+if __name__ == "__main__":
+    main_cli()
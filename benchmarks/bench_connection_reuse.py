@@ -0,0 +1,130 @@
+# benchmarks/bench_connection_reuse.py
+"""
+Connection reuse benchmark for llm_gateway.
+
+Times N sequential chat completions three ways:
+  - fresh:   requests.post per call (the old layout_router path)
+  - client:  a new OpenAI client per call (the old per-module client pattern)
+  - gateway: llm_gateway.chat_sync on the shared keep-alive pool
+
+By default the calls go to a local HTTP/1.1 server that answers instantly, so
+the difference is pure connection setup; the server also counts how many TCP
+connections each mode opened. Point --base-url at a real HTTPS endpoint to
+include TLS handshakes (needs a real OPENAI_API_KEY).
+
+Usage:
+    python benchmarks/bench_connection_reuse.py --calls 50
+    python benchmarks/bench_connection_reuse.py --calls 10 --base-url https://api.openai.com/v1 --model gpt-4o-mini
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+}
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    connections = set()
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; don't let Nagle hold the body back
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        CompletionHandler.connections.add(self.client_address)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps(COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_local_server() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def timed(n: int, call) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        call(i)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call connections with the pooled gateway")
+    parser.add_argument("--calls", type=int, default=50, help="sequential calls per mode")
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible base URL (default: local stub)")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    args = parser.parse_args()
+
+    local = args.base_url is None
+    base_url = start_local_server() if local else args.base_url.rstrip("/")
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+    import requests
+    from openai import OpenAI
+    import llm_gateway
+
+    api_key = os.environ["OPENAI_API_KEY"]
+
+    def messages(i):
+        return [{"role": "user", "content": f"ping {i}"}]
+
+    def fresh(i):
+        response = requests.post(
+            f"{base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {api_key}", "Connection": "close"},
+            json={"model": args.model, "messages": messages(i), "max_tokens": 5},
+            timeout=60,
+        )
+        response.raise_for_status()
+
+    def per_call_client(i):
+        with OpenAI(api_key=api_key, base_url=base_url, max_retries=0) as client:
+            client.chat.completions.create(model=args.model, messages=messages(i), max_tokens=5)
+
+    def gateway(i):
+        llm_gateway.chat_sync(messages(i), model=args.model, max_tokens=5, use_cache=False)
+
+    print(f"{args.calls} sequential calls against {base_url}")
+    for name, call in [("fresh", fresh), ("client", per_call_client), ("gateway", gateway)]:
+        call(-1)  # Warm imports; the gateway pool opens its connection here
+        CompletionHandler.connections.clear()
+        elapsed = timed(args.calls, call)
+        line = f"{name:<8} {elapsed:7.3f}s total  {elapsed / args.calls * 1000:7.2f} ms/call"
+        if local:
+            line += f"  {len(CompletionHandler.connections):3d} connections"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_hedging.py
+"""
+Tail-latency benchmark for hedged LLM requests.
+
+Runs the same batch of layout-sized completions through llm_gateway.chat twice
+against the offline stand-in's "stragglers" profile (healthy median, rare 20x
+slow requests): once without hedging and once with it. Prints p50/p95/p99 and
+the gateway's hedge stats so the latency win can be weighed against the extra
+upstream calls.
+
+Usage:
+    python benchmarks/bench_hedging.py --requests 200 --concurrency 8 --time-scale 0.05
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_standin_load import free_port, percentile, start_standin
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def run_batch(gateway, n: int, concurrency: int, hedge: bool, tag: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        messages = [
+            {"role": "system", "content": "You are an AI expert in BI dashboards for Power BI."},
+            {"role": "user", "content": f"Layout request {tag}-{i}"},
+        ]
+        async with semaphore:
+            start = time.perf_counter()
+            await gateway.chat(messages, task="layout", max_tokens=300, use_cache=False, hedge=hedge)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[one(i) for i in range(n)])
+    return latencies
+
+
+def report(label: str, latencies):
+    print(f"{label:<10} p50 {percentile(latencies, 50):6.2f}s  p95 {percentile(latencies, 95):6.2f}s  "
+          f"p99 {percentile(latencies, 99):6.2f}s  max {max(latencies):6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tail latency with and without hedged requests")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--time-scale", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    port = free_port()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-standin")
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+    os.environ.setdefault("LLM_TPM_LIMIT", "10000000")
+    os.environ.setdefault("LLM_RPM_LIMIT", "100000")
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(args.concurrency * 2))
+    os.environ.setdefault("LLM_HEDGE_MIN_SAMPLES", "20")
+    os.environ.setdefault("LLM_HEDGE_MIN_DELAY", "0")
+
+    standin = start_standin(port)
+    standin.settings.update({"profile": "stragglers", "time_scale": args.time_scale})
+    import llm_gateway
+
+    async def both():
+        standin.rng.seed(args.seed)
+        plain = await run_batch(llm_gateway, args.requests, args.concurrency, hedge=False, tag="plain")
+        # Warm the TTFT tracker, then measure with a fresh seed so both runs see the same stragglers
+        await run_batch(llm_gateway, 30, args.concurrency, hedge=True, tag="warmup")
+        for key in ("calls", "hedged", "hedge_wins", "primary_wins", "skipped_over_budget"):
+            setattr(llm_gateway.hedger, key, 0)
+        standin.rng.seed(args.seed)
+        upstream_before = standin.counters["requests"]
+        hedged = await run_batch(llm_gateway, args.requests, args.concurrency, hedge=True, tag="hedged")
+        return plain, hedged, standin.counters["requests"] - upstream_before
+
+    plain, hedged, upstream_calls = asyncio.run(both())
+    report("no hedge", plain)
+    report("hedged", hedged)
+    stats = llm_gateway.hedger.stats()
+    print(f"\nhedged {stats['hedged']}/{stats['calls']} calls (rate {stats['hedge_rate']}), "
+          f"hedge wins {stats['hedge_wins']}, primary wins {stats['primary_wins']}, "
+          f"upstream calls {upstream_calls} for {args.requests} requests, thresholds {stats['thresholds_seconds']}")
+
+
+if __name__ == "__main__":
+    main()
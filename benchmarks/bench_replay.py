@@ -0,0 +1,146 @@
+# benchmarks/bench_replay.py
+"""
+Overhead benchmark for main.py with the model taken out of the timing.
+
+Drives the retail_cpg_sales test case (generate-model, parse-unstructured-kpis,
+generate-layout, data prep, generate-sprint) through the FastAPI app in-process.
+
+  --record PATH   run against the live provider (or --standin) and save every
+                  LLM exchange to the cassette at PATH
+  --replay PATH   serve the LLM from the cassette; with --latency-scale 0 the
+                  timings are pure app overhead (prompt building, JSON repair,
+                  tidy_md, sprint distribution), reproducible and offline
+
+Usage:
+    python benchmarks/bench_replay.py --record cassettes/retail_cpg_sales.jsonl --standin
+    python benchmarks/bench_replay.py --replay cassettes/retail_cpg_sales.jsonl --iterations 20
+    python benchmarks/bench_replay.py --replay cassettes/retail_cpg_sales.jsonl --latency-scale 1
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+CASE_DIR = os.path.join(ROOT, "test_cases", "retail_cpg_sales")
+DDL_FILES = ["01_products.sql", "02_customers.sql", "03_stores.sql",
+             "04_sales_transactions.sql", "05_inventory_movements.sql"]
+
+
+def read_case(name: str) -> str:
+    with open(os.path.join(CASE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def load_scenario():
+    """Request bodies built from the retail_cpg_sales files"""
+    kpis = json.loads(read_case("kpis.json"))["kpi_definitions"]
+    kpi_list = [{"name": k["kpi_name"], "description": k["description"], "calculation": k["calculation"]}
+                for k in kpis]
+    return {
+        "ddl": [read_case(os.path.join("ddl", name)) for name in DDL_FILES],
+        "relationships": read_case(os.path.join("ddl", "06_relationships.sql")),
+        "kpi_notes": "\n".join(f"{k['kpi_name']}: {k['description']} ({k['calculation']}, target {k['typical_target']})"
+                               for k in kpis),
+        "kpi_list": kpi_list,
+        "data_model": json.loads(read_case("data_model.json")),
+        "wireframe": read_case("wireframe_description.txt"),
+    }
+
+
+async def run_once(http, scenario, timings):
+    async def post(name, path, body):
+        start = time.perf_counter()
+        response = await http.post(path, json=body)
+        timings.setdefault(name, []).append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise SystemExit(f"{name} failed with {response.status_code}: {response.text[:300]}")
+        return response.json()
+
+    model = await post("generate-model", "/api/v1/generate-model",
+                       {"tables_sql": scenario["ddl"], "relationships_sql": scenario["relationships"]})
+    await post("parse-unstructured-kpis", "/api/v1/parse-unstructured-kpis", {"notes_text": scenario["kpi_notes"]})
+    layout = await post("generate-layout", "/api/v1/generate-layout", {
+        "sketch_description": scenario["wireframe"], "platform_selected": "Tableau",
+        "model_metadata": model["data_model"], "kpi_list": scenario["kpi_list"],
+    })
+    await post("data-prep", "/api/v1/generate-layout", {
+        "sketch_description": scenario["wireframe"], "platform_selected": "Tableau",
+        "model_metadata": scenario["data_model"], "data_prep_only": True,
+    })
+    await post("generate-sprint", "/api/v1/generate-sprint", {
+        "wireframe_json": {"description": scenario["wireframe"][:500]},
+        "layout_instructions": layout["layout_instructions"], "sprint_length_days": 10, "velocity": 24,
+    })
+
+
+async def run(args):
+    import httpx
+    import main
+
+    scenario = load_scenario()
+    timings = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        for _ in range(args.iterations):
+            await run_once(http, scenario, timings)
+
+    upstream = {}
+    for record in main.llm_gateway.metrics._records:
+        upstream.setdefault(record.endpoint, []).append(record.latency_seconds)
+
+    print(f"{'step':<26} {'n':>4} {'avg':>9} {'min':>9}")
+    for name, values in timings.items():
+        print(f"{name:<26} {len(values):>4} {sum(values) / len(values) * 1000:>7.1f}ms {min(values) * 1000:>7.1f}ms")
+    total_upstream = sum(sum(v) for v in upstream.values())
+    total = sum(sum(v) for v in timings.values())
+    print(f"\nend-to-end {total:.2f}s, of which LLM transport {total_upstream:.2f}s")
+    print(f"transport: {main.llm_gateway.transports.stats()}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--record", metavar="PATH", help="record LLM exchanges to this cassette")
+    mode.add_argument("--replay", metavar="PATH", help="serve LLM exchanges from this cassette")
+    parser.add_argument("--iterations", type=int, help="scenario runs (default: 1 when recording, 5 when replaying)")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="replay delay: 0 instant, 1 as recorded")
+    parser.add_argument("--standin", action="store_true", help="record against llm_standin.py instead of OpenAI")
+    args = parser.parse_args()
+
+    if args.record:
+        args.iterations = args.iterations or 1
+        os.environ.update({"LLM_TRANSPORT": "record", "LLM_CASSETTE": args.record})
+        if os.path.exists(args.record):
+            os.remove(args.record)  # A fresh cassette per recording run
+    else:
+        args.iterations = args.iterations or 5
+        os.environ.update({"LLM_TRANSPORT": "replay", "LLM_CASSETTE": args.replay,
+                           "LLM_REPLAY_LATENCY_SCALE": str(args.latency_scale)})
+    os.environ.setdefault("OPENAI_API_KEY", "sk-replay")
+    # Every iteration must reach the transport, and our own pacing isn't what we're measuring
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+    os.environ.setdefault("LLM_TPM_LIMIT", "10000000")
+    os.environ.setdefault("LLM_RPM_LIMIT", "100000")
+    os.environ.setdefault("LLM_METRICS_LOG", "false")
+
+    if args.standin:
+        from bench_standin_load import free_port, start_standin
+        port = free_port()
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+        standin = start_standin(port)
+        standin.settings.update({"profile": "per-model", "time_scale": 0.1})
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
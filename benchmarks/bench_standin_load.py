@@ -0,0 +1,156 @@
+# benchmarks/bench_standin_load.py
+"""
+Throughput and tail-latency benchmark for main.py against the offline stand-in.
+
+Starts llm_standin.py on a local port, points llm_gateway at it through
+OPENAI_BASE_URL and drives a mix of generate-model, generate-layout,
+generate-sprint and parse-unstructured-kpis requests at the FastAPI app
+in-process. Prints p50/p95/p99 per endpoint plus overall throughput. The
+stand-in is seeded, so runs with the same arguments are reproducible.
+
+Usage:
+    python benchmarks/bench_standin_load.py --requests 40 --concurrency 8 --profile per-model --time-scale 0.1
+    python benchmarks/bench_standin_load.py --rate-limit-rate 0.2 --truncate-rate 0.1
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+DDL = [
+    "CREATE TABLE customer (customer_id INT PRIMARY KEY, name VARCHAR(100), email VARCHAR(200));",
+    "CREATE TABLE orders (order_id INT PRIMARY KEY, customer_id INT REFERENCES customer(customer_id), "
+    "order_date DATE NOT NULL, amount DECIMAL);",
+]
+
+LAYOUT_INSTRUCTIONS = "## KPI Card\n1. Total Sales card\n\n## Line Chart\n1. Sales over time"
+
+
+def payload_for(endpoint: str, i: int) -> dict:
+    # The index keeps payloads distinct so cache and single-flight don't hide upstream latency
+    if endpoint == "/api/v1/generate-model":
+        return {"tables_sql": DDL + [f"CREATE TABLE bench_{i} (id INT PRIMARY KEY);"], "relationships_sql": ""}
+    if endpoint == "/api/v1/generate-layout":
+        return {"sketch_description": f"KPI cards on top, sales trend below (variant {i})",
+                "platform_selected": "Power BI"}
+    if endpoint == "/api/v1/generate-sprint":
+        return {"wireframe_json": {"variant": i}, "layout_instructions": f"{LAYOUT_INSTRUCTIONS} (variant {i})",
+                "sprint_length_days": 10, "velocity": 20}
+    return {"notes_text": f"Net sales should be at least $2M monthly; margin above 30% (region {i})"}
+
+
+ENDPOINTS = [
+    "/api/v1/generate-model",
+    "/api/v1/generate-layout",
+    "/api/v1/generate-sprint",
+    "/api/v1/parse-unstructured-kpis",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_standin(port: int):
+    import uvicorn
+    import llm_standin
+
+    server = uvicorn.Server(uvicorn.Config(llm_standin.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return llm_standin
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+async def run(args):
+    import httpx
+    import main
+
+    latencies = {endpoint: [] for endpoint in ENDPOINTS}
+    failures = {endpoint: 0 for endpoint in ENDPOINTS}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        async def one(i: int):
+            endpoint = ENDPOINTS[i % len(ENDPOINTS)]
+            async with semaphore:
+                start = time.perf_counter()
+                response = await http.post(endpoint, json=payload_for(endpoint, i))
+                latencies[endpoint].append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    failures[endpoint] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(args.requests)])
+        elapsed = time.perf_counter() - start
+
+    print(f"{'endpoint':<34} {'n':>4} {'fail':>5} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint in ENDPOINTS:
+        values = latencies[endpoint]
+        print(f"{endpoint:<34} {len(values):>4} {failures[endpoint]:>5} "
+              f"{percentile(values, 50):>7.2f}s {percentile(values, 95):>7.2f}s {percentile(values, 99):>7.2f}s")
+    print(f"\n{args.requests} requests in {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s, concurrency {args.concurrency})")
+    return main
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tail-latency benchmark against the offline OpenAI stand-in")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--profile", default="per-model", help="stand-in latency profile")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="multiply simulated latency")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    port = free_port()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-standin")
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+    os.environ.setdefault("LLM_RETRY_BASE_DELAY", "0.1")
+    # Measure the app, not our own TPM pacing (set these explicitly to include it)
+    os.environ.setdefault("LLM_TPM_LIMIT", "10000000")
+    os.environ.setdefault("LLM_RPM_LIMIT", "100000")
+
+    standin = start_standin(port)
+    standin.settings.update({"profile": args.profile, "time_scale": args.time_scale,
+                             "rate_limit_rate": args.rate_limit_rate, "error_rate": args.error_rate,
+                             "truncate_rate": args.truncate_rate})
+    standin.rng.seed(args.seed)
+
+    app_main = asyncio.run(run(args))
+    counters = standin.counters
+    print(f"stand-in: {counters['requests']} upstream calls, {counters['rate_limited']} x 429, "
+          f"{counters['server_errors']} x 5xx, {counters['truncated']} truncated")
+    gateway = app_main.llm_gateway.stats()
+    print(f"gateway retries: {gateway['retry']['retries']}, breaker: {gateway['circuit_breaker']['state']}\n")
+    print(f"{'task':<20} {'model':<14} {'upstream':>8} {'avg':>8} {'tok/s':>8}")
+    for task, models in gateway["tasks"].items():
+        for model, entry in models.items():
+            print(f"{task:<20} {model:<14} {entry['upstream_calls']:>8} "
+                  f"{entry['avg_upstream_seconds']:>7.2f}s {entry['tokens_per_second']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# bulk_jobs.py - Bulk generation runs: a manifest of jobs executed for throughput, not latency
+#
+# A run prepares every job's messages up front, executes them on one backend and writes
+# each result to <BULK_OUTPUT_DIR>/<run_id>/<job_id>.json plus a summary.json:
+#   batch       one provider batch for the whole run (cheaper, finishes within 24h)
+#   concurrent  BULK_CONCURRENCY gateway calls at a time at bulk admission priority,
+#               so interactive traffic still goes first (used for the local stand-in)
+# Runs are detached from the submitting request: no deadline, no disconnect cancellation.
+
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import logging
+import contextvars
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+import llm_gateway
+from llm_metrics import current_endpoint
+from rate_limiter import PRIORITY_BULK
+from token_budget import ContextOverflowError
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BACKENDS = {"batch", "concurrent"}
+JOB_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,100}$")
+
+
+@dataclass
+class PreparedJob:
+    """A job's chat request plus how to turn the model's text into the stored result"""
+    job_id: str
+    kind: str
+    messages: List[Dict[str, Any]]
+    task: str
+    finish: Callable[[str], Dict[str, Any]]
+    max_tokens: Optional[int] = None
+    timeout: Optional[float] = None
+
+
+class BulkRun:
+    def __init__(self, run_id: str, backend: str, output_dir: str, jobs: List[PreparedJob],
+                 rejected: Dict[str, str]):
+        self.run_id = run_id
+        self.backend = backend
+        self.output_dir = output_dir
+        self.jobs = {job.job_id: job for job in jobs}
+        self.status = "queued"
+        self.batch_id: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.results: Dict[str, Dict[str, Any]] = {job.job_id: {"status": "queued"} for job in jobs}
+        # Jobs whose request was invalid never reach the backend
+        for job_id, error in rejected.items():
+            self.results[job_id] = {"status": "failed", "error": error}
+        self.task: Optional[asyncio.Task] = None
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for result in self.results.values():
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        return counts
+
+    def summary(self, detail: bool = False) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        done = sum(1 for r in self.results.values() if r["status"] in ("completed", "failed"))
+        summary = {
+            "run_id": self.run_id,
+            "status": self.status,
+            "backend": self.backend,
+            "batch_id": self.batch_id,
+            "output_dir": self.output_dir,
+            "jobs": len(self.results),
+            "counts": self.counts(),
+            "submitted_at": self.submitted_at,
+            "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+            "jobs_per_minute": round(done / elapsed * 60, 2) if elapsed else None,
+        }
+        if detail:
+            summary["results"] = self.results
+        return summary
+
+
+class BulkRunner:
+    """Registry and executor of bulk runs"""
+
+    def __init__(self, output_root: str = "bulk_output", concurrency: int = 4, default_backend: str = "auto",
+                 poll_seconds: float = 60.0, max_jobs: int = 500, max_runs: int = 50):
+        self.output_root = output_root
+        self.concurrency = concurrency
+        self.default_backend = default_backend
+        self.poll_seconds = poll_seconds
+        self.max_jobs = max_jobs
+        self.max_runs = max_runs
+        self._runs: Dict[str, BulkRun] = {}
+
+    def resolve_backend(self, backend: Optional[str]) -> str:
+        backend = (backend or self.default_backend).lower()
+        if backend == "auto":
+            # Only the real provider has batch endpoints; stand-ins and cassettes get concurrent calls
+            return "batch" if llm_gateway.BASE_URL is None and llm_gateway.transports.mode == "live" else "concurrent"
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {sorted(BACKENDS | {'auto'})}, got {backend!r}")
+        return backend
+
+    def submit(self, jobs: List[PreparedJob], rejected: Dict[str, str], backend: Optional[str] = None) -> BulkRun:
+        run_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+        run = BulkRun(run_id, self.resolve_backend(backend), os.path.join(self.output_root, run_id), jobs, rejected)
+        os.makedirs(run.output_dir, exist_ok=True)
+        self._runs[run_id] = run
+        # Forget the oldest finished runs; their files stay on disk
+        finished = [r for r in self._runs.values() if r.status in ("completed", "failed")]
+        for old in finished[:max(0, len(self._runs) - self.max_runs)]:
+            del self._runs[old.run_id]
+        # A fresh context: the submitting request's deadline and endpoint must not follow the run
+        run.task = asyncio.get_running_loop().create_task(self._run(run), context=contextvars.Context())
+        logger.info(f"Bulk run {run_id}: {len(jobs)} jobs on the {run.backend} backend ({len(rejected)} rejected)")
+        return run
+
+    def get(self, run_id: str) -> Optional[BulkRun]:
+        return self._runs.get(run_id)
+
+    def runs(self) -> List[Dict[str, Any]]:
+        return [run.summary() for run in sorted(self._runs.values(), key=lambda r: r.submitted_at, reverse=True)]
+
+    async def _run(self, run: BulkRun):
+        current_endpoint.set(f"bulk {run.run_id}")
+        run.status = "running"
+        run.started_at = time.time()
+        try:
+            if run.backend == "batch":
+                await self._run_batch(run)
+            else:
+                await self._run_concurrent(run)
+            run.status = "completed"
+        except Exception as e:
+            logger.error(f"Bulk run {run.run_id} failed: {str(e)}")
+            run.status = "failed"
+            for result in run.results.values():
+                if result["status"] in ("queued", "running"):
+                    result.update(status="failed", error=f"run failed: {str(e)}")
+        finally:
+            run.finished_at = time.time()
+            self._write(run.output_dir, "summary.json", run.summary(detail=True))
+            logger.info(f"Bulk run {run.run_id} {run.status}: {run.counts()}")
+
+    async def _run_concurrent(self, run: BulkRun):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def execute(job: PreparedJob):
+            async with semaphore:
+                run.results[job.job_id]["status"] = "running"
+                try:
+                    content = await llm_gateway.chat(job.messages, task=job.task, max_tokens=job.max_tokens,
+                                                     timeout=job.timeout, priority=PRIORITY_BULK)
+                except Exception as e:
+                    self._fail(run, job, str(e))
+                    return
+                self._complete(run, job, content)
+
+        await asyncio.gather(*(execute(job) for job in run.jobs.values()))
+
+    async def _run_batch(self, run: BulkRun):
+        requests = []
+        for job in run.jobs.values():
+            try:
+                requests.append(llm_gateway.batch_request(job.job_id, job.messages, job.task, job.max_tokens))
+            except ContextOverflowError as e:
+                # Only this job is too large; the rest of the run still goes out
+                self._fail(run, job, str(e))
+        if not requests:
+            return
+        run.batch_id = await llm_gateway.submit_batch(requests)
+        for request in requests:
+            run.results[request["custom_id"]]["status"] = "running"
+        batch = await llm_gateway.wait_for_batch(run.batch_id, self.poll_seconds)
+        for job_id, (content, error) in (await llm_gateway.batch_results(batch, requests)).items():
+            job = run.jobs.get(job_id)
+            if job is None:
+                continue
+            if content is None:
+                self._fail(run, job, error)
+            else:
+                self._complete(run, job, content)
+
+    def _complete(self, run: BulkRun, job: PreparedJob, content: str):
+        try:
+            result = job.finish(content)
+        except Exception as e:
+            self._fail(run, job, f"could not parse the model output: {str(e)}")
+            return
+        path = self._write(run.output_dir, f"{job.job_id}.json", {"job_id": job.job_id, "kind": job.kind, **result})
+        run.results[job.job_id] = {"status": "completed", "output": path}
+
+    def _fail(self, run: BulkRun, job: PreparedJob, error: str):
+        logger.warning(f"Bulk job {run.run_id}/{job.job_id} failed: {error}")
+        run.results[job.job_id] = {"status": "failed", "error": error}
+
+    @staticmethod
+    def _write(directory: str, name: str, data: Dict[str, Any]) -> str:
+        path = os.path.join(directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, default=str)
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        active = [run for run in self._runs.values() if run.status in ("queued", "running")]
+        return {
+            "runs": len(self._runs),
+            "active_runs": len(active),
+            "active_jobs": sum(len(run.results) for run in active),
+            "concurrency": self.concurrency,
+            "default_backend": self.default_backend,
+        }
+
+
+def build_bulk_runner_from_env() -> BulkRunner:
+    return BulkRunner(
+        output_root=os.getenv("BULK_OUTPUT_DIR", "bulk_output"),
+        concurrency=int(os.getenv("BULK_CONCURRENCY", "4")),
+        default_backend=os.getenv("BULK_BACKEND", "auto"),
+        poll_seconds=float(os.getenv("BULK_BATCH_POLL_SECONDS", "60")),
+        max_jobs=int(os.getenv("BULK_MAX_JOBS", "500")),
+        max_runs=int(os.getenv("BULK_MAX_RUNS", "50")),
+    )
@@ -0,0 +1,599 @@
+# ddl_parser.py - Local, deterministic CREATE TABLE parser for /api/v1/generate-model
+#
+# Produces the same {"tables": [...], "relationships": [...]} shape the LLM is asked for,
+# with the same simple types (string, int, date, decimal, boolean). Covers the common
+# dialects (ANSI/PostgreSQL, MySQL, SQL Server, Oracle, Snowflake): quoted identifiers,
+# schema-qualified names, NULL/NOT NULL, DEFAULT/IDENTITY/AUTO_INCREMENT options, inline and
+# table-level PRIMARY KEY / FOREIGN KEY / UNIQUE constraints, and Salesforce-style __c names.
+# CREATE TABLE statements it cannot read (CREATE TABLE ... AS SELECT, LIKE, odd syntax)
+# are handed back so only those go to the LLM. ALTER TABLE ... ADD contributes keys and
+# foreign keys; parse_relationships does the same for a relationships file (SQL or
+# relationships.json). Other statements are ignored.
+
+import re
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DDLParseError(ValueError):
+    pass
+
+
+# ─── Statements ─────────────────────────────────────────────────────────────────
+def split_statements(sql: str) -> List[str]:
+    """Split on top-level semicolons, dropping -- and /* */ comments (quotes respected)"""
+    statements, current = [], []
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if ch == "/" and sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            current.append(" ")
+            continue
+        if ch in "'\"`":
+            end = i + 1
+            while end < n:
+                if sql[end] == ch:
+                    if end + 1 < n and sql[end + 1] == ch:  # doubled quote escape
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+        if ch == ";":
+            statement = "".join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    statement = "".join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+# ─── Tokens ─────────────────────────────────────────────────────────────────────
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]+\])
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<word>[A-Za-z_@#$][\w$#@]*)
+  | (?P<punct>::|[(),.=]|\[\]|\S)
+""", re.VERBOSE)
+
+
+@dataclass
+class _Token:
+    kind: str
+    text: str
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper() if self.kind == "word" else ""
+
+    @property
+    def name(self) -> str:
+        """Identifier text without its quoting"""
+        if self.kind == "quoted":
+            return self.text[1:-1].replace('""', '"')
+        return self.text
+
+
+def tokenize(text: str) -> List[_Token]:
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        if kind != "space":
+            tokens.append(_Token(kind, match.group()))
+    return tokens
+
+
+class _Cursor:
+    def __init__(self, tokens: List[_Token]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Optional[_Token]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> _Token:
+        token = self.peek()
+        if token is None:
+            raise DDLParseError("unexpected end of statement")
+        self.pos += 1
+        return token
+
+    def at(self, *words: str) -> bool:
+        return all((self.peek(i) is not None and self.peek(i).upper == w) for i, w in enumerate(words))
+
+    def accept(self, *words: str) -> bool:
+        if self.at(*words):
+            self.pos += len(words)
+            return True
+        return False
+
+    def expect(self, text: str):
+        token = self.next()
+        if token.text.upper() != text:
+            raise DDLParseError(f"expected {text!r}, found {token.text!r}")
+
+    def done(self) -> bool:
+        return self.pos >= len(self.tokens)
+
+    def skip_group(self) -> List[_Token]:
+        """Consume a balanced ( ... ) group; returns the tokens inside"""
+        self.expect("(")
+        depth, inner = 1, []
+        while True:
+            token = self.next()
+            if token.text == "(":
+                depth += 1
+            elif token.text == ")":
+                depth -= 1
+                if depth == 0:
+                    return inner
+            inner.append(token)
+
+    def qualified_name(self) -> str:
+        """schema.table / db.schema.table / "Quoted Name" -> the last part"""
+        token = self.next()
+        if token.kind not in ("word", "quoted"):
+            raise DDLParseError(f"expected a name, found {token.text!r}")
+        name = token.name
+        while self.peek() is not None and self.peek().text == "." and self.peek(1) is not None:
+            self.pos += 1
+            name = self.next().name
+        return name
+
+    def name_list(self) -> List[str]:
+        names = []
+        for token in self.skip_group():
+            if token.kind in ("word", "quoted"):
+                # Sort order / prefix lengths (MySQL "col(10) DESC") are not column names
+                if token.upper not in ("ASC", "DESC"):
+                    names.append(token.name)
+        return names
+
+
+def _split_top_level(tokens: List[_Token]) -> List[List[_Token]]:
+    parts, current, depth = [], [], 0
+    for token in tokens:
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+        if token.text == "," and depth == 0:
+            parts.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        parts.append(current)
+    return parts
+
+
+# ─── Types ──────────────────────────────────────────────────────────────────────
+# Words that continue a multi-word type name (CHARACTER VARYING, TIMESTAMP WITH TIME ZONE, ...)
+_TYPE_CONTINUATIONS = {"VARYING", "PRECISION", "WITH", "WITHOUT", "TIME", "ZONE", "LOCAL", "UNSIGNED",
+                       "SIGNED", "ZEROFILL", "VARCHAR", "CHAR", "CHARACTER", "INT", "INTEGER", "TZ"}
+
+_INT_TYPES = {"INT", "INTEGER", "SMALLINT", "BIGINT", "TINYINT", "MEDIUMINT", "INT2", "INT4", "INT8",
+              "SERIAL", "BIGSERIAL", "SMALLSERIAL", "BYTEINT", "AUTONUMBER"}
+_DECIMAL_TYPES = {"DECIMAL", "NUMERIC", "DEC", "FLOAT", "FLOAT4", "FLOAT8", "REAL", "DOUBLE", "MONEY",
+                  "SMALLMONEY", "CURRENCY", "PERCENT", "BINARY_FLOAT", "BINARY_DOUBLE"}
+_DATE_TYPES = {"DATE", "DATETIME", "DATETIME2", "SMALLDATETIME", "DATETIMEOFFSET", "TIMESTAMP",
+               "TIMESTAMPTZ", "TIMESTAMP_NTZ", "TIMESTAMP_LTZ", "TIMESTAMP_TZ", "TIME", "YEAR"}
+_BOOLEAN_TYPES = {"BOOLEAN", "BOOL", "BIT", "CHECKBOX"}
+_STRING_TYPES = {"VARCHAR", "NVARCHAR", "CHAR", "NCHAR", "CHARACTER", "TEXT", "STRING", "VARCHAR2", "NVARCHAR2",
+                 "CLOB", "NCLOB", "BLOB", "UUID", "UNIQUEIDENTIFIER", "JSON", "JSONB", "BINARY", "VARBINARY",
+                 "VARIANT", "ENUM"}
+_KNOWN_TYPES = _INT_TYPES | _DECIMAL_TYPES | _DATE_TYPES | _BOOLEAN_TYPES | _STRING_TYPES | {"NUMBER"}
+
+
+def simple_type(type_name: str, args: List[str]) -> str:
+    """Map a dialect type to the model's string / int / date / decimal / boolean"""
+    base = type_name.split()[0].upper() if type_name else ""
+    if base in _INT_TYPES:
+        return "int"
+    if base in ("NUMBER", "NUMERIC", "DECIMAL"):
+        # Oracle NUMBER(10) / NUMBER(18,0) hold whole numbers
+        if base == "NUMBER" and args and (len(args) == 1 or args[1] == "0"):
+            return "int"
+        return "decimal"
+    if base in _DECIMAL_TYPES:
+        return "decimal"
+    if base in _DATE_TYPES:
+        return "date"
+    if base in _BOOLEAN_TYPES:
+        return "boolean"
+    return "string"
+
+
+# ─── CREATE TABLE ───────────────────────────────────────────────────────────────
+_CREATE_TABLE = re.compile(
+    r"^\s*CREATE\s+(?:OR\s+REPLACE\s+)?(?:(?:GLOBAL|LOCAL|TEMP|TEMPORARY|TRANSIENT|VOLATILE|EXTERNAL|UNLOGGED)\s+)*TABLE\b",
+    re.IGNORECASE,
+)
+# Column options that end the type name
+_COLUMN_OPTIONS = {"NOT", "NULL", "DEFAULT", "PRIMARY", "UNIQUE", "REFERENCES", "CHECK", "CONSTRAINT",
+                   "AUTO_INCREMENT", "AUTOINCREMENT", "IDENTITY", "GENERATED", "COLLATE", "COMMENT", "ON",
+                   "CHARACTER", "CHARSET", "KEY", "AS", "ENCODE", "MASKING", "WITH", "SPARSE", "ROWGUIDCOL"}
+_TABLE_CONSTRAINTS = {"CONSTRAINT", "PRIMARY", "FOREIGN", "UNIQUE", "CHECK", "INDEX", "KEY", "FULLTEXT",
+                      "SPATIAL", "EXCLUDE", "PERIOD"}
+# Words of CREATE / ALTER TABLE whose case means nothing (unquoted identifiers keep theirs)
+KEYWORDS = frozenset(_KNOWN_TYPES | _COLUMN_OPTIONS | _TABLE_CONSTRAINTS | {
+    "CREATE", "OR", "REPLACE", "GLOBAL", "LOCAL", "TEMP", "TEMPORARY", "TRANSIENT", "VOLATILE", "EXTERNAL",
+    "UNLOGGED", "TABLE", "IF", "EXISTS", "ALTER", "ADD", "FOREIGN", "DELETE", "UPDATE", "CASCADE", "RESTRICT",
+    "SET", "NO", "ACTION", "PRECISION", "VARYING", "WITHOUT", "ZONE", "TRUE", "FALSE", "CURRENT_TIMESTAMP",
+    "CURRENT_DATE", "ASC", "DESC", "CLUSTERED", "NONCLUSTERED", "ALWAYS", "BY", "STORED", "VIRTUAL", "ENGINE",
+    "DEFERRABLE", "INITIALLY", "DEFERRED", "IMMEDIATE", "MATCH", "FULL", "USING",
+})
+
+
+@dataclass
+class ParsedTable:
+    name: str
+    columns: List[Dict[str, Any]]
+    primary_key: List[str]
+    unique: List[List[str]] = field(default_factory=list)
+    # (columns, referenced table, referenced columns)
+    foreign_keys: List[Tuple[List[str], str, List[str]]] = field(default_factory=list)
+
+
+def is_create_table(statement: str) -> bool:
+    return bool(_CREATE_TABLE.match(statement))
+
+
+def created_table_name(statement: str) -> Optional[str]:
+    """Name of the table a CREATE TABLE statement defines, without parsing its body"""
+    match = _CREATE_TABLE.match(statement)
+    if not match:
+        return None
+    cursor = _Cursor(tokenize(statement[match.end():match.end() + 512]))
+    cursor.accept("IF", "NOT", "EXISTS")
+    try:
+        return cursor.qualified_name()
+    except DDLParseError:
+        return None
+
+
+def _parse_references(cursor: _Cursor) -> Tuple[str, List[str]]:
+    table = cursor.qualified_name()
+    columns = cursor.name_list() if cursor.peek() is not None and cursor.peek().text == "(" else []
+    # ON DELETE / ON UPDATE / MATCH / DEFERRABLE clauses
+    while not cursor.done() and cursor.peek().upper in ("ON", "MATCH", "DEFERRABLE", "NOT", "INITIALLY",
+                                                        "DELETE", "UPDATE", "CASCADE", "RESTRICT", "SET",
+                                                        "NO", "ACTION", "FULL", "PARTIAL", "SIMPLE",
+                                                        "DEFERRED", "IMMEDIATE", "NULL", "DEFAULT",
+                                                        "ENABLE", "DISABLE", "NOVALIDATE", "RELY", "NORELY"):
+        if cursor.at("NOT", "NULL"):
+            break
+        cursor.next()
+    return table, columns
+
+
+def _parse_table_constraint(cursor: _Cursor, table: ParsedTable):
+    if cursor.accept("CONSTRAINT"):
+        cursor.next()  # constraint name
+    if cursor.accept("PRIMARY", "KEY"):
+        cursor.accept("CLUSTERED") or cursor.accept("NONCLUSTERED")
+        table.primary_key = cursor.name_list()
+    elif cursor.accept("FOREIGN", "KEY"):
+        if cursor.peek() is not None and cursor.peek().text != "(":
+            cursor.next()  # MySQL index name
+        columns = cursor.name_list()
+        if not cursor.accept("REFERENCES"):
+            raise DDLParseError("FOREIGN KEY without REFERENCES")
+        ref_table, ref_columns = _parse_references(cursor)
+        table.foreign_keys.append((columns, ref_table, ref_columns))
+    elif cursor.accept("UNIQUE"):
+        cursor.accept("KEY") or cursor.accept("INDEX")
+        cursor.accept("CLUSTERED") or cursor.accept("NONCLUSTERED")
+        if cursor.peek() is not None and cursor.peek().text != "(":
+            cursor.next()  # index name
+        table.unique.append(cursor.name_list())
+    # CHECK, INDEX, KEY, FULLTEXT, EXCLUDE ... carry nothing the model needs
+
+
+def _parse_column(cursor: _Cursor, table: ParsedTable):
+    name = cursor.next()
+    if name.kind not in ("word", "quoted"):
+        raise DDLParseError(f"expected a column name, found {name.text!r}")
+
+    type_words, type_args = [], []
+    while not cursor.done():
+        token = cursor.peek()
+        if token.text == "(" and type_words:
+            type_args = [t.text for t in cursor.skip_group() if t.kind in ("number", "word") and t.upper != "MAX"]
+            continue
+        if token.text in ("[]", "::"):
+            cursor.next()
+            continue
+        if token.kind != "word":
+            break
+        upper = token.upper
+        if type_words and upper not in _TYPE_CONTINUATIONS:
+            break
+        if not type_words and upper in _COLUMN_OPTIONS and upper not in ("CHARACTER",):
+            break
+        type_words.append(token.name)
+        cursor.next()
+
+    column = {"name": name.name, "type": simple_type(" ".join(type_words), type_args),
+              "nullable": True, "is_primary_key": False, "is_foreign_key": False}
+    while not cursor.done():
+        if cursor.accept("NOT", "NULL"):
+            column["nullable"] = False
+        elif cursor.accept("NULL"):
+            column["nullable"] = True
+        elif cursor.accept("PRIMARY", "KEY"):
+            column["is_primary_key"] = True
+            column["nullable"] = False
+            table.primary_key = [name.name]
+        elif cursor.accept("UNIQUE"):
+            cursor.accept("KEY")
+            table.unique.append([name.name])
+        elif cursor.accept("REFERENCES"):
+            ref_table, ref_columns = _parse_references(cursor)
+            table.foreign_keys.append(([name.name], ref_table, ref_columns))
+        elif cursor.peek().text == "(":
+            cursor.skip_group()  # CHECK (...), IDENTITY(1,1), DEFAULT (expr), ...
+        else:
+            cursor.next()  # DEFAULT value, CONSTRAINT name, COLLATE x, COMMENT '...', ...
+    table.columns.append(column)
+
+
+def _is_table_constraint(part: List[_Token]) -> bool:
+    first = part[0]
+    if first.kind != "word" or first.upper not in _TABLE_CONSTRAINTS:
+        return False
+    if first.upper in ("KEY", "INDEX") and len(part) > 1:
+        # MySQL "KEY idx (col)" vs a column named key: "key VARCHAR(10)"
+        return part[1].text == "(" or part[1].upper not in _KNOWN_TYPES
+    return True
+
+
+def parse_create_table(statement: str) -> ParsedTable:
+    """Parse one CREATE TABLE statement; raises DDLParseError for anything it can't read"""
+    match = _CREATE_TABLE.match(statement)
+    if not match:
+        raise DDLParseError("not a CREATE TABLE statement")
+    cursor = _Cursor(tokenize(statement[match.end():]))
+    cursor.accept("IF", "NOT", "EXISTS")
+    table = ParsedTable(name=cursor.qualified_name(), columns=[], primary_key=[])
+    if cursor.peek() is None or cursor.peek().text != "(":
+        raise DDLParseError(f"{table.name}: no column list (CREATE TABLE ... AS / LIKE)")
+    body = cursor.skip_group()
+    for part in _split_top_level(body):
+        if not part:
+            continue
+        part_cursor = _Cursor(part)
+        if _is_table_constraint(part):
+            _parse_table_constraint(part_cursor, table)
+        else:
+            _parse_column(part_cursor, table)
+    if cursor.accept("AS"):
+        raise DDLParseError(f"{table.name}: CREATE TABLE ... AS SELECT")
+    if not table.columns:
+        raise DDLParseError(f"{table.name}: no columns")
+
+    # Table-level keys mark their columns too
+    by_name = {c["name"].lower(): c for c in table.columns}
+    for column_name in table.primary_key:
+        column = by_name.get(column_name.lower())
+        if column:
+            column["is_primary_key"] = True
+            column["nullable"] = False
+    for columns, _, _ in table.foreign_keys:
+        for column_name in columns:
+            if column_name.lower() in by_name:
+                by_name[column_name.lower()]["is_foreign_key"] = True
+    return table
+
+
+# ─── ALTER TABLE ────────────────────────────────────────────────────────────────
+_ALTER_TABLE = re.compile(r"^\s*ALTER\s+TABLE\b", re.IGNORECASE)
+_FOREIGN_KEY = re.compile(r"\bREFERENCES\b", re.IGNORECASE)
+
+
+def is_alter_table(statement: str) -> bool:
+    return bool(_ALTER_TABLE.match(statement))
+
+
+def parse_alter_table(statement: str) -> ParsedTable:
+    """Keys and foreign keys an ALTER TABLE ... ADD statement declares (columns stay empty)"""
+    match = _ALTER_TABLE.match(statement)
+    if not match:
+        raise DDLParseError("not an ALTER TABLE statement")
+    cursor = _Cursor(tokenize(statement[match.end():]))
+    cursor.accept("ONLY")
+    cursor.accept("IF", "EXISTS")
+    table = ParsedTable(name=cursor.qualified_name(), columns=[], primary_key=[])
+    cursor.accept("WITH", "CHECK") or cursor.accept("WITH", "NOCHECK")
+    for part in _split_top_level(cursor.tokens[cursor.pos:]):
+        if not part or part[0].upper != "ADD":
+            continue  # DROP / ALTER COLUMN / RENAME ... declare no relationships
+        part = part[1:]
+        if part and part[0].text == "(":
+            # Oracle: ADD (CONSTRAINT ..., CONSTRAINT ...)
+            parts = _split_top_level(_Cursor(part).skip_group())
+        else:
+            parts = [part]
+        for clause in parts:
+            if not clause:
+                continue
+            if _is_table_constraint(clause):
+                _parse_table_constraint(_Cursor(clause), table)
+            else:
+                clause_cursor = _Cursor(clause)
+                clause_cursor.accept("COLUMN")
+                _parse_column(clause_cursor, table)
+    if _FOREIGN_KEY.search(statement) and not table.foreign_keys:
+        raise DDLParseError(f"{table.name}: REFERENCES clause not understood")
+    return table
+
+
+# ─── Schema ─────────────────────────────────────────────────────────────────────
+@dataclass
+class ParsedSchema:
+    tables: List[Dict[str, Any]]
+    relationships: List[Dict[str, Any]]
+    # CREATE TABLE statements the parser could not read, for the LLM
+    unparsed: List[str]
+    # Lower-cased table name -> candidate keys (primary key first, then unique keys)
+    keys: Dict[str, List[List[str]]] = field(default_factory=dict)
+    # Foreign-key statements (ALTER TABLE ...) the parser could not read, for the LLM
+    unparsed_relationships: List[str] = field(default_factory=list)
+
+
+def cardinality(columns: List[str], keys: List[List[str]]) -> str:
+    """one-to-one when the FK columns are also the table's primary key or a unique key"""
+    wanted = sorted(c.lower() for c in columns)
+    if any(key and sorted(c.lower() for c in key) == wanted for key in keys):
+        return "one-to-one"
+    return "many-to-one"
+
+
+def candidate_keys(tables: List[Dict[str, Any]]) -> Dict[str, List[List[str]]]:
+    """Primary keys of data-model tables (the JSON shape), as ParsedSchema.keys"""
+    keys = {}
+    for table in tables:
+        if not isinstance(table, dict):
+            continue
+        primary = [c.get("name") for c in table.get("columns") or [] if isinstance(c, dict) and c.get("is_primary_key")]
+        if primary:
+            keys[str(table.get("name", "")).lower()] = [primary]
+    return keys
+
+
+def _collect(sql_files: List[str]) -> Tuple[List[ParsedTable], List[ParsedTable], List[str], List[str]]:
+    """(created tables, ALTER TABLE declarations, unreadable CREATE TABLEs, unreadable FK statements)"""
+    created: List[ParsedTable] = []
+    altered: List[ParsedTable] = []
+    unparsed: List[str] = []
+    unparsed_relationships: List[str] = []
+    for sql in sql_files:
+        for statement in split_statements(sql):
+            try:
+                if is_create_table(statement):
+                    created.append(parse_create_table(statement))
+                elif is_alter_table(statement):
+                    altered.append(parse_alter_table(statement))
+            except DDLParseError as e:
+                logger.info(f"Local DDL parser skipped a statement ({str(e)}); leaving it to the LLM")
+                if is_create_table(statement):
+                    unparsed.append(statement + ";")
+                elif _FOREIGN_KEY.search(statement):
+                    unparsed_relationships.append(statement + ";")
+    return created, altered, unparsed, unparsed_relationships
+
+
+def _keys_of(parsed: List[ParsedTable]) -> Dict[str, List[List[str]]]:
+    keys: Dict[str, List[List[str]]] = {}
+    for table in parsed:
+        table_keys = keys.setdefault(table.name.lower(), [])
+        if table.primary_key:
+            table_keys.insert(0, table.primary_key)
+        table_keys.extend(key for key in table.unique if key)
+    return keys
+
+
+def _relationships_of(parsed: List[ParsedTable], keys: Dict[str, List[List[str]]]) -> List[Dict[str, Any]]:
+    relationships = []
+    for table in parsed:
+        for columns, ref_table, ref_columns in table.foreign_keys:
+            # REFERENCES t without columns means t's primary key
+            ref_columns = ref_columns or next(iter(keys.get(ref_table.lower(), [])), [])
+            for i, column in enumerate(columns):
+                relationships.append({
+                    "from": table.name,
+                    "to": ref_table,
+                    "from_column": column,
+                    "to_column": ref_columns[i] if i < len(ref_columns) else column,
+                    "type": cardinality(columns, keys.get(table.name.lower(), [])),
+                })
+    return relationships
+
+
+def parse_schema(sql_files: List[str]) -> ParsedSchema:
+    """Parse every CREATE TABLE (and ALTER TABLE ... ADD) in `sql_files`; unreadable ones are returned as text"""
+    created, altered, unparsed, unparsed_relationships = _collect(sql_files)
+    keys = _keys_of(created + altered)
+    return ParsedSchema(
+        tables=[{"name": table.name, "columns": table.columns} for table in created],
+        relationships=_relationships_of(created + altered, keys),
+        unparsed=unparsed,
+        keys=keys,
+        unparsed_relationships=unparsed_relationships,
+    )
+
+
+# ─── Relationships ──────────────────────────────────────────────────────────────
+@dataclass
+class ParsedRelationships:
+    relationships: List[Dict[str, Any]]
+    # Statements with foreign-key syntax the parser could not read, for the LLM
+    unparsed: List[str]
+
+
+def _json_relationships(data: Any, keys: Dict[str, List[List[str]]]) -> List[Dict[str, Any]]:
+    """relationships.json ({"relationships": [{from_table, from_column, to_table, to_column,
+    relationship_type}, ...]}) or the data model's own from/to/type shape"""
+    entries = data.get("relationships", []) if isinstance(data, dict) else data
+    relationships = []
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        source = entry.get("from_table") or entry.get("from")
+        target = entry.get("to_table") or entry.get("to")
+        if not source or not target:
+            continue
+        from_column = entry.get("from_column") or ""
+        kind = entry.get("relationship_type") or entry.get("type") or entry.get("cardinality")
+        if kind:
+            kind = re.sub(r"[\s_]+", "-", str(kind).strip().lower())
+        else:
+            kind = cardinality([from_column], keys.get(str(source).lower(), []))
+        relationships.append({
+            "from": source,
+            "to": target,
+            "from_column": from_column,
+            "to_column": entry.get("to_column") or from_column,
+            "type": kind,
+        })
+    return relationships
+
+
+def parse_relationships(text: str, keys: Optional[Dict[str, List[List[str]]]] = None) -> ParsedRelationships:
+    """Relationships from relationships.json content or from SQL foreign keys (ALTER TABLE ... ADD
+    [CONSTRAINT] FOREIGN KEY, CREATE TABLE constraints and inline REFERENCES).
+
+    `keys` (lower-cased table name -> candidate keys) decides one-to-one vs many-to-one.
+    """
+    keys = dict(keys or {})
+    stripped = text.strip()
+    if stripped[:1] in ("{", "["):
+        try:
+            return ParsedRelationships(_json_relationships(json.loads(stripped), keys), [])
+        except ValueError:
+            pass  # SQL Server "[dbo].[t]" and the like
+    created, altered, unparsed, unparsed_relationships = _collect([text])
+    for name, table_keys in _keys_of(created + altered).items():
+        keys[name] = table_keys + [key for key in keys.get(name, []) if key not in table_keys]
+    relationships = _relationships_of(created + altered, keys)
+    return ParsedRelationships(relationships, unparsed_relationships + [s for s in unparsed if _FOREIGN_KEY.search(s)])
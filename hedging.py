@@ -0,0 +1,148 @@
+# hedging.py - Hedged requests: re-issue a call whose first token is late, keep the first finisher
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Rolling window of time-to-first-token samples per key"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, key: str, seconds: float):
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def keys(self):
+        return list(self._samples)
+
+    def count(self, key: str) -> int:
+        return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, pct: float) -> Optional[float]:
+        samples = self._samples.get(key)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class HedgePolicy:
+    """Issue a second identical request when the first token is later than the live p-th percentile"""
+
+    def __init__(self, tasks: Set[str], percentile: float = 95.0, min_samples: int = 10,
+                 default_delay: float = 30.0, min_delay: float = 1.0, max_rate: float = 0.1):
+        self.tasks = tasks
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self.ttft = LatencyTracker()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.skipped_over_budget = 0
+
+    def enabled_for(self, task: Optional[str]) -> bool:
+        return "*" in self.tasks or (task or "default") in self.tasks
+
+    def delay_for(self, key: str) -> float:
+        """Hedge threshold: live TTFT percentile once enough samples exist, else the default"""
+        if self.ttft.count(key) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, self.ttft.percentile(key, self.percentile))
+
+    async def run(self, key: str, attempt: Callable[[Callable[[], None]], Awaitable[Any]]) -> Any:
+        """Run attempt(on_first_token); hedge it once if the first token is late.
+
+        `attempt` must call on_first_token() when its first output token arrives. The first
+        leg to finish successfully wins and the other is cancelled.
+        """
+        self.calls += 1
+        primary_first = asyncio.Event()
+
+        def leg(first: asyncio.Event):
+            start = time.monotonic()
+
+            def on_first_token():
+                if not first.is_set():
+                    self.ttft.observe(key, time.monotonic() - start)
+                    first.set()
+            return asyncio.ensure_future(attempt(on_first_token))
+
+        primary = leg(primary_first)
+        legs = [primary]
+        try:
+            first_wait = asyncio.ensure_future(primary_first.wait())
+            try:
+                await asyncio.wait({primary, first_wait}, timeout=self.delay_for(key),
+                                   return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                first_wait.cancel()
+            if primary_first.is_set() or primary.done():
+                return await primary
+            if self.hedged >= self.max_rate * self.calls:
+                # Hedging budget spent - let the straggler finish on its own
+                self.skipped_over_budget += 1
+                return await primary
+
+            self.hedged += 1
+            logger.info(f"Hedging LLM call ({key}): no first token after {self.delay_for(key):.1f}s")
+            hedge = leg(asyncio.Event())
+            legs.append(hedge)
+            pending = set(legs)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        else:
+                            self.primary_wins += 1
+                        return task.result()
+                    # A fast failure shouldn't beat a slower success - keep waiting on the other leg
+                    error = task.exception()
+            raise error or asyncio.CancelledError()
+        finally:
+            for task in legs:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tasks": sorted(self.tasks),
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.calls, 3) if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "skipped_over_budget": self.skipped_over_budget,
+            "thresholds_seconds": {
+                key: round(self.delay_for(key), 2) for key in self.ttft.keys()
+            },
+        }
+
+
+def build_hedge_policy_from_env() -> HedgePolicy:
+    """Hedging is opt-in per task via LLM_HEDGE_TASKS (comma list, or * for all)"""
+    tasks = {t.strip() for t in os.getenv("LLM_HEDGE_TASKS", "").split(",") if t.strip()}
+    return HedgePolicy(
+        tasks=tasks,
+        percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+        min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10")),
+        default_delay=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "30")),
+        min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "1")),
+        max_rate=float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1")),
+    )
@@ -0,0 +1,228 @@
+# idempotency.py - Idempotency-Key support for expensive POST endpoints
+#
+# A retried POST carrying the same Idempotency-Key attaches to the execution that is
+# still running for that key, or gets its stored response, instead of starting a
+# second generation. Executions outlive a disconnected caller for a short grace
+# period so the client's retry has something to attach to.
+
+import os
+import time
+import json
+import asyncio
+import contextvars
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+import request_deadline
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+
+
+class _Execution:
+    """One handler run for a key: its task, request fingerprint and captured response"""
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.task: Optional[asyncio.Task] = None
+        self.status: Optional[int] = None
+        self.headers: List[tuple] = []
+        self.body: List[bytes] = []
+        self.completed_at: Optional[float] = None
+        self.waiters = 0
+        self.orphan_timer: Optional[asyncio.TimerHandle] = None
+
+
+class IdempotencyStore:
+    """In-process table of executions per Idempotency-Key (completed ones expire after a TTL)"""
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 500, orphan_grace: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.orphan_grace = orphan_grace
+        self._entries: "OrderedDict[str, _Execution]" = OrderedDict()
+        self.executions = 0
+        self.attached = 0
+        self.replayed = 0
+        self.conflicts = 0
+        self.orphans_cancelled = 0
+
+    def lookup(self, key: str) -> Optional[_Execution]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.completed_at is not None and time.monotonic() - entry.completed_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def add(self, key: str, entry: _Execution):
+        self._entries[key] = entry
+        self.executions += 1
+        # Evict the oldest completed results; running executions are never dropped
+        for old_key in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._entries[old_key].completed_at is not None:
+                del self._entries[old_key]
+
+    def forget(self, key: str, entry: _Execution):
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+
+    def join(self, entry: _Execution):
+        entry.waiters += 1
+        if entry.orphan_timer is not None:
+            entry.orphan_timer.cancel()
+            entry.orphan_timer = None
+
+    def leave(self, key: str, entry: _Execution, cancelled: bool):
+        entry.waiters -= 1
+        if not cancelled or entry.waiters > 0 or entry.task is None or entry.task.done():
+            return
+        # Last caller hung up - keep working briefly in case its retry comes back
+        def cancel_orphan():
+            if entry.waiters == 0 and not entry.task.done():
+                self.orphans_cancelled += 1
+                logger.info(f"No caller returned for idempotency key {key[:16]}; cancelling its execution")
+                entry.task.cancel()
+        entry.orphan_timer = asyncio.get_running_loop().call_later(self.orphan_grace, cancel_orphan)
+
+    def stats(self) -> Dict[str, Any]:
+        running = sum(1 for entry in self._entries.values() if entry.completed_at is None)
+        return {
+            "entries": len(self._entries),
+            "running": running,
+            "executions": self.executions,
+            "attached": self.attached,
+            "replayed": self.replayed,
+            "conflicts": self.conflicts,
+            "orphans_cancelled": self.orphans_cancelled,
+        }
+
+
+def fingerprint(scope, body: bytes) -> str:
+    return hashlib.sha256(f"{scope['method']} {scope['path']}\n".encode() + body).hexdigest()
+
+
+async def send_json(send, status: int, payload: Dict[str, Any]):
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware: dedupes POSTs to `paths` that carry an Idempotency-Key header"""
+
+    def __init__(self, app, store: "IdempotencyStore", paths: Iterable[str]):
+        self.app = app
+        self.store = store
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        key = dict(scope.get("headers") or []).get(IDEMPOTENCY_HEADER.encode(), b"").decode("latin-1").strip()
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await send_json(send, 400, {"detail": f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters"})
+            return
+
+        body = await read_body(receive)
+        if body is None:
+            return  # Client left while uploading
+        entry = self.store.lookup(key)
+        if entry is not None and entry.fingerprint != fingerprint(scope, body):
+            self.store.conflicts += 1
+            await send_json(send, 422, {"detail": "Idempotency-Key was already used with a different request body"})
+            return
+
+        if entry is None:
+            entry = _Execution(fingerprint(scope, body))
+            # The execution outlives its caller by the orphan grace for a retry to attach to,
+            # so its deadline does too
+            context = contextvars.copy_context()
+            context.run(request_deadline.extend, self.store.orphan_grace)
+            entry.task = asyncio.get_running_loop().create_task(self._execute(key, entry, scope, body),
+                                                                context=context)
+            self.store.add(key, entry)
+        elif entry.completed_at is not None:
+            self.store.replayed += 1
+            logger.info(f"Replaying stored response for idempotency key {key[:16]}")
+        else:
+            self.store.attached += 1
+            logger.info(f"Attaching retry to running execution for idempotency key {key[:16]}")
+
+        self.store.join(entry)
+        cancelled = False
+        try:
+            # Shield so a disconnecting caller leaves the execution to the orphan timer
+            await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            self.store.leave(key, entry, cancelled)
+
+        await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers})
+        await send({"type": "http.response.body", "body": b"".join(entry.body)})
+
+    async def _execute(self, key: str, entry: _Execution, scope, body: bytes):
+        delivered = False
+        never = asyncio.Event()
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await never.wait()  # The execution has no connection of its own to lose
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                entry.status = message["status"]
+                entry.headers = list(message.get("headers") or [])
+            elif message["type"] == "http.response.body":
+                entry.body.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            self.store.forget(key, entry)
+            raise
+        entry.completed_at = time.monotonic()
+        if entry.status is None or entry.status >= 500:
+            # Server-side failures are worth a fresh attempt on retry
+            self.store.forget(key, entry)
+
+
+async def read_body(receive) -> Optional[bytes]:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def build_idempotency_store_from_env() -> IdempotencyStore:
+    return IdempotencyStore(
+        ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600")),
+        max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "500")),
+        orphan_grace=float(os.getenv("IDEMPOTENCY_ORPHAN_GRACE_SECONDS", "30")),
+    )
@@ -0,0 +1,121 @@
+# json_stream.py - Pull complete array elements out of a JSON document while it is still streaming
+#
+# The model answers sprint planning with {"sprint_stories": [{...}, {...}], ...}. Feeding the
+# token deltas to ArrayElementStream yields each story as soon as its closing brace arrives,
+# and whatever was complete survives a completion that is cut off mid-story.
+
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ArrayElementStream:
+    """Incremental scanner for the elements of one top-level array field (`key`)"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.elements: List[Any] = []
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._array_depth: Optional[int] = None  # depth inside the target array, while in it
+        self._element_start = -1
+        self.array_closed = False
+
+    def feed(self, text: str) -> List[Any]:
+        """Consume a delta; returns the elements it completed (in order)"""
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = buffer[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                self._maybe_start_element(i)
+            elif ch in "{[":
+                if ch == "[" and self._depth == 1 and self._current_key == self.key and not self.array_closed:
+                    self._array_depth = self._depth + 1
+                else:
+                    self._maybe_start_element(i)
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if self._depth < self._array_depth:
+                        # The target array itself closed (a bare scalar element may end here)
+                        self._finish_element(i, completed)
+                        self._array_depth = None
+                        self.array_closed = True
+                    elif self._depth == self._array_depth:
+                        # An object/array element closed
+                        self._finish_element(i + 1, completed)
+            elif ch == ":" and self._depth == 1:
+                self._current_key = self._last_string
+            elif ch == "," and self._depth == 1:
+                self._current_key = None
+            elif ch == "," and self._array_depth is not None and self._depth == self._array_depth:
+                self._finish_element(i, completed)
+            elif not ch.isspace():
+                self._maybe_start_element(i)
+        self._pos = len(buffer)
+        self.elements.extend(completed)
+        return completed
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._buffer
+
+    def _maybe_start_element(self, index: int):
+        if self._array_depth is not None and self._depth == self._array_depth and self._element_start < 0:
+            self._element_start = index
+
+    def _finish_element(self, end: int, completed: List[Any]):
+        if self._element_start < 0:
+            return
+        raw = self._buffer[self._element_start:end].strip()
+        self._element_start = -1
+        if not raw:
+            return
+        try:
+            completed.append(json.loads(raw))
+        except ValueError as e:
+            logger.warning(f"Skipping malformed {self.key} element ({str(e)}): {raw[:80]}")
+
+
+def parse_with_salvage(text: str, key: str) -> Dict[str, Any]:
+    """json.loads(text), or {key: [complete elements], "truncated": ...} when the document doesn't parse.
+
+    Raises ValueError when not even one element of `key` could be recovered.
+    """
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed
+    except ValueError:
+        pass
+    stream = ArrayElementStream(key)
+    stream.feed(text)
+    if not stream.elements:
+        raise ValueError(f"No complete {key} element in the model output")
+    logger.warning(f"Unparseable JSON: kept {len(stream.elements)} complete {key} elements")
+    return {key: stream.elements, "truncated": not stream.array_closed}
@@ -1,11 +1,5 @@
 import streamlit as st
-import openai
-import os
-from dotenv import load_dotenv
-
-# Load your OpenAI API key
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from llm_gateway import chat_sync
 
 st.set_page_config(page_title="Wireframe to Layout Assistant", layout="centered")
 st.title("📐 Wireframe to Layout Instruction Generator")
@@ -42,18 +36,15 @@ Only return valid JSON. No commentary. Example format:
 }}"""
 
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
+            json_text = chat_sync(
+                [
                     {"role": "system", "content": "You are a helpful assistant that converts dashboard sketches to structured layout JSON."},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.3,
-                max_tokens=500
+                task="wireframe"
             )
 
             # Display JSON wireframe
-            json_text = response['choices'][0]['message']['content']
             st.subheader("✅ Generated JSON Wireframe:")
             st.code(json_text, language="json")
 
@@ -81,17 +72,14 @@ Wireframe JSON:
 
 Instructions:"""
 
-            layout_response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
+            layout_instructions = chat_sync(
+                [
                     {"role": "system", "content": "You generate detailed layout build instructions for dashboards."},
                     {"role": "user", "content": layout_prompt}
                 ],
-                temperature=0.3,
+                task="layout_steps",
                 max_tokens=600
             )
-
-            layout_instructions = layout_response['choices'][0]['message']['content']
             st.subheader("📋 Layout Instructions:")
             st.text(layout_instructions)
 
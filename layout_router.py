@@ -2,11 +2,9 @@
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import os, json, requests
-from dotenv import load_dotenv
+import json
 
-load_dotenv()
-OPENAI_KEY = os.getenv("OPENAI_API_KEY")
+import llm_gateway
 
 router = APIRouter(prefix="/api/v1", tags=["layout"])
 
@@ -27,22 +25,22 @@ class SprintRequest(BaseModel):
     velocity: int
 
 
-def openai_chat_completion(payload: dict) -> dict:
+async def openai_chat_completion(payload: dict, task: str) -> str:
     """
-    Call OpenAI's chat completions endpoint with SSL verification disabled.
+    Run a chat completion body through the shared LLM gateway and return the text.
+    The model comes from the task's route unless the body names one.
     """
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {OPENAI_KEY}",
-        "Content-Type": "application/json"
-    }
-    resp = requests.post(url, headers=headers, json=payload, verify=False)
-    resp.raise_for_status()
-    return resp.json()
+    return await llm_gateway.chat(
+        payload["messages"],
+        task=task,
+        model=payload.get("model"),
+        temperature=payload.get("temperature"),
+        max_tokens=payload.get("max_tokens")
+    )
 
 
 @router.post("/generate-layout")
-def generate_layout(layout: LayoutRequest):
+async def generate_layout(layout: LayoutRequest):
     try:
         # --- Data‑prep only branch ---
         if layout.data_prep_only:
@@ -54,7 +52,6 @@ def generate_layout(layout: LayoutRequest):
                 "and instructions to set up relationships."
             )
             body = {
-                "model": "gpt-4",
                 "messages": [
                     {"role": "system", "content": "Generate Power Query data‑prep instructions."},
                     {"role": "user",   "content": prompt}
@@ -62,15 +59,13 @@ def generate_layout(layout: LayoutRequest):
                 "temperature": 0.2,
                 "max_tokens": 500
             }
-            result = openai_chat_completion(body)
-            text = result["choices"][0]["message"]["content"]
+            text = await openai_chat_completion(body, task="data_prep")
             return {"layout_instructions": text}
 
         # --- Full flow: wireframe + build instructions ---
 
         # 1) Wireframe JSON
         body1 = {
-            "model": "gpt-4",
             "messages": [
                 {"role": "system",  "content": "Convert layout sketches to JSON wireframes."},
                 {"role": "user",    "content":
@@ -82,8 +77,7 @@ def generate_layout(layout: LayoutRequest):
             "temperature": 0.3,
             "max_tokens": 600
         }
-        resp1 = openai_chat_completion(body1)
-        wireframe_json = resp1["choices"][0]["message"]["content"]
+        wireframe_json = await openai_chat_completion(body1, task="wireframe")
 
         # 2) Build instructions
         parts = [
@@ -98,7 +92,6 @@ def generate_layout(layout: LayoutRequest):
         parts.append("Now return step-by-step build instructions for placement, measures, and styling.")
 
         body2 = {
-            "model": "gpt-4",
             "messages": [
                 {"role": "system", "content": "Generate dashboard build instructions."},
                 {"role": "user",   "content": "\n\n".join(parts)}
@@ -106,8 +99,7 @@ def generate_layout(layout: LayoutRequest):
             "temperature": 0.3,
             "max_tokens": 800
         }
-        resp2 = openai_chat_completion(body2)
-        instructions = resp2["choices"][0]["message"]["content"]
+        instructions = await openai_chat_completion(body2, task="layout_steps")
 
         return {
             "wireframe_json": wireframe_json,
@@ -119,7 +111,7 @@ def generate_layout(layout: LayoutRequest):
 
 
 @router.post("/generate-sprint")
-def generate_sprint(req: SprintRequest):
+async def generate_sprint(req: SprintRequest):
     try:
         prompt = (
             "You are an agile planning assistant. Given the wireframe and instructions, "
@@ -130,7 +122,6 @@ def generate_sprint(req: SprintRequest):
             "Output ONLY the JSON object with keys: sprint_stories, total_estimated_points, velocity, over_under_capacity."
         )
         body = {
-            "model": "gpt-4",
             "messages": [
                 {"role": "system", "content": "Generate an agile sprint backlog JSON."},
                 {"role": "user",   "content": prompt}
@@ -138,8 +129,7 @@ def generate_sprint(req: SprintRequest):
             "temperature": 0.2,
             "max_tokens": 700
         }
-        resp = openai_chat_completion(body)
-        content = resp["choices"][0]["message"]["content"].strip()
+        content = (await openai_chat_completion(body, task="sprint")).strip()
 
         try:
             data = json.loads(content)
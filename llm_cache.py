@@ -0,0 +1,280 @@
+# llm_cache.py - Two-tier (memory LRU + SQLite) cache for LLM completions
+#
+# Async callers use aget/aset/astats, which run the SQLite tier in a worker thread so
+# disk I/O never blocks the event loop; get/set/stats are the blocking equivalents.
+
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever prompt templates change so stale completions are never served
+PROMPT_TEMPLATE_VERSION = "2024.1"
+
+
+def make_cache_key(model: str, messages: List[Dict[str, Any]], temperature: float,
+                   max_tokens: int, prompt_version: str = PROMPT_TEMPLATE_VERSION) -> str:
+    """Build a content-addressed key from the canonical JSON of the request"""
+    canonical = json.dumps({
+        "model": model,
+        "messages": messages,
+        "temperature": round(float(temperature), 4),
+        "max_tokens": int(max_tokens),
+        "prompt_version": prompt_version,
+    }, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class MemoryLRU:
+    """Bounded in-process LRU tier with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, stored_at: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, stored_at or time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteTier:
+    """Persistent tier shared by every uvicorn worker on the host"""
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: float = 7 * 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+
+    def get(self, key: str) -> Optional[tuple]:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.evictions += 1
+                return None
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0], row[1]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        expired = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+        self.evictions += max(expired, 0) + max(overflow, 0)
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM llm_cache")
+
+
+class LLMResponseCache:
+    """Memory LRU in front of SQLite, with hit/miss counters"""
+
+    def __init__(self, memory: MemoryLRU, disk: Optional[SQLiteTier] = None, enabled: bool = True):
+        self.memory = memory
+        self.disk = disk
+        self.enabled = enabled
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self._memory_get(key)
+        if value is None and self.disk is not None:
+            value = self._from_disk(key, self._disk_get(key))
+        if value is None:
+            self.misses += 1
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() with the SQLite read in a worker thread"""
+        if not self.enabled:
+            return None
+        value = self._memory_get(key)
+        if value is None and self.disk is not None:
+            value = self._from_disk(key, await asyncio.to_thread(self._disk_get, key))
+        if value is None:
+            self.misses += 1
+        return value
+
+    def set(self, key: str, value: str):
+        if not self.enabled or not value:
+            return
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self._disk_set(key, value)
+        self.stores += 1
+
+    async def aset(self, key: str, value: str):
+        """set() with the SQLite write in a worker thread"""
+        if not self.enabled or not value:
+            return
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self._disk_set, key, value)
+        self.stores += 1
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+        return value
+
+    def _from_disk(self, key: str, row: Optional[tuple]) -> Optional[str]:
+        if row is None:
+            return None
+        value, created_at = row
+        self.memory.set(key, value, stored_at=created_at)
+        self.disk_hits += 1
+        return value
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        try:
+            return self.disk.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache disk read failed: {str(e)}")
+            return None
+
+    def _disk_set(self, key: str, value: str):
+        try:
+            self.disk.set(key, value)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache disk write failed: {str(e)}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def _disk_count(self) -> Optional[int]:
+        if self.disk is None:
+            return None
+        try:
+            return self.disk.count()
+        except sqlite3.Error:
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return self._stats(self._disk_count())
+
+    async def astats(self) -> Dict[str, Any]:
+        return self._stats(await asyncio.to_thread(self._disk_count))
+
+    def _stats(self, disk_entries: Optional[int]) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": disk_entries,
+            "memory_evictions": self.memory.evictions,
+            "disk_evictions": self.disk.evictions if self.disk is not None else 0,
+            "prompt_version": PROMPT_TEMPLATE_VERSION,
+        }
+
+
+def build_cache_from_env() -> LLMResponseCache:
+    """Create the process-wide cache from LLM_CACHE_* environment variables"""
+    enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    memory = MemoryLRU(
+        max_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256")),
+        ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")),
+    )
+    disk = None
+    disk_path = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3")
+    if enabled and disk_path:
+        try:
+            disk = SQLiteTier(
+                disk_path,
+                max_entries=int(os.getenv("LLM_CACHE_DISK_ENTRIES", "5000")),
+                ttl_seconds=float(os.getenv("LLM_CACHE_DISK_TTL_SECONDS", str(7 * 86400))),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache disk tier disabled: {str(e)}")
+    return LLMResponseCache(memory, disk, enabled=enabled)
@@ -0,0 +1,320 @@
+# llm_cassette.py - Record/replay HTTP transport for the LLM gateway
+#
+# LLM_TRANSPORT=live    talk to the provider (default)
+# LLM_TRANSPORT=record  talk to the provider and append every exchange to LLM_CASSETTE
+# LLM_TRANSPORT=replay  answer from LLM_CASSETTE without any network access
+#
+# Exchanges are matched on method, path and the canonical JSON request body. Responses
+# (SSE streams included) are stored chunk by chunk with their arrival offsets, so replay
+# can be instant (LLM_REPLAY_LATENCY_SCALE=0) or reproduce the recorded timing (=1).
+# Repeated identical requests replay their recordings in order, the last one repeating.
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+TRANSPORT_MODES = {"live", "record", "replay"}
+SSE_DONE = "data: [DONE]"
+# Not meaningful once the body is stored decoded and replayed from memory
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+
+def request_key(request: httpx.Request) -> str:
+    """Stable identity of a request: method, path and canonical JSON body"""
+    body = request.content or b""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        pass
+    return hashlib.sha256(f"{request.method} {request.url.path}\n".encode() + body).hexdigest()
+
+
+def _encode(chunk: bytes) -> str:
+    # surrogateescape round-trips chunk boundaries that split a UTF-8 character
+    return chunk.decode("utf-8", "surrogateescape")
+
+
+def _decode(text: str) -> bytes:
+    return text.encode("utf-8", "surrogateescape")
+
+
+class Cassette:
+    """JSON-lines file of recorded exchanges, indexed by request key"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._recordings: Dict[str, List[Dict[str, Any]]] = {}
+        self._played: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        self._recordings.clear()
+        self._played.clear()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._recordings.setdefault(entry["key"], []).append(entry)
+        logger.info(f"Loaded {sum(len(v) for v in self._recordings.values())} LLM exchanges from {self.path}")
+
+    def append(self, entry: Dict[str, Any]):
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._recordings.setdefault(entry["key"], []).append(entry)
+            self.recorded += 1
+
+    def next_for(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            recordings = self._recordings.get(key)
+            if not recordings:
+                self.misses += 1
+                return None
+            index = self._played.get(key, 0)
+            self._played[key] = index + 1
+            self.replayed += 1
+            return recordings[min(index, len(recordings) - 1)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "exchanges": sum(len(v) for v in self._recordings.values()),
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses,
+        }
+
+
+def _entry_for(key: str, request: httpx.Request, response: httpx.Response, chunks: List[list]) -> Dict[str, Any]:
+    try:
+        request_body = json.loads(request.content or b"null")
+    except ValueError:
+        request_body = None
+    return {
+        "key": key,
+        "method": request.method,
+        "path": request.url.path,
+        "request": request_body,
+        "status": response.status_code,
+        "headers": [[k, v] for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS],
+        "chunks": chunks,
+        "recorded_at": time.time(),
+    }
+
+
+def _miss_response(key: str, request: httpx.Request) -> httpx.Response:
+    logger.warning(f"No cassette recording for {request.method} {request.url.path} ({key[:12]})")
+    body = json.dumps({"error": {"message": f"No cassette recording for this request ({key[:12]})",
+                                 "type": "cassette_miss"}}).encode()
+    return httpx.Response(404, headers={"content-type": "application/json"}, content=body, request=request)
+
+
+def _ends_stream(chunks: List[list]) -> bool:
+    # openai stops reading an SSE body at its [DONE] sentinel, before the body is exhausted
+    return SSE_DONE in "".join(text for _, text in chunks[-2:])
+
+
+# ─── Async transport ────────────────────────────────────────────────────────────
+class _RecordingAsyncStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, started: float, on_close):
+        self.inner = inner
+        self.started = started
+        self.on_close = on_close
+        self.chunks: List[list] = []
+        self.complete = False
+
+    async def __aiter__(self):
+        async for chunk in self.inner:
+            self.chunks.append([round(time.perf_counter() - self.started, 4), _encode(chunk)])
+            if _ends_stream(self.chunks):
+                self.complete = True
+            yield chunk
+        self.complete = True
+
+    async def aclose(self):
+        await self.inner.aclose()
+        # Abandoned bodies (cancelled hedge legs, dropped streams) are not worth replaying
+        if self.complete:
+            # The cassette write is file I/O under a thread lock - keep it off the event loop
+            await asyncio.to_thread(self.on_close, self.chunks)
+
+
+class _ReplayAsyncStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[list], latency_scale: float):
+        self.chunks = chunks
+        self.latency_scale = latency_scale
+
+    async def __aiter__(self):
+        started = time.perf_counter()
+        for offset, text in self.chunks:
+            if self.latency_scale > 0:
+                wait = offset * self.latency_scale - (time.perf_counter() - started)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            yield _decode(text)
+
+
+class CassetteAsyncTransport(httpx.AsyncBaseTransport):
+    """Wraps the pooled transport to record exchanges, or replaces it to replay them"""
+
+    def __init__(self, inner: Optional[httpx.AsyncBaseTransport], cassette: Cassette, mode: str,
+                 latency_scale: float = 0.0):
+        self.inner = inner
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_scale = latency_scale
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+        if self.mode == "replay":
+            entry = self.cassette.next_for(key)
+            if entry is None:
+                return _miss_response(key, request)
+            return httpx.Response(entry["status"], headers=entry["headers"], request=request,
+                                  stream=_ReplayAsyncStream(entry["chunks"], self.latency_scale))
+
+        # Ask for an uncompressed body so the cassette stays readable
+        request.headers["accept-encoding"] = "identity"
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+
+        def save(chunks):
+            self.cassette.append(_entry_for(key, request, response, chunks))
+        return httpx.Response(response.status_code, headers=response.headers, request=request,
+                              stream=_RecordingAsyncStream(response.stream, started, save),
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+# ─── Sync transport ─────────────────────────────────────────────────────────────
+class _RecordingSyncStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, started: float, on_close):
+        self.inner = inner
+        self.started = started
+        self.on_close = on_close
+        self.chunks: List[list] = []
+        self.complete = False
+
+    def __iter__(self):
+        for chunk in self.inner:
+            self.chunks.append([round(time.perf_counter() - self.started, 4), _encode(chunk)])
+            if _ends_stream(self.chunks):
+                self.complete = True
+            yield chunk
+        self.complete = True
+
+    def close(self):
+        self.inner.close()
+        # Abandoned bodies (cancelled hedge legs, dropped streams) are not worth replaying
+        if self.complete:
+            self.on_close(self.chunks)
+
+
+class _ReplaySyncStream(httpx.SyncByteStream):
+    def __init__(self, chunks: List[list], latency_scale: float):
+        self.chunks = chunks
+        self.latency_scale = latency_scale
+
+    def __iter__(self):
+        started = time.perf_counter()
+        for offset, text in self.chunks:
+            if self.latency_scale > 0:
+                wait = offset * self.latency_scale - (time.perf_counter() - started)
+                if wait > 0:
+                    time.sleep(wait)
+            yield _decode(text)
+
+
+class CassetteSyncTransport(httpx.BaseTransport):
+    """Blocking twin of CassetteAsyncTransport for chat_sync"""
+
+    def __init__(self, inner: Optional[httpx.BaseTransport], cassette: Cassette, mode: str,
+                 latency_scale: float = 0.0):
+        self.inner = inner
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_scale = latency_scale
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+        if self.mode == "replay":
+            entry = self.cassette.next_for(key)
+            if entry is None:
+                return _miss_response(key, request)
+            return httpx.Response(entry["status"], headers=entry["headers"], request=request,
+                                  stream=_ReplaySyncStream(entry["chunks"], self.latency_scale))
+
+        request.headers["accept-encoding"] = "identity"
+        started = time.perf_counter()
+        response = self.inner.handle_request(request)
+
+        def save(chunks):
+            self.cassette.append(_entry_for(key, request, response, chunks))
+        return httpx.Response(response.status_code, headers=response.headers, request=request,
+                              stream=_RecordingSyncStream(response.stream, started, save),
+                              extensions=response.extensions)
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+
+# ─── Factory ────────────────────────────────────────────────────────────────────
+class TransportFactory:
+    """Builds the gateway's httpx transports for the configured mode"""
+
+    def __init__(self, mode: str = "live", cassette_path: Optional[str] = None, latency_scale: float = 0.0):
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"LLM_TRANSPORT must be one of {sorted(TRANSPORT_MODES)}, got {mode!r}")
+        if mode != "live" and not cassette_path:
+            raise ValueError(f"LLM_TRANSPORT={mode} needs LLM_CASSETTE")
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.cassette = Cassette(cassette_path) if mode != "live" else None
+
+    def async_transport(self, limits: httpx.Limits) -> httpx.AsyncBaseTransport:
+        if self.mode == "live":
+            return httpx.AsyncHTTPTransport(limits=limits)
+        inner = httpx.AsyncHTTPTransport(limits=limits) if self.mode == "record" else None
+        return CassetteAsyncTransport(inner, self.cassette, self.mode, self.latency_scale)
+
+    def sync_transport(self, limits: httpx.Limits) -> httpx.BaseTransport:
+        if self.mode == "live":
+            return httpx.HTTPTransport(limits=limits)
+        inner = httpx.HTTPTransport(limits=limits) if self.mode == "record" else None
+        return CassetteSyncTransport(inner, self.cassette, self.mode, self.latency_scale)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"mode": self.mode, "latency_scale": self.latency_scale}
+        if self.cassette is not None:
+            stats.update(self.cassette.stats())
+        return stats
+
+
+def build_transport_factory_from_env() -> TransportFactory:
+    return TransportFactory(
+        mode=os.getenv("LLM_TRANSPORT", "live").lower(),
+        cassette_path=os.getenv("LLM_CASSETTE"),
+        latency_scale=float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "0")),
+    )
@@ -0,0 +1,613 @@
+# llm_gateway.py - Single pooled gateway for every OpenAI chat completion in the app
+
+import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import httpx
+from dotenv import load_dotenv
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from llm_cache import build_cache_from_env, make_cache_key
+from singleflight import SingleFlight
+from rate_limiter import (
+    build_admission_from_env, estimate_request_tokens,
+    PRIORITY_INTERACTIVE, PRIORITY_DEFAULT
+)
+from llm_resilience import build_retry_policy_from_env, build_circuit_breaker_from_env
+from model_routing import ROUTES, route_for
+from hedging import build_hedge_policy_from_env
+from llm_metrics import build_recorder_from_env, CallRecord, current_endpoint
+from llm_cassette import build_transport_factory_from_env
+from adaptive_budget import build_adaptive_budgets_from_env
+import token_budget
+from token_budget import completion_budget, count_message_tokens, ContextOverflowError
+import request_deadline
+from request_deadline import DeadlineExceeded
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# ─── Configuration ───────────────────────────────────────────────────────────────
+DEFAULT_MODEL = "gpt-4"
+
+# Per-model defaults applied when neither the caller nor the task route sets a value
+MODEL_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "gpt-4":         {"temperature": 0.1, "max_tokens": 2000, "timeout": 600},
+    "gpt-4o":        {"temperature": 0.1, "max_tokens": 2000, "timeout": 900},
+    "gpt-4o-mini":   {"temperature": 0.1, "max_tokens": 2000, "timeout": 300},
+    "gpt-3.5-turbo": {"temperature": 0.2, "max_tokens": 2000, "timeout": 300},
+}
+
+# Point at llm_standin.py (or any OpenAI-compatible server) for offline runs
+BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+
+# One keep-alive pool per process: TLS handshakes are paid once, not per call
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10")),
+    keepalive_expiry=float(os.getenv("LLM_POOL_KEEPALIVE_SECONDS", "120")),
+)
+
+# ─── Shared components ──────────────────────────────────────────────────────────
+cache = build_cache_from_env()
+singleflight = SingleFlight()
+admission = build_admission_from_env()
+retry_policy = build_retry_policy_from_env()
+breaker = build_circuit_breaker_from_env()
+hedger = build_hedge_policy_from_env()
+metrics = build_recorder_from_env()
+# live / record / replay (LLM_TRANSPORT) - replay serves cassettes with no network access
+transports = build_transport_factory_from_env()
+# max_tokens / timeout learned from past completions (ADAPTIVE_BUDGET_TASKS)
+budgets = build_adaptive_budgets_from_env()
+
+_async_client: Optional[AsyncOpenAI] = None
+_async_loop = None
+# Close tasks of clients replaced after an event-loop change (kept referenced until done)
+_closing_clients: Set[asyncio.Task] = set()
+_sync_client: Optional[OpenAI] = None
+
+# Call counters per (model, task)
+_route_stats: Dict[tuple, Dict[str, float]] = {}
+_batch_stats = {"batches": 0, "requests": 0, "succeeded": 0, "failed": 0}
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(900.0, connect=CONNECT_TIMEOUT)
+
+
+async def _close_client(client: AsyncOpenAI):
+    try:
+        await client.close()
+    except Exception as e:  # Its loop may already be closed; the sockets go with it
+        logger.debug(f"Closing a replaced OpenAI client failed: {str(e)}")
+
+
+def _retire_async_client(client: AsyncOpenAI, client_loop, loop):
+    """Close a client whose pool belongs to another event loop, on that loop while it still runs"""
+    if client_loop is not None and client_loop.is_running() and not client_loop.is_closed():
+        asyncio.run_coroutine_threadsafe(_close_client(client), client_loop)
+    elif loop is not None:
+        task = loop.create_task(_close_client(client))
+        _closing_clients.add(task)
+        task.add_done_callback(_closing_clients.discard)
+
+
+def get_async_client() -> AsyncOpenAI:
+    """Process-wide AsyncOpenAI client on the shared keep-alive pool"""
+    global _async_client, _async_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    # httpx pools are bound to the loop that opened them
+    if _async_client is None or (loop is not None and _async_loop is not None and loop is not _async_loop):
+        if _async_client is not None:
+            _retire_async_client(_async_client, _async_loop, loop)
+        _async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=BASE_URL,
+            max_retries=0,  # Retries are handled by retry_policy (jittered backoff + Retry-After)
+            http_client=httpx.AsyncClient(transport=transports.async_transport(POOL_LIMITS), timeout=_http_timeout()),
+        )
+        _async_loop = loop
+    return _async_client
+
+
+def get_sync_client() -> OpenAI:
+    """Process-wide blocking OpenAI client on its own keep-alive pool"""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=BASE_URL,
+            max_retries=0,
+            http_client=httpx.Client(transport=transports.sync_transport(POOL_LIMITS), timeout=_http_timeout()),
+        )
+    return _sync_client
+
+
+def resolve_options(task: Optional[str], model: Optional[str], max_tokens: Optional[int],
+                    temperature: Optional[float], timeout: Optional[float]) -> Dict[str, Any]:
+    """Explicit arguments win, then the task's route, then the model's defaults"""
+    route = route_for(task)
+    model = model or route.get("model") or DEFAULT_MODEL
+    defaults = MODEL_DEFAULTS.get(model, MODEL_DEFAULTS[DEFAULT_MODEL])
+
+    def pick(name, value):
+        if value is not None:
+            return value
+        return route[name] if route.get(name) is not None else defaults[name]
+
+    return {
+        "model": model,
+        "max_tokens": pick("max_tokens", max_tokens),
+        "temperature": pick("temperature", temperature),
+        "timeout": pick("timeout", timeout),
+    }
+
+
+def fit_to_window(messages: List[Dict[str, Any]], opts: Dict[str, Any]) -> Dict[str, Any]:
+    """Clamp max_tokens to what the model's context window has left after the prompt.
+
+    Raises ContextOverflowError when the prompt alone (nearly) fills the window.
+    """
+    budget = completion_budget(messages, opts["model"], desired=opts["max_tokens"])
+    if budget < opts["max_tokens"]:
+        logger.info(f"Clamped max_tokens {opts['max_tokens']} -> {budget} to fit the {opts['model']} context window")
+        opts["max_tokens"] = budget
+    return opts
+
+
+def within_deadline(opts: Dict[str, Any]) -> Dict[str, Any]:
+    """Call options with the timeout cut to what the current request's deadline has left"""
+    return dict(opts, timeout=request_deadline.clamp_timeout(opts["timeout"]))
+
+
+@contextmanager
+def caller_limits(attempt_timeout: float, route_timeout: float):
+    """Re-raise a timeout as DeadlineExceeded when the caller's deadline or budget shortened the attempt.
+
+    Such timeouts say nothing about the provider, so they are neither retried nor counted by the breaker.
+    """
+    try:
+        yield
+    except (openai.APITimeoutError, asyncio.TimeoutError) as e:
+        if attempt_timeout >= route_timeout:
+            raise
+        left = request_deadline.remaining()
+        raise DeadlineExceeded(max(0.0, -left) if left is not None else 0.0) from e
+
+
+def _entry(model: str, task: Optional[str]) -> Dict[str, float]:
+    return _route_stats.setdefault((model, task or "default"), {
+        "calls": 0, "errors": 0, "cache_hits": 0, "total_latency": 0.0,
+        "upstream_calls": 0, "upstream_seconds": 0.0, "completion_tokens": 0,
+    })
+
+
+def _record(model: str, task: Optional[str], latency: float, ok: bool, cached: bool = False):
+    """Count one caller-visible call (cache hits and coalesced duplicates included)"""
+    entry = _entry(model, task)
+    entry["calls"] += 1
+    if cached:
+        entry["cache_hits"] += 1
+    if not ok:
+        entry["errors"] += 1
+    entry["total_latency"] += latency
+
+
+def _record_upstream(messages: List[Dict[str, Any]], opts: Dict[str, Any], task: Optional[str], seconds: float,
+                     content: str, usage=None, ttft: Optional[float] = None, finish_reason: Optional[str] = None,
+                     streamed: bool = False):
+    """Count one successful provider call and log its tokens, TTFT and throughput"""
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    if prompt_tokens is None:
+        prompt_tokens = count_message_tokens(messages, opts["model"])
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if completion_tokens is None:
+        completion_tokens = token_budget.count_tokens(content, opts["model"])
+    entry = _entry(opts["model"], task)
+    entry["upstream_calls"] += 1
+    entry["upstream_seconds"] += seconds
+    entry["completion_tokens"] += completion_tokens
+    metrics.record(CallRecord(
+        endpoint=current_endpoint.get(), task=task or "default", model=opts["model"], ok=True,
+        latency_seconds=round(seconds, 3), ttft_seconds=round(ttft, 3) if ttft is not None else None,
+        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+        finish_reason=finish_reason, streamed=streamed,
+    ))
+    # Streams are open-ended (markdown, SSE) and don't size the whole-answer budgets
+    if not streamed and budgets.tracks(task):
+        budgets.observe(task, count_message_tokens(messages, opts["model"]), completion_tokens, seconds,
+                        opts["max_tokens"], finish_reason=finish_reason)
+
+
+def _record_upstream_error(messages: List[Dict[str, Any]], opts: Dict[str, Any], task: Optional[str], seconds: float,
+                           error: BaseException, streamed: bool = False):
+    metrics.record(CallRecord(
+        endpoint=current_endpoint.get(), task=task or "default", model=opts["model"], ok=False,
+        latency_seconds=round(seconds, 3), streamed=streamed, error=type(error).__name__,
+    ))
+    # A call that ran into its timeout counts at the full timeout, so the learned one grows back
+    if not streamed and budgets.tracks(task) and "Timeout" in type(error).__name__:
+        budgets.observe(task, count_message_tokens(messages, opts["model"]), 0, opts["timeout"],
+                        opts["max_tokens"], timed_out=True)
+
+
+def suggest_budget(messages: List[Dict[str, Any]], task: str, max_tokens: int, timeout: float, minimum: int = 0):
+    """(max_tokens, timeout) for `task` learned from past calls of this prompt size, else the given ones"""
+    if not budgets.tracks(task):
+        return max_tokens, timeout
+    prompt_tokens = count_message_tokens(messages, route_for(task).get("model") or DEFAULT_MODEL)
+    learned_tokens, learned_timeout = budgets.suggest(task, prompt_tokens, max_tokens, timeout, minimum)
+    if (learned_tokens, learned_timeout) != (max_tokens, timeout):
+        logger.info(f"Adaptive budget for {task} (~{prompt_tokens} prompt tokens): max_tokens {max_tokens} -> "
+                    f"{learned_tokens}, timeout {timeout}s -> {learned_timeout}s")
+    return learned_tokens, learned_timeout
+
+
+# ─── Async API ──────────────────────────────────────────────────────────────────
+async def cached_reply(messages: List[Dict[str, Any]], model: Optional[str] = None, max_tokens: Optional[int] = None,
+                       temperature: Optional[float] = None, task: Optional[str] = None) -> Optional[str]:
+    """The cached text chat() would return for these arguments, without calling upstream"""
+    try:
+        opts = fit_to_window(messages, resolve_options(task, model, max_tokens, temperature, None))
+    except ContextOverflowError:
+        return None
+    return await cache.aget(make_cache_key(opts["model"], messages, opts["temperature"], opts["max_tokens"]))
+
+
+async def chat(messages: List[Dict[str, Any]], model: Optional[str] = None, max_tokens: Optional[int] = None,
+               temperature: Optional[float] = None, timeout: Optional[float] = None, use_cache: bool = True,
+               priority: int = PRIORITY_DEFAULT, max_attempts: Optional[int] = None, task: Optional[str] = None,
+               hedge: Optional[bool] = None, budget: Optional[float] = None) -> str:
+    """Chat completion text through cache, single-flight, admission, retries and breaker.
+
+    `task` picks model/max_tokens/timeout from the routing table unless passed explicitly.
+    `hedge` (default: LLM_HEDGE_TASKS) re-issues the call if its first token is late.
+    `budget` (seconds, a caller's latency promise) allows one attempt cut to that long.
+    Each attempt's timeout is cut to the request deadline (request_deadline); raises
+    DeadlineExceeded once it has passed, CircuitOpenError while the breaker is open,
+    otherwise the final upstream error.
+    """
+    opts = fit_to_window(messages, resolve_options(task, model, max_tokens, temperature, timeout))
+    route_timeout = opts["timeout"]
+    if budget is not None:
+        opts["timeout"], max_attempts = min(opts["timeout"], budget), 1
+    start = time.perf_counter()
+    cache_key = make_cache_key(opts["model"], messages, opts["temperature"], opts["max_tokens"])
+    if use_cache:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit ({cache_key[:12]})")
+            _record(opts["model"], task, time.perf_counter() - start, True, cached=True)
+            return cached
+
+    async def streamed_attempt(on_first_token):
+        # Calls stream so the first token's arrival (TTFT, hedging) is visible; the text is returned whole
+        async with admission.slot(estimate_request_tokens(messages, opts["max_tokens"], opts["model"]), priority) as ticket:
+            attempt_start = time.perf_counter()
+            attempt_opts = within_deadline(opts)
+            with caller_limits(attempt_opts["timeout"], route_timeout):
+                stream = await get_async_client().chat.completions.create(
+                    messages=messages, stream=True, stream_options={"include_usage": True}, **attempt_opts
+                )
+                parts = []
+                usage = None
+                finish_reason = None
+                ttft = None
+                async with stream:
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None):
+                            usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        delta = choice.delta.content if choice.delta else None
+                        if delta:
+                            if not parts:
+                                ttft = time.perf_counter() - attempt_start
+                                on_first_token()
+                            parts.append(delta)
+                        if choice.finish_reason:
+                            finish_reason = choice.finish_reason
+            if usage is not None:
+                ticket.used_tokens = usage.total_tokens
+        message = SimpleNamespace(content="".join(parts))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)],
+                               usage=usage, ttft=ttft)
+
+    use_hedging = hedger.enabled_for(task) if hedge is None else hedge
+
+    async def call_upstream():
+        if not use_hedging:
+            return await retry_policy.run(
+                lambda: streamed_attempt(lambda: None), breaker, label=opts["model"], max_attempts=max_attempts
+            )
+        return await hedger.run(
+            f"{opts['model']}:{task or 'default'}",
+            lambda on_first_token: retry_policy.run(
+                lambda: streamed_attempt(on_first_token), breaker, label=opts["model"], max_attempts=max_attempts
+            ),
+        )
+
+    async def upstream():
+        upstream_start = time.perf_counter()
+        try:
+            response = await call_upstream()
+        except Exception as e:
+            _record_upstream_error(messages, opts, task, time.perf_counter() - upstream_start, e)
+            raise
+        content = (response.choices[0].message.content or "").strip()
+        _record_upstream(messages, opts, task, time.perf_counter() - upstream_start, content, usage=response.usage,
+                         ttft=response.ttft, finish_reason=response.choices[0].finish_reason)
+        # A reply cut off at max_tokens must not be replayed for the cache TTL
+        if use_cache and response.choices[0].finish_reason == "stop":
+            await cache.aset(cache_key, content)
+        return content
+
+    try:
+        # Identical requests already in flight share one upstream call
+        content = await singleflight.do(cache_key, upstream)
+    except Exception:
+        _record(opts["model"], task, time.perf_counter() - start, False)
+        raise
+    _record(opts["model"], task, time.perf_counter() - start, True)
+    return content
+
+
+async def chat_stream(messages: List[Dict[str, Any]], model: Optional[str] = None, max_tokens: Optional[int] = None,
+                      temperature: Optional[float] = None, timeout: Optional[float] = None, use_cache: bool = True,
+                      priority: int = PRIORITY_INTERACTIVE, task: Optional[str] = None,
+                      budget: Optional[float] = None) -> AsyncIterator[str]:
+    """Stream completion text deltas (stream=True); a cache hit replays as one chunk.
+
+    With a `budget` (seconds) the stream gets one attempt to open, its timeout cut to the budget.
+    """
+    opts = fit_to_window(messages, resolve_options(task, model, max_tokens, temperature, timeout))
+    max_attempts = None
+    route_timeout = opts["timeout"]
+    if budget is not None:
+        opts["timeout"], max_attempts = min(opts["timeout"], budget), 1
+    start = time.perf_counter()
+    cache_key = make_cache_key(opts["model"], messages, opts["temperature"], opts["max_tokens"])
+    if use_cache:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit ({cache_key[:12]}), replaying as one chunk")
+            _record(opts["model"], task, time.perf_counter() - start, True, cached=True)
+            yield cached
+            return
+
+    async def open_stream():
+        attempt_opts = within_deadline(opts)
+        with caller_limits(attempt_opts["timeout"], route_timeout):
+            return await get_async_client().chat.completions.create(
+                messages=messages, stream=True, stream_options={"include_usage": True}, **attempt_opts
+            )
+
+    async def upstream():
+        # The admission slot is held for the whole stream
+        async with admission.slot(estimate_request_tokens(messages, opts["max_tokens"], opts["model"]), priority):
+            # Retries only apply until the stream opens - never after tokens were sent
+            upstream_start = time.perf_counter()
+            try:
+                stream = await retry_policy.run(open_stream, breaker, label=f"{opts['model']} stream",
+                                                max_attempts=max_attempts)
+            except Exception as e:
+                _record_upstream_error(messages, opts, task, time.perf_counter() - upstream_start, e, streamed=True)
+                raise
+            parts = []
+            usage = None
+            finish_reason = None
+            ttft = None
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                delta = choice.delta.content if choice.delta else None
+                if delta:
+                    if ttft is None:
+                        ttft = time.perf_counter() - upstream_start
+                    parts.append(delta)
+                    yield delta
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+            text = "".join(parts)
+            _record_upstream(messages, opts, task, time.perf_counter() - upstream_start, text, usage=usage,
+                             ttft=ttft, finish_reason=finish_reason, streamed=True)
+
+        # Only complete generations are worth replaying later
+        if use_cache and finish_reason == "stop":
+            await cache.aset(cache_key, text.strip())
+
+    try:
+        # Duplicate streams replay the buffered deltas, then follow the live one
+        async for delta in singleflight.stream(f"stream:{cache_key}", upstream):
+            yield delta
+    except Exception:
+        _record(opts["model"], task, time.perf_counter() - start, False)
+        raise
+    _record(opts["model"], task, time.perf_counter() - start, True)
+
+
+# ─── Sync API ───────────────────────────────────────────────────────────────────
+def chat_sync(messages: List[Dict[str, Any]], model: Optional[str] = None, max_tokens: Optional[int] = None,
+              temperature: Optional[float] = None, timeout: Optional[float] = None, use_cache: bool = True,
+              task: Optional[str] = None) -> str:
+    """Blocking chat completion for Streamlit scripts; shares cache, pool settings, retries and breaker.
+
+    Admission control is async-only, so calls made here are not queued.
+    """
+    opts = fit_to_window(messages, resolve_options(task, model, max_tokens, temperature, timeout))
+    start = time.perf_counter()
+    cache_key = make_cache_key(opts["model"], messages, opts["temperature"], opts["max_tokens"])
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            _record(opts["model"], task, time.perf_counter() - start, True, cached=True)
+            return cached
+
+    try:
+        upstream_start = time.perf_counter()
+        response = retry_policy.run_sync(
+            lambda: get_sync_client().chat.completions.create(messages=messages, **opts),
+            breaker, label=opts["model"]
+        )
+    except Exception as e:
+        _record_upstream_error(messages, opts, task, time.perf_counter() - upstream_start, e)
+        _record(opts["model"], task, time.perf_counter() - start, False)
+        raise
+    content = (response.choices[0].message.content or "").strip()
+    # Blocking calls don't stream, so they have no TTFT
+    _record_upstream(messages, opts, task, time.perf_counter() - upstream_start, content,
+                     usage=getattr(response, "usage", None), finish_reason=response.choices[0].finish_reason)
+    if use_cache and response.choices[0].finish_reason == "stop":
+        cache.set(cache_key, content)
+    _record(opts["model"], task, time.perf_counter() - start, True)
+    return content
+
+
+# ─── Batch API ──────────────────────────────────────────────────────────────────
+# Provider batch jobs trade latency (up to the completion window) for throughput and
+# price; they bypass admission, retries and the breaker, which the provider applies itself.
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+def batch_request(custom_id: str, messages: List[Dict[str, Any]], task: Optional[str] = None,
+                  max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """One JSONL line of a batch input file, resolved through the same routing as chat()"""
+    opts = fit_to_window(messages, resolve_options(task, None, max_tokens, None, None))
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": opts["model"], "messages": messages, "max_tokens": opts["max_tokens"],
+                 "temperature": opts["temperature"]},
+    }
+
+
+async def submit_batch(requests: List[Dict[str, Any]], completion_window: str = "24h") -> str:
+    """Upload batch_request() lines and start a provider batch; returns the batch id"""
+    client = get_async_client()
+    payload = "\n".join(json.dumps(line) for line in requests).encode()
+    upload = await client.files.create(file=("bulk.jsonl", payload), purpose="batch")
+    batch = await client.batches.create(input_file_id=upload.id, endpoint=BATCH_ENDPOINT,
+                                        completion_window=completion_window)
+    _batch_stats["batches"] += 1
+    _batch_stats["requests"] += len(requests)
+    logger.info(f"Submitted batch {batch.id} with {len(requests)} requests")
+    return batch.id
+
+
+async def wait_for_batch(batch_id: str, poll_seconds: float = 60.0):
+    """Poll a batch until it reaches a terminal state"""
+    client = get_async_client()
+    while True:
+        batch = await client.batches.retrieve(batch_id)
+        if batch.status in BATCH_TERMINAL_STATES:
+            return batch
+        await asyncio.sleep(poll_seconds)
+
+
+async def batch_results(batch, requests: List[Dict[str, Any]]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """custom_id -> (content, error) for a finished batch; complete answers also fill the cache"""
+    client = get_async_client()
+    bodies = {line["custom_id"]: line["body"] for line in requests}
+    results: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        text = (await client.files.content(file_id)).text
+        for raw in text.splitlines():
+            if not raw.strip():
+                continue
+            line = json.loads(raw)
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            if response.get("status_code") != 200 or not body.get("choices"):
+                error = line.get("error") or body.get("error") or {}
+                results[line["custom_id"]] = (None, error.get("message") or f"status {response.get('status_code')}")
+                continue
+            choice = body["choices"][0]
+            content = (choice["message"].get("content") or "").strip()
+            request = bodies.get(line["custom_id"])
+            if request and choice.get("finish_reason") == "stop":
+                await cache.aset(make_cache_key(request["model"], request["messages"], request["temperature"],
+                                                request["max_tokens"]), content)
+            results[line["custom_id"]] = (content, None)
+    for custom_id in bodies:
+        results.setdefault(custom_id, (None, f"batch {batch.status} without a result"))
+    _batch_stats["succeeded"] += sum(1 for content, _ in results.values() if content is not None)
+    _batch_stats["failed"] += sum(1 for content, _ in results.values() if content is None)
+    return results
+
+
+# ─── Stats ──────────────────────────────────────────────────────────────────────
+def _summarize(entry: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        "calls": entry["calls"],
+        "errors": entry["errors"],
+        "cache_hits": entry["cache_hits"],
+        "avg_latency_seconds": round(entry["total_latency"] / entry["calls"], 3) if entry["calls"] else 0.0,
+        "upstream_calls": entry["upstream_calls"],
+        "avg_upstream_seconds": round(entry["upstream_seconds"] / entry["upstream_calls"], 3) if entry["upstream_calls"] else 0.0,
+        "completion_tokens": entry["completion_tokens"],
+        "tokens_per_second": round(entry["completion_tokens"] / entry["upstream_seconds"], 1) if entry["upstream_seconds"] else 0.0,
+    }
+
+
+def stats() -> Dict[str, Any]:
+    """Counters for every gateway component"""
+    return _stats(cache.stats())
+
+
+async def astats() -> Dict[str, Any]:
+    """stats() with the cache's disk count taken off the event loop"""
+    return _stats(await cache.astats())
+
+
+def _stats(cache_stats: Dict[str, Any]) -> Dict[str, Any]:
+    by_model: Dict[str, Dict[str, float]] = {}
+    tasks = {}
+    for (model, task), entry in sorted(_route_stats.items()):
+        totals = by_model.setdefault(model, dict.fromkeys(entry, 0))
+        for key, value in entry.items():
+            totals[key] += value
+        tasks.setdefault(task, {})[model] = _summarize(entry)
+    return {
+        "models": {model: _summarize(totals) for model, totals in by_model.items()},
+        "tasks": tasks,
+        "routes": ROUTES,
+        "tokens": token_budget.stats(),
+        "base_url": BASE_URL or "https://api.openai.com/v1",
+        "pool": {
+            "max_connections": POOL_LIMITS.max_connections,
+            "max_keepalive_connections": POOL_LIMITS.max_keepalive_connections,
+            "keepalive_expiry": POOL_LIMITS.keepalive_expiry,
+        },
+        "cache": cache_stats,
+        "singleflight": singleflight.stats(),
+        "admission": admission.stats(),
+        "retry": retry_policy.stats(),
+        "circuit_breaker": breaker.stats(),
+        "hedging": hedger.stats(),
+        "deadlines": request_deadline.stats(),
+        "metrics": metrics.stats(),
+        "transport": transports.stats(),
+        "adaptive_budgets": budgets.stats(),
+        "batches": dict(_batch_stats),
+    }
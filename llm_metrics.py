@@ -0,0 +1,163 @@
+# llm_metrics.py - Per-call LLM instrumentation: tokens, time-to-first-token, throughput
+#
+# Every upstream call made by llm_gateway is recorded once, logged as a single JSON line
+# on the "llm_metrics" logger and kept in a rolling window for aggregate queries.
+# TTFT is mostly queueing + prefill (grows with prompt size); the time after it is
+# decoding (grows with completion length), so the two split "slow input" from "slow output".
+
+import os
+import json
+import time
+import logging
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict, field
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+GROUP_FIELDS = ("endpoint", "task", "model", "finish_reason")
+
+# Set per HTTP request by EndpointMiddleware; background callers stay "internal"
+current_endpoint: ContextVar[str] = ContextVar("llm_endpoint", default="internal")
+
+
+@dataclass
+class CallRecord:
+    """One upstream chat completion as seen by the gateway"""
+    endpoint: str
+    task: str
+    model: str
+    ok: bool
+    latency_seconds: float
+    ttft_seconds: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    finish_reason: Optional[str] = None
+    streamed: bool = False
+    error: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def generation_seconds(self) -> Optional[float]:
+        if self.ttft_seconds is None:
+            return None
+        return max(0.0, self.latency_seconds - self.ttft_seconds)
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.completion_tokens / self.latency_seconds if self.latency_seconds > 0 else 0.0
+
+    @property
+    def decode_tokens_per_second(self) -> Optional[float]:
+        generation = self.generation_seconds
+        if not generation:
+            return None
+        return self.completion_tokens / generation
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        generation = self.generation_seconds
+        data["generation_seconds"] = round(generation, 3) if generation is not None else None
+        data["tokens_per_second"] = round(self.tokens_per_second, 1)
+        decode = self.decode_tokens_per_second
+        data["decode_tokens_per_second"] = round(decode, 1) if decode is not None else None
+        return data
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _distribution(values: List[float], digits: int = 3) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"avg": None, "p50": None, "p95": None, "max": None}
+    return {
+        "avg": round(sum(values) / len(values), digits),
+        "p50": round(_percentile(values, 50), digits),
+        "p95": round(_percentile(values, 95), digits),
+        "max": round(max(values), digits),
+    }
+
+
+class MetricsRecorder:
+    """Rolling window of CallRecords with grouped aggregates"""
+
+    def __init__(self, window: int = 2000, log_calls: bool = True):
+        self.window = window
+        self.log_calls = log_calls
+        self._records: Deque[CallRecord] = deque(maxlen=window)
+        self.total_calls = 0
+
+    def record(self, record: CallRecord):
+        self._records.append(record)
+        self.total_calls += 1
+        if self.log_calls:
+            logger.info(json.dumps({"event": "llm_call", **record.to_dict()}, default=str))
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return [record.to_dict() for record in list(self._records)[-limit:]] if limit > 0 else []
+
+    def aggregate(self, group_by: Iterable[str] = ("endpoint", "task")) -> List[Dict[str, Any]]:
+        """Summaries per group over the window, slowest average latency first"""
+        group_by = [name for name in group_by if name in GROUP_FIELDS] or ["endpoint"]
+        groups: Dict[tuple, List[CallRecord]] = {}
+        for record in self._records:
+            groups.setdefault(tuple(getattr(record, name) for name in group_by), []).append(record)
+
+        summaries = []
+        for key, records in groups.items():
+            ok = [r for r in records if r.ok]
+            finish_reasons: Dict[str, int] = {}
+            for r in ok:
+                finish_reasons[r.finish_reason or "unknown"] = finish_reasons.get(r.finish_reason or "unknown", 0) + 1
+            summaries.append({
+                **dict(zip(group_by, key)),
+                "calls": len(records),
+                "errors": len(records) - len(ok),
+                "latency_seconds": _distribution([r.latency_seconds for r in ok]),
+                "ttft_seconds": _distribution([r.ttft_seconds for r in ok if r.ttft_seconds is not None]),
+                "generation_seconds": _distribution([r.generation_seconds for r in ok if r.generation_seconds is not None]),
+                "prompt_tokens": _distribution([r.prompt_tokens for r in ok], digits=0),
+                "completion_tokens": _distribution([r.completion_tokens for r in ok], digits=0),
+                "tokens_per_second": _distribution([r.tokens_per_second for r in ok], digits=1),
+                "decode_tokens_per_second": _distribution(
+                    [r.decode_tokens_per_second for r in ok if r.decode_tokens_per_second is not None], digits=1
+                ),
+                "finish_reasons": finish_reasons,
+            })
+        summaries.sort(key=lambda s: s["latency_seconds"]["avg"] or 0.0, reverse=True)
+        return summaries
+
+    def stats(self) -> Dict[str, Any]:
+        return {"window": self.window, "recorded": len(self._records), "total_calls": self.total_calls}
+
+
+class EndpointMiddleware:
+    """ASGI middleware: tags LLM calls made while serving a request with its path"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_endpoint.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_endpoint.reset(token)
+
+
+def build_recorder_from_env() -> MetricsRecorder:
+    return MetricsRecorder(
+        window=int(os.getenv("LLM_METRICS_WINDOW", "2000")),
+        log_calls=os.getenv("LLM_METRICS_LOG", "true").lower() == "true",
+    )
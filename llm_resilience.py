@@ -0,0 +1,214 @@
+# llm_resilience.py - Async retry policy (jittered backoff + Retry-After) and circuit breaker
+
+import os
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import openai
+
+from request_deadline import remaining
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open"""
+
+    def __init__(self, retry_in: float):
+        self.retry_in = retry_in
+        super().__init__(f"AI service circuit open; retry in {retry_in:.0f}s")
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient upstream failures: timeouts, dropped connections, 429 and 5xx"""
+    if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return status_code_of(error) in RETRYABLE_STATUS_CODES
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Failures that mean the provider is unhealthy (rate limits are paced elsewhere)"""
+    return is_retryable(error) and status_code_of(error) != 429
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Read the provider's Retry-After hint (retry-after-ms, seconds or HTTP date)"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Opens after consecutive upstream failures; lets one probe through after a cool-down"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        if self.state == "closed":
+            return
+        elapsed = time.monotonic() - self.opened_at
+        if self.state == "open" and elapsed >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        self.short_circuited += 1
+        raise CircuitOpenError(max(0.0, self.reset_timeout - elapsed))
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != "closed":
+            logger.info("AI service circuit closed")
+        self.state = "closed"
+
+    def record_cancelled(self):
+        self._probe_in_flight = False
+
+    def record_failure(self, error: BaseException):
+        self._probe_in_flight = False
+        if not is_upstream_failure(error):
+            return
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(f"AI service circuit opened after {self.consecutive_failures} failures: {str(error)}")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class RetryPolicy:
+    """Full-jitter exponential backoff that defers to Retry-After when the provider sends it"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.retry_after_honored = 0
+        self.skipped_past_deadline = 0
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        hinted = retry_after_seconds(error)
+        if hinted is not None:
+            self.retry_after_honored += 1
+            return min(hinted, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(self, fn: Callable[[], Awaitable[Any]], breaker: Optional[CircuitBreaker] = None,
+                  label: str = "LLM", max_attempts: Optional[int] = None) -> Any:
+        attempts = max_attempts or self.max_attempts
+        for attempt in range(attempts):
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                if breaker is not None:
+                    breaker.record_cancelled()
+                raise
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record_failure(e)
+                if not is_retryable(e) or attempt == attempts - 1:
+                    raise
+                delay = self.backoff(attempt, e)
+                left = remaining()
+                if left is not None and delay >= left:
+                    # The caller would be gone before the retry could answer
+                    self.skipped_past_deadline += 1
+                    logger.info(f"{label} call failed ({str(e)}); no retry, {max(0.0, left):.1f}s left before the deadline")
+                    raise
+                self.retries += 1
+                logger.info(f"{label} call failed ({str(e)}); retrying in {delay:.1f}s (attempt {attempt + 2}/{attempts})")
+                await asyncio.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    def run_sync(self, fn: Callable[[], Any], breaker: Optional[CircuitBreaker] = None,
+                 label: str = "LLM", max_attempts: Optional[int] = None) -> Any:
+        """Blocking twin of run() for callers without an event loop (Streamlit scripts)"""
+        attempts = max_attempts or self.max_attempts
+        for attempt in range(attempts):
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                result = fn()
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record_failure(e)
+                if not is_retryable(e) or attempt == attempts - 1:
+                    raise
+                delay = self.backoff(attempt, e)
+                self.retries += 1
+                logger.info(f"{label} call failed ({str(e)}); retrying in {delay:.1f}s (attempt {attempt + 2}/{attempts})")
+                time.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_attempts": self.max_attempts,
+            "retries": self.retries,
+            "retry_after_honored": self.retry_after_honored,
+            "skipped_past_deadline": self.skipped_past_deadline,
+        }
+
+
+def build_retry_policy_from_env() -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3")),
+        base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0")),
+        max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "60")),
+    )
+
+
+def build_circuit_breaker_from_env() -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "60")),
+    )
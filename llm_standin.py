@@ -0,0 +1,486 @@
+# llm_standin.py - Offline OpenAI-compatible stand-in for load tests, benchmarks and CI
+#
+# Run:   python llm_standin.py --port 8011 --profile gpt-4
+# Use:   OPENAI_BASE_URL=http://127.0.0.1:8011/v1 uvicorn main:app
+#
+# Serves /v1/chat/completions (JSON and stream=True, text and vision) with canned,
+# schema-valid answers for every prompt main.py sends, simulated latency, 429s,
+# 5xx errors and truncated (finish_reason="length") outputs. /v1/files and /v1/batches
+# run chat-completion batches in memory, finishing after one simulated completion.
+
+import os
+import re
+import json
+import time
+import math
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="OpenAI stand-in")
+
+# ─── Configuration ───────────────────────────────────────────────────────────────
+# ttft: lognormal time-to-first-token (median seconds, sigma); tps: output tokens/sec;
+# tail: probability that a request is slowed down by tail_factor.
+# The "per-model" profile picks the entry named after the requested model.
+LATENCY_PROFILES: Dict[str, Dict[str, float]] = {
+    "instant":  {"ttft_median": 0.0, "ttft_sigma": 0.0, "tps": 0.0,  "tail": 0.0,  "tail_factor": 1.0},
+    "fast":     {"ttft_median": 0.2, "ttft_sigma": 0.3, "tps": 200,  "tail": 0.0,  "tail_factor": 1.0},
+    "gpt-4o-mini": {"ttft_median": 0.4, "ttft_sigma": 0.4, "tps": 120, "tail": 0.02, "tail_factor": 3.0},
+    "gpt-4o":   {"ttft_median": 0.6, "ttft_sigma": 0.4, "tps": 80,   "tail": 0.02, "tail_factor": 3.0},
+    "gpt-4":    {"ttft_median": 1.2, "ttft_sigma": 0.5, "tps": 25,   "tail": 0.05, "tail_factor": 4.0},
+    # Healthy median with rare 20x stragglers - for hedging experiments
+    "stragglers": {"ttft_median": 1.0, "ttft_sigma": 0.2, "tps": 100, "tail": 0.05, "tail_factor": 20.0},
+    "degraded": {"ttft_median": 3.0, "ttft_sigma": 0.8, "tps": 10,   "tail": 0.10, "tail_factor": 5.0},
+}
+
+settings: Dict[str, Any] = {
+    "profile": os.getenv("STANDIN_PROFILE", "fast"),
+    "time_scale": float(os.getenv("STANDIN_TIME_SCALE", "1.0")),      # 0.01 compresses runs for CI
+    "rate_limit_rate": float(os.getenv("STANDIN_RATE_LIMIT_RATE", "0")),
+    "error_rate": float(os.getenv("STANDIN_ERROR_RATE", "0")),
+    "truncate_rate": float(os.getenv("STANDIN_TRUNCATE_RATE", "0")),
+    "retry_after_seconds": float(os.getenv("STANDIN_RETRY_AFTER_SECONDS", "1")),
+}
+
+rng = random.Random(int(os.getenv("STANDIN_SEED", "42")))
+
+counters: Dict[str, Any] = {"requests": 0, "streams": 0, "rate_limited": 0, "server_errors": 0,
+                            "truncated": 0, "batches": 0, "by_kind": {}}
+
+# Uploaded files (id -> metadata + text) and batches (id -> batch object)
+files: Dict[str, Dict[str, Any]] = {}
+batches: Dict[str, Dict[str, Any]] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def sample_latency(model: str) -> Dict[str, float]:
+    """Draw (time to first token, per-token delay) for one request from the active profile"""
+    name = settings["profile"]
+    if name == "per-model":
+        name = model if model in LATENCY_PROFILES else "gpt-4"
+    profile = LATENCY_PROFILES.get(name, LATENCY_PROFILES["fast"])
+    scale = settings["time_scale"]
+    ttft = 0.0
+    if profile["ttft_median"] > 0:
+        ttft = profile["ttft_median"] * math.exp(rng.gauss(0, profile["ttft_sigma"]))
+    per_token = 1.0 / profile["tps"] if profile["tps"] else 0.0
+    if profile["tail"] and rng.random() < profile["tail"]:
+        ttft *= profile["tail_factor"]
+        per_token *= profile["tail_factor"]
+    return {"ttft": ttft * scale, "per_token": per_token * scale}
+
+
+# ─── Canned outputs ─────────────────────────────────────────────────────────────
+SQL_TYPES = {
+    "int": "int", "integer": "int", "bigint": "int", "smallint": "int", "number": "decimal",
+    "decimal": "decimal", "numeric": "decimal", "float": "decimal", "double": "decimal", "money": "decimal",
+    "date": "date", "datetime": "date", "timestamp": "date", "bool": "boolean", "boolean": "boolean", "bit": "boolean",
+}
+
+
+def text_of(message: Dict[str, Any]) -> str:
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "\n".join(str(part.get("text", "")) for part in content if part.get("type") == "text")
+    return str(content or "")
+
+
+def has_image(messages: List[Dict[str, Any]]) -> bool:
+    return any(isinstance(m.get("content"), list) and any(p.get("type") == "image_url" for p in m["content"])
+               for m in messages)
+
+
+def classify(messages: List[Dict[str, Any]]) -> str:
+    system = " ".join(text_of(m) for m in messages if m.get("role") == "system")
+    if has_image(messages):
+        return "vision"
+    if "Extract relationships from SQL" in system:
+        return "relationships"
+    if "SQL DDL" in system:
+        return "data_model"
+    if "Agile sprint planning" in system:
+        return "sprint"
+    if "BI dashboards" in system:
+        return "layout_markdown" if "without any JSON wrapper" in system else "layout"
+    if "KPIs and metrics" in system:
+        return "kpis"
+    if "data dictionary" in system:
+        return "dictionary"
+    if "data engineer" in system:
+        return "data_prep"
+    return "text"
+
+
+def canned_data_model(ddl: str) -> Dict[str, Any]:
+    """Tables/columns/FKs pulled from the CREATE TABLE statements in the prompt"""
+    tables, relationships = [], []
+    for match in re.finditer(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w.\"`\[\]]+)\s*\((.*?)\)\s*;",
+                             ddl, re.IGNORECASE | re.DOTALL):
+        name = re.sub(r"[\"`\[\]]", "", match.group(1)).split(".")[-1]
+        columns = []
+        for line in match.group(2).split(","):
+            parts = line.strip().split()
+            if len(parts) < 2 or parts[0].upper() in {"PRIMARY", "FOREIGN", "CONSTRAINT", "UNIQUE", "KEY", "INDEX"}:
+                continue
+            col_type = SQL_TYPES.get(re.sub(r"\(.*", "", parts[1]).lower(), "string")
+            upper = line.upper()
+            columns.append({
+                "name": parts[0].strip("\"`[]"), "type": col_type, "nullable": "NOT NULL" not in upper,
+                "is_primary_key": "PRIMARY KEY" in upper, "is_foreign_key": "REFERENCES" in upper,
+            })
+            ref = re.search(r"REFERENCES\s+([\w.]+)\s*\(\s*(\w+)", line, re.IGNORECASE)
+            if ref:
+                relationships.append({"from": name, "to": ref.group(1).split(".")[-1], "from_column": columns[-1]["name"],
+                                      "to_column": ref.group(2), "type": "many-to-one"})
+        tables.append({"name": name, "columns": columns or [{"name": "id", "type": "int", "nullable": False,
+                                                             "is_primary_key": True, "is_foreign_key": False}]})
+    if not tables:
+        tables = [{"name": "sample_table", "columns": [{"name": "id", "type": "int", "nullable": False,
+                                                        "is_primary_key": True, "is_foreign_key": False}]}]
+    return {"tables": tables, "relationships": relationships}
+
+
+def canned_relationships(sql: str) -> Dict[str, Any]:
+    relationships = []
+    for match in re.finditer(r"ALTER\s+TABLE\s+([\w.]+).*?FOREIGN\s+KEY\s*\(\s*(\w+)\s*\)\s*REFERENCES\s+([\w.]+)\s*\(\s*(\w+)",
+                             sql, re.IGNORECASE | re.DOTALL):
+        relationships.append({"from": match.group(1).split(".")[-1], "to": match.group(3).split(".")[-1],
+                              "from_column": match.group(2), "to_column": match.group(4), "type": "many-to-one"})
+    return {"relationships": relationships}
+
+
+LAYOUT_MARKDOWN = """## Measures (DAX Formulas)
+
+### Total Sales
+```
+Total Sales = SUM(Sales[Amount])
+```
+**Purpose**: Sum of all sales amounts
+
+### Sales YTD
+```
+Sales YTD = TOTALYTD([Total Sales], Calendar[Date])
+```
+**Purpose**: Year-to-date sales
+
+## Calculated Columns (DAX Formulas)
+
+### Order Year
+```
+Order Year = YEAR(Sales[OrderDate])
+```
+**Purpose**: Calendar year of each order
+
+## KPI Card
+1. Insert a Card visual at the top-left
+2. Values: [Total Sales]
+3. No filters
+4. Display units: Millions
+
+## Line Chart
+1. Insert a Line chart across the middle
+2. Axis: Calendar[Date]; Values: [Sales YTD]
+3. Sort by date ascending
+4. Enable markers
+
+## Table
+1. Insert a Table visual at the bottom
+2. Values: Product[Name], [Total Sales]
+3. Sort by [Total Sales] descending
+4. Alternate row shading
+"""
+
+
+def canned_sprint(user_text: str) -> Dict[str, Any]:
+    try:
+        velocity = json.loads(user_text).get("team_context", {}).get("total_velocity", 20) or 20
+    except (ValueError, AttributeError):
+        velocity = 20
+    stories = [
+        {"title": "Create base measures", "points": 3, "description": "Build Total Sales and Sales YTD measures",
+         "acceptance_criteria": ["Measures match finance totals"], "priority": "High", "dependencies": []},
+        {"title": "Build KPI cards", "points": 2, "description": "Add KPI cards to the header row",
+         "acceptance_criteria": ["Cards show current values"], "priority": "High",
+         "dependencies": ["Create base measures"]},
+        {"title": "Build sales trend chart", "points": 5, "description": "Line chart of sales over time",
+         "acceptance_criteria": ["Chart filters by region"], "priority": "Medium",
+         "dependencies": ["Create base measures"]},
+        {"title": "Build product table", "points": 3, "description": "Top products table with sorting",
+         "acceptance_criteria": ["Sorted by sales descending"], "priority": "Medium", "dependencies": []},
+        {"title": "Dashboard QA and publish", "points": 5, "description": "Validate numbers and publish",
+         "acceptance_criteria": ["Stakeholder sign-off"], "priority": "Low",
+         "dependencies": ["Build KPI cards", "Build sales trend chart", "Build product table"]},
+    ]
+    total = sum(s["points"] for s in stories)
+    return {"sprint_stories": stories, "total_story_points": total,
+            "estimated_sprints": max(1, math.ceil(total / velocity))}
+
+
+def canned_content(kind: str, messages: List[Dict[str, Any]]) -> str:
+    user_text = "\n".join(text_of(m) for m in messages if m.get("role") == "user")
+    if kind == "data_model":
+        return json.dumps(canned_data_model(user_text))
+    if kind == "relationships":
+        return json.dumps(canned_relationships(user_text))
+    if kind == "layout":
+        try:
+            wireframe = json.loads(user_text).get("sketch_description", "")
+        except (ValueError, AttributeError):
+            wireframe = ""
+        return json.dumps({"wireframe_json": wireframe, "layout_instructions": LAYOUT_MARKDOWN})
+    if kind == "layout_markdown":
+        return LAYOUT_MARKDOWN
+    if kind == "sprint":
+        return json.dumps(canned_sprint(user_text), indent=2)
+    if kind == "kpis":
+        return json.dumps({"kpi_list": [
+            {"name": "Net Sales", "description": "Total sales after returns", "formula": "SUM(Sales) - SUM(Returns)",
+             "target": "$2M monthly", "category": "Sales", "frequency": "Monthly", "owner": "Sales"},
+            {"name": "Profit Margin", "description": "Share of revenue kept as profit",
+             "formula": "(Revenue - Costs) / Revenue", "target": "", "category": "Finance",
+             "frequency": "Monthly", "owner": "Finance"},
+        ], "parsing_notes": "Canned stand-in response"})
+    if kind == "dictionary":
+        return json.dumps({"data_dictionary": {"customer": {
+            "customer_id": {"description": "Unique customer identifier", "type": "int", "rules": "Required",
+                            "example": "1001"},
+            "email": {"description": "Customer email address", "type": "string", "rules": "Valid email",
+                      "example": "a@b.com"},
+        }}, "parsing_notes": "Canned stand-in response"})
+    if kind == "data_prep":
+        return ("# Data Preparation Steps\n\n## Step 1: Profile the source tables\n"
+                "Check row counts and null rates for every key column.\n\n"
+                "## Step 2: Clean and type columns\nCast dates, trim strings, and standardise currency fields.\n\n"
+                "## Step 3: Validate\nReconcile totals against the source system.\n")
+    if kind == "vision":
+        return ("Layout summary: a three-row dashboard.\n"
+                "- Top row: three KPI cards (Total Sales, Orders, Margin) at top-left, top-center, top-right\n"
+                "- Middle: a line chart of sales over time spanning the full width\n"
+                "- Bottom-left: a bar chart of sales by region\n"
+                "- Bottom-right: a table of top products\n"
+                "- A date slicer at the top-right corner\n")
+    return "OK"
+
+
+# ─── Responses ──────────────────────────────────────────────────────────────────
+def error_response(status: int, message: str, code: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(status_code=status, headers=headers or {},
+                        content={"error": {"message": message, "type": code, "param": None, "code": code}})
+
+
+def completion_body(model: str, content: str, finish_reason: str, prompt_tokens: int) -> Dict[str, Any]:
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-standin-{counters['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def chunk_body(model: str, delta: Dict[str, Any], finish_reason: Optional[str]) -> str:
+    chunk = {
+        "id": f"chatcmpl-standin-{counters['requests']}",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+def canned_completion(kind: str, body: Dict[str, Any]):
+    """(content, finish_reason, prompt_tokens) for a request, cut at its max_tokens"""
+    messages = body.get("messages", [])
+    content = canned_content(kind, messages)
+    finish_reason = "stop"
+    max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+    if max_tokens and estimate_tokens(content) > max_tokens:
+        content, finish_reason = content[:max_tokens * 4], "length"
+    elif rng.random() < settings["truncate_rate"]:
+        content, finish_reason = content[:max(1, int(len(content) * 0.6))], "length"
+    if finish_reason == "length":
+        counters["truncated"] += 1
+    prompt_tokens = sum(estimate_tokens(text_of(m)) for m in messages) + (1000 if kind == "vision" else 0)
+    return content, finish_reason, prompt_tokens
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """OpenAI-compatible chat completions (JSON or SSE when stream=true)"""
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "gpt-4")
+    counters["requests"] += 1
+
+    kind = classify(messages)
+    counters["by_kind"][kind] = counters["by_kind"].get(kind, 0) + 1
+
+    roll = rng.random()
+    if roll < settings["rate_limit_rate"]:
+        counters["rate_limited"] += 1
+        retry_after = settings["retry_after_seconds"] * settings["time_scale"]
+        return error_response(429, "Rate limit reached for requests (stand-in)", "rate_limit_exceeded",
+                              {"retry-after-ms": str(int(retry_after * 1000)), "retry-after": str(math.ceil(retry_after))})
+    if roll < settings["rate_limit_rate"] + settings["error_rate"]:
+        counters["server_errors"] += 1
+        return error_response(500, "The server had an error while processing your request (stand-in)", "server_error")
+
+    content, finish_reason, prompt_tokens = canned_completion(kind, body)
+    latency = sample_latency(model)
+
+    if not body.get("stream"):
+        await asyncio.sleep(latency["ttft"] + latency["per_token"] * estimate_tokens(content))
+        return JSONResponse(completion_body(model, content, finish_reason, prompt_tokens))
+
+    counters["streams"] += 1
+
+    async def events():
+        await asyncio.sleep(latency["ttft"])
+        yield chunk_body(model, {"role": "assistant", "content": ""}, None)
+        # ~4 tokens per chunk, paced at the profile's tokens/sec
+        for start in range(0, len(content), 16):
+            piece = content[start:start + 16]
+            if latency["per_token"]:
+                await asyncio.sleep(latency["per_token"] * estimate_tokens(piece))
+            yield chunk_body(model, {"content": piece}, None)
+        yield chunk_body(model, {}, finish_reason)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# ─── Files and batches ──────────────────────────────────────────────────────────
+def file_object(file_id: str) -> Dict[str, Any]:
+    return {key: value for key, value in files[file_id].items() if key != "text"}
+
+
+def store_file(text: str, filename: str, purpose: str) -> str:
+    file_id = f"file-standin-{uuid.uuid4().hex[:12]}"
+    files[file_id] = {"id": file_id, "object": "file", "bytes": len(text.encode()), "created_at": int(time.time()),
+                      "filename": filename, "purpose": purpose, "status": "processed", "text": text}
+    return file_id
+
+
+@app.post("/v1/files")
+async def upload_file(file: UploadFile = File(...), purpose: str = Form(...)):
+    text = (await file.read()).decode("utf-8")
+    return JSONResponse(file_object(store_file(text, file.filename or "upload.jsonl", purpose)))
+
+
+@app.get("/v1/files/{file_id}/content")
+async def file_content(file_id: str):
+    if file_id not in files:
+        return error_response(404, f"No such file: {file_id}", "not_found")
+    return PlainTextResponse(files[file_id]["text"])
+
+
+async def run_batch(batch: Dict[str, Any]):
+    """Answer every line, after one simulated completion's worth of latency"""
+    lines = [json.loads(line) for line in files[batch["input_file_id"]]["text"].splitlines() if line.strip()]
+    batch["status"] = "in_progress"
+    await asyncio.sleep(sample_latency(lines[0]["body"].get("model", "gpt-4") if lines else "gpt-4")["ttft"])
+    outputs, errors = [], []
+    for line in lines:
+        body = line["body"]
+        counters["requests"] += 1
+        kind = classify(body.get("messages", []))
+        counters["by_kind"][kind] = counters["by_kind"].get(kind, 0) + 1
+        if rng.random() < settings["error_rate"]:
+            counters["server_errors"] += 1
+            errors.append({"id": f"batch_req_{uuid.uuid4().hex[:8]}", "custom_id": line["custom_id"],
+                           "response": {"status_code": 500, "body": {"error": {"message": "stand-in error"}}},
+                           "error": {"code": "server_error", "message": "stand-in error"}})
+            continue
+        content, finish_reason, prompt_tokens = canned_completion(kind, body)
+        outputs.append({"id": f"batch_req_{uuid.uuid4().hex[:8]}", "custom_id": line["custom_id"], "error": None,
+                        "response": {"status_code": 200, "request_id": uuid.uuid4().hex,
+                                     "body": completion_body(body.get("model", "gpt-4"), content, finish_reason, prompt_tokens)}})
+    batch["output_file_id"] = store_file("\n".join(json.dumps(o) for o in outputs), "output.jsonl", "batch_output")
+    if errors:
+        batch["error_file_id"] = store_file("\n".join(json.dumps(e) for e in errors), "errors.jsonl", "batch_output")
+    batch["request_counts"] = {"total": len(lines), "completed": len(outputs), "failed": len(errors)}
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+
+@app.post("/v1/batches")
+async def create_batch(request: Request):
+    body = await request.json()
+    if body.get("input_file_id") not in files:
+        return error_response(400, f"No such file: {body.get('input_file_id')}", "invalid_request_error")
+    counters["batches"] += 1
+    batch_id = f"batch_standin_{uuid.uuid4().hex[:12]}"
+    batch = {"id": batch_id, "object": "batch", "endpoint": body.get("endpoint", "/v1/chat/completions"),
+             "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+             "status": "validating", "created_at": int(time.time()), "output_file_id": None, "error_file_id": None,
+             "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+    batches[batch_id] = batch
+    batch["_task"] = asyncio.ensure_future(run_batch(batch))
+    return JSONResponse({k: v for k, v in batch.items() if not k.startswith("_")})
+
+
+@app.get("/v1/batches/{batch_id}")
+async def retrieve_batch(batch_id: str):
+    if batch_id not in batches:
+        return error_response(404, f"No such batch: {batch_id}", "not_found")
+    return JSONResponse({k: v for k, v in batches[batch_id].items() if not k.startswith("_")})
+
+
+# ─── Control ────────────────────────────────────────────────────────────────────
+@app.get("/standin/stats")
+async def standin_stats():
+    return {"settings": settings, "counters": counters}
+
+
+@app.post("/standin/config")
+async def standin_config(request: Request):
+    """Change profile / failure rates between benchmark phases"""
+    updates = await request.json()
+    for key, value in updates.items():
+        if key == "seed":
+            rng.seed(int(value))
+        elif key in settings:
+            settings[key] = value if key == "profile" else float(value)
+    return {"settings": settings}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("STANDIN_PORT", "8011")))
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES) + ["per-model"], default=settings["profile"])
+    parser.add_argument("--time-scale", type=float, default=settings["time_scale"])
+    parser.add_argument("--rate-limit-rate", type=float, default=settings["rate_limit_rate"])
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"])
+    parser.add_argument("--truncate-rate", type=float, default=settings["truncate_rate"])
+    args = parser.parse_args()
+
+    settings.update({"profile": args.profile, "time_scale": args.time_scale, "rate_limit_rate": args.rate_limit_rate,
+                     "error_rate": args.error_rate, "truncate_rate": args.truncate_rate})
+    logger.info(f"OpenAI stand-in on http://{args.host}:{args.port}/v1 with settings {settings}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,6 +1,5 @@
 # main.py - Enhanced with AI Vision, OCR/Tesseract removed
 
-import os
 import io
 import json
 import re
@@ -9,30 +8,71 @@ import numpy as np
 import cv2
 import logging
 import time
+import asyncio
 
-from openai import OpenAI
 from dotenv import load_dotenv
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from PIL import Image
 
+import llm_gateway
+from rate_limiter import PRIORITY_INTERACTIVE, PRIORITY_DEFAULT, PRIORITY_BULK
+from llm_resilience import CircuitOpenError
+from token_budget import ContextOverflowError
+from request_deadline import DeadlineExceeded, DeadlineMiddleware
+from idempotency import IdempotencyMiddleware, build_idempotency_store_from_env
+from llm_metrics import EndpointMiddleware
+from strategy_planner import (
+    build_strategy_planner_from_env, STRATEGY_CACHE, STRATEGY_FULL, STRATEGY_LOCAL, STRATEGY_LOCAL_FALLBACK,
+    STRATEGY_NEAR_DUPLICATE
+)
+from near_duplicate import build_near_duplicate_index_from_env, context_key
+from bulk_jobs import build_bulk_runner_from_env, PreparedJob, JOB_ID_PATTERN
+from json_stream import ArrayElementStream, parse_with_salvage
+import ddl_parser
+from schema_ingest import build_schema_ingest_from_env
+from table_cache import build_table_cache_from_env
+from utils import generate_platform_specific_instructions
+from model_routing import route_for
+import token_budget
+
 # ─── Configuration ───────────────────────────────────────────────────────────────
 load_dotenv()
 
-# Initialize OpenAI client for v1.0+ with very generous timeout settings
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    timeout=900.0,  # 15 minutes global timeout (was working before)
-    max_retries=2   # Fewer retries but longer timeouts
-)
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Agentic BI Assistant")
-
+# Tags each LLM call's metrics with the endpoint that made it
+app.add_middleware(EndpointMiddleware)
+# Retried POSTs with the same Idempotency-Key attach to the running generation or replay its result
+idempotency_store = build_idempotency_store_from_env()
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store, paths=[
+    "/api/v1/generate-layout",
+    "/api/v1/generate-model",
+    "/api/v1/generate-sprint",
+    "/api/v1/analyze-image",
+    "/api/v1/bulk-jobs",
+])
+# Honors the client's X-Request-Timeout and cancels LLM work when the client disconnects
+app.add_middleware(DeadlineMiddleware)
+
+# All OpenAI traffic (cache, single-flight, admission, retries, breaker, pooled
+# HTTP connections) goes through llm_gateway
+
+# Picks cache / full / small model / local rendering for requests with max_latency_ms
+planner = build_strategy_planner_from_env()
+# Re-pasted sketches and notes with small edits reuse the earlier result (MinHash similarity)
+near_duplicates = build_near_duplicate_index_from_env()
+# Overnight manifests of layout / data-prep jobs (provider batch or throttled concurrent calls)
+bulk_runner = build_bulk_runner_from_env()
+# Schemas beyond the chunk fan-out are converted in streamed statement batches
+schema_ingest = build_schema_ingest_from_env()
+# Tables the LLM converted, by content hash of their CREATE TABLE statement
+table_cache = build_table_cache_from_env()
 
 # ─── Helper Functions ────────────────────────────────────────────────────────────
 def safe_get_dict(obj, default=None):
@@ -64,48 +104,80 @@ def safe_get_list(obj, default=None):
         return obj
     return default or []
 
-def create_optimized_openai_call(messages, max_tokens=2000, timeout=600):
-    """Create OpenAI API call with timeout and error handling"""
+async def create_optimized_openai_call(messages, task="default", max_tokens=None, timeout=None, use_cache=True, priority=PRIORITY_DEFAULT, budget=None):
+    """Create OpenAI API call through the LLM gateway; model and budgets come from the task's route"""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=messages,
-            temperature=0.1,
+        return await llm_gateway.chat(
+            messages,
+            task=task,
             max_tokens=max_tokens,
-            timeout=timeout
+            timeout=timeout,
+            use_cache=use_cache,
+            priority=priority,
+            budget=budget
         )
-        return response.choices[0].message.content.strip()
+    except CircuitOpenError as e:
+        logger.warning(f"OpenAI call short-circuited: {str(e)}")
+        raise HTTPException(503, f"AI service temporarily unavailable: {str(e)}")
+    except DeadlineExceeded as e:
+        logger.warning(f"OpenAI call for task {task} out of time: {str(e)}")
+        raise HTTPException(504, f"AI request ran out of time: {str(e)}")
+    except ContextOverflowError as e:
+        logger.warning(f"Prompt too large for task {task}: {str(e)}")
+        raise HTTPException(413, f"Input too large for the AI model: {str(e)}")
     except Exception as e:
         logger.error(f"OpenAI API error: {str(e)}")
         raise HTTPException(500, f"AI service error: {str(e)}")
 
-def create_vision_call_with_retry(messages, max_tokens=2000, timeout=900, max_retries=2):
-    """Create GPT-4o Vision API call with retry logic for better reliability"""
-    import time
-    
-    for attempt in range(max_retries + 1):
-        try:
-            if attempt > 0:
-                wait_time = 10 + (attempt * 10)  # 10, 20 seconds wait
-                logger.info(f"Retrying vision API call in {wait_time} seconds... (Attempt {attempt + 1}/{max_retries + 1})")
-                time.sleep(wait_time)
-            
-            response = client.chat.completions.create(
-                model="gpt-4o",  # Latest and fastest vision model
-                messages=messages,
-                temperature=0.1,
-                max_tokens=max_tokens,
-                timeout=timeout,
-                # Add performance optimizations
-                stream=False  # Ensure we get the full response at once
-            )
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            logger.error(f"Vision API attempt {attempt + 1} failed: {str(e)}")
-            if attempt == max_retries:  # Last attempt
-                raise HTTPException(500, f"Vision AI service failed after {max_retries + 1} attempts: {str(e)}")
-            continue
+async def stream_openai_call(messages, task="default", max_tokens=None, timeout=None, use_cache=True, priority=PRIORITY_INTERACTIVE, budget=None):
+    """Stream completion text deltas as the model emits them (stream=True)"""
+    try:
+        async for delta in llm_gateway.chat_stream(
+            messages,
+            task=task,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            use_cache=use_cache,
+            priority=priority,
+            budget=budget
+        ):
+            yield delta
+    except CircuitOpenError as e:
+        logger.warning(f"OpenAI stream short-circuited: {str(e)}")
+        raise HTTPException(503, f"AI service temporarily unavailable: {str(e)}")
+    except DeadlineExceeded as e:
+        logger.warning(f"OpenAI stream for task {task} out of time: {str(e)}")
+        raise HTTPException(504, f"AI request ran out of time: {str(e)}")
+    except ContextOverflowError as e:
+        logger.warning(f"Prompt too large for task {task}: {str(e)}")
+        raise HTTPException(413, f"Input too large for the AI model: {str(e)}")
+    except Exception as e:
+        logger.error(f"OpenAI streaming API error: {str(e)}")
+        raise HTTPException(500, f"AI service error: {str(e)}")
+
+async def create_vision_call_with_retry(messages, max_tokens=None, timeout=None, max_retries=2, priority=PRIORITY_INTERACTIVE):
+    """Create a vision API call ('vision' route) through the gateway's shared retry policy and circuit breaker.
+
+    Raises CircuitOpenError (unwrapped) while the breaker is open so callers can fall back.
+    """
+    try:
+        return await llm_gateway.chat(
+            messages,
+            task="vision",
+            max_tokens=max_tokens,
+            timeout=timeout,
+            use_cache=False,
+            priority=priority,
+            max_attempts=max_retries + 1
+        )
+    except CircuitOpenError:
+        raise
+    except DeadlineExceeded as e:
+        logger.warning(f"Vision call out of time: {str(e)}")
+        raise HTTPException(504, f"Vision AI request ran out of time: {str(e)}")
+    except Exception as e:
+        logger.error(f"Vision API failed: {str(e)}")
+        raise HTTPException(500, f"Vision AI service failed after {max_retries + 1} attempts: {str(e)}")
 
 # ─── Schemas ─────────────────────────────────────────────────────────────────────
 class Section(BaseModel):
@@ -124,10 +196,12 @@ class GenerateRequest(BaseModel):
     data_dictionary:    Optional[Dict[str,Dict[str,Dict[str,str]]]] = None
     instruction_complexity: Optional[str]       = "intermediate"  # beginner, intermediate, expert
     selected_objectives: Optional[List[str]]    = []  # client_assets, dashboard_build
+    max_latency_ms:     Optional[int]           = None  # latency budget; strategy_planner picks what fits
 
 class GenerateResponse(BaseModel):
     wireframe_json:      Any   # can be str or object
     layout_instructions: str
+    strategy:            Optional[str] = None  # near_duplicate, cache, full, small_model, local or local_fallback
 
 class ModelGenRequest(BaseModel):
     tables_sql:        List[str]
@@ -153,6 +227,7 @@ class SprintResponse(BaseModel):
     sprint_breakdown:     List[Dict[str, Any]] = []
     total_story_points:   int = 0
     team_capacity:        Dict[str, int] = {}
+    truncated:            bool = False  # completion was cut off; sprint_stories holds the complete ones
 
 # ─── Data Prep Analysis Functions ───────────────────────────────────────────────
 def analyze_data_model_for_prep(model_metadata: Dict[str, Any]) -> Dict[str, Any]:
@@ -794,10 +869,6 @@ async def analyze_dashboard_image(
         
         logger.info(f"Analyzing image: {file.filename}, size: {file_size} bytes, platform: {platform}")
         
-        # Choose model based on image complexity - GPT-4o for all images for best accuracy
-        # For very simple wireframes, could use gpt-4o-mini, but gpt-4o gives better results
-        model_to_use = "gpt-4o"  # Stick with best model for accuracy
-        
         # Create AI vision prompt
         system_msg = f"""You are an expert {platform} dashboard design analyst. Analyze the uploaded wireframe, sketch, or screenshot and provide a structured layout description.
 
@@ -839,13 +910,23 @@ Be specific about positioning (top-left, center, bottom-right, etc.) and visual
             }
         ]
         
-        # Call GPT-4o Vision with much longer timeout - revert to working settings
-        layout_description = create_vision_call_with_retry(
-            messages=vision_messages,
-            max_tokens=2000,  # Increased for more detailed analysis
-            timeout=900,      # 15 minutes timeout - matches other vision calls
-            max_retries=2     # 3 total attempts
-        )
+        # Call the vision model - token and timeout budgets come from the 'vision' route
+        try:
+            layout_description = await create_vision_call_with_retry(
+                messages=vision_messages,
+                max_retries=2     # 3 total attempts
+            )
+        except CircuitOpenError as e:
+            # Upstream is down - answer from local shape detection instead of queueing timeouts
+            logger.warning(f"Vision circuit open, falling back to shape detection for {file.filename}")
+            result = detect_layout_from_bytes(file_content)
+            result.update({
+                "platform": platform,
+                "file_name": file.filename,
+                "file_size": file_size,
+                "fallback_reason": str(e)
+            })
+            return result
         
         logger.info(f"AI Vision analysis completed for {file.filename}")
         
@@ -865,6 +946,117 @@ Be specific about positioning (top-left, center, bottom-right, etc.) and visual
         raise HTTPException(500, f"Image analysis failed: {str(e)}")
 
 # ─── Simple Shape Detection (Fallback) ───────────────────────────────────────────
+def detect_layout_from_bytes(image_data: bytes) -> Dict[str, Any]:
+    """Simple geometric layout detection on raw image bytes using OpenCV"""
+    image = Image.open(io.BytesIO(image_data))
+    
+    # Convert to OpenCV format
+    img_array = np.array(image.convert('RGB'))
+    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    
+    # Detect shapes using edge detection
+    edges = cv2.Canny(gray, 50, 150)
+    
+    # Apply morphological operations to connect edges
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+    edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+    
+    # Find contours
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    
+    layout_elements = []
+    img_height, img_width = gray.shape
+    min_area = (img_width * img_height * 0.005)  # At least 0.5% of image
+    
+    logger.info(f"Image size: {img_width}x{img_height}, found {len(contours)} contours")
+    
+    for i, contour in enumerate(contours):
+        x, y, w, h = cv2.boundingRect(contour)
+        area = w * h
+        
+        # Filter significant shapes
+        if area > min_area and w > 20 and h > 20:  # Minimum size thresholds
+            # Determine position
+            y_center = y + h/2
+            x_center = x + w/2
+            
+            # Vertical position
+            if y_center < img_height * 0.25:
+                v_pos = "top"
+            elif y_center > img_height * 0.75:
+                v_pos = "bottom"
+            else:
+                v_pos = "middle"
+            
+            # Horizontal position
+            if x_center < img_width * 0.25:
+                h_pos = "left"
+            elif x_center > img_width * 0.75:
+                h_pos = "right"
+            else:
+                h_pos = "center"
+            
+            position = f"{v_pos}-{h_pos}"
+            
+            # Determine likely visual type based on dimensions
+            aspect_ratio = w / h
+            if aspect_ratio > 3:
+                visual_type = "wide chart or table header"
+            elif aspect_ratio > 1.5:
+                visual_type = "horizontal chart or table"
+            elif aspect_ratio < 0.3:
+                visual_type = "vertical chart or slicer"
+            elif 0.7 <= aspect_ratio <= 1.3:
+                visual_type = "KPI card or square chart"
+            else:
+                visual_type = "chart or visual element"
+            
+            layout_elements.append({
+                "position": position,
+                "type": visual_type,
+                "dimensions": f"{w}×{h}px",
+                "area_percent": round((area / (img_width * img_height)) * 100, 1)
+            })
+    
+    # Sort by position (top to bottom, left to right)
+    layout_elements.sort(key=lambda x: (
+        0 if "top" in x["position"] else 1 if "middle" in x["position"] else 2,
+        0 if "left" in x["position"] else 1 if "center" in x["position"] else 2
+    ))
+    
+    if not layout_elements:
+        layout_description = """No clear layout structure detected from geometric analysis.
+
+This could be because:
+- The image has low contrast or unclear boundaries
+- The layout is hand-drawn without distinct shapes
+- The image quality needs improvement
+
+Suggestions:
+- Try the AI Vision analysis for better results
+- Use a clearer image with distinct visual boundaries
+- Or describe the layout manually"""
+    else:
+        layout_description = f"Detected {len(layout_elements)} layout elements:\n\n"
+        for i, element in enumerate(layout_elements, 1):
+            layout_description += f"{i}. **{element['position'].title()}**: {element['type']} ({element['dimensions']}, {element['area_percent']}% of image)\n"
+        
+        layout_description += f"\n**Analysis Summary:**\n"
+        layout_description += f"- Total elements detected: {len(layout_elements)}\n"
+        layout_description += f"- Image dimensions: {img_width}×{img_height}px\n"
+        layout_description += f"- Processing method: Geometric shape detection\n"
+    
+    logger.info(f"Shape detection completed: found {len(layout_elements)} elements")
+    
+    return {
+        "layout_description": layout_description,
+        "processing_method": "shape_detection",
+        "elements_found": len(layout_elements),
+        "elements": layout_elements,
+        "image_dimensions": {"width": img_width, "height": img_height},
+        "status": "success"
+    }
+
 @app.post("/api/v1/detect-layout")
 async def detect_simple_layout(file: UploadFile = File(...)):
     """Fallback: Simple geometric layout detection using OpenCV"""
@@ -878,114 +1070,7 @@ async def detect_simple_layout(file: UploadFile = File(...)):
         if len(image_data) == 0:
             raise HTTPException(400, "File is empty")
         
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Convert to OpenCV format
-        img_array = np.array(image.convert('RGB'))
-        gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        
-        # Detect shapes using edge detection
-        edges = cv2.Canny(gray, 50, 150)
-        
-        # Apply morphological operations to connect edges
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-        edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
-        
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        layout_elements = []
-        img_height, img_width = gray.shape
-        min_area = (img_width * img_height * 0.005)  # At least 0.5% of image
-        
-        logger.info(f"Image size: {img_width}x{img_height}, found {len(contours)} contours")
-        
-        for i, contour in enumerate(contours):
-            x, y, w, h = cv2.boundingRect(contour)
-            area = w * h
-            
-            # Filter significant shapes
-            if area > min_area and w > 20 and h > 20:  # Minimum size thresholds
-                # Determine position
-                y_center = y + h/2
-                x_center = x + w/2
-                
-                # Vertical position
-                if y_center < img_height * 0.25:
-                    v_pos = "top"
-                elif y_center > img_height * 0.75:
-                    v_pos = "bottom"
-                else:
-                    v_pos = "middle"
-                
-                # Horizontal position
-                if x_center < img_width * 0.25:
-                    h_pos = "left"
-                elif x_center > img_width * 0.75:
-                    h_pos = "right"
-                else:
-                    h_pos = "center"
-                
-                position = f"{v_pos}-{h_pos}"
-                
-                # Determine likely visual type based on dimensions
-                aspect_ratio = w / h
-                if aspect_ratio > 3:
-                    visual_type = "wide chart or table header"
-                elif aspect_ratio > 1.5:
-                    visual_type = "horizontal chart or table"
-                elif aspect_ratio < 0.3:
-                    visual_type = "vertical chart or slicer"
-                elif 0.7 <= aspect_ratio <= 1.3:
-                    visual_type = "KPI card or square chart"
-                else:
-                    visual_type = "chart or visual element"
-                
-                layout_elements.append({
-                    "position": position,
-                    "type": visual_type,
-                    "dimensions": f"{w}×{h}px",
-                    "area_percent": round((area / (img_width * img_height)) * 100, 1)
-                })
-        
-        # Sort by position (top to bottom, left to right)
-        layout_elements.sort(key=lambda x: (
-            0 if "top" in x["position"] else 1 if "middle" in x["position"] else 2,
-            0 if "left" in x["position"] else 1 if "center" in x["position"] else 2
-        ))
-        
-        if not layout_elements:
-            layout_description = """No clear layout structure detected from geometric analysis.
-
-This could be because:
-- The image has low contrast or unclear boundaries
-- The layout is hand-drawn without distinct shapes
-- The image quality needs improvement
-
-Suggestions:
-- Try the AI Vision analysis for better results
-- Use a clearer image with distinct visual boundaries
-- Or describe the layout manually"""
-        else:
-            layout_description = f"Detected {len(layout_elements)} layout elements:\n\n"
-            for i, element in enumerate(layout_elements, 1):
-                layout_description += f"{i}. **{element['position'].title()}**: {element['type']} ({element['dimensions']}, {element['area_percent']}% of image)\n"
-            
-            layout_description += f"\n**Analysis Summary:**\n"
-            layout_description += f"- Total elements detected: {len(layout_elements)}\n"
-            layout_description += f"- Image dimensions: {img_width}×{img_height}px\n"
-            layout_description += f"- Processing method: Geometric shape detection\n"
-        
-        logger.info(f"Shape detection completed: found {len(layout_elements)} elements")
-        
-        return {
-            "layout_description": layout_description,
-            "processing_method": "shape_detection",
-            "elements_found": len(layout_elements),
-            "elements": layout_elements,
-            "image_dimensions": {"width": img_width, "height": img_height},
-            "status": "success"
-        }
+        return detect_layout_from_bytes(image_data)
         
     except HTTPException:
         raise
@@ -1016,6 +1101,14 @@ async def parse_unstructured_kpis(req: UnstructuredKPIRequest):
         if not req.notes_text or len(req.notes_text.strip()) < 10:
             raise HTTPException(400, "Notes text is too short. Please provide more detailed KPI information.")
         
+        match = near_duplicates.lookup("kpi_notes", req.notes_text)
+        if match:
+            previous, similarity = match
+            return UnstructuredKPIResponse(
+                kpi_list=previous["kpi_list"],
+                parsing_notes=f"{previous['parsing_notes']} (Reused from near-identical notes, similarity {similarity:.2f}.)"
+            )
+        
         system_msg = """You are an expert business analyst. Parse unstructured notes about KPIs and metrics into a structured JSON format.
 
 CRITICAL REQUIREMENTS:
@@ -1055,13 +1148,12 @@ Examples of what to extract:
 
 Extract all performance indicators, metrics, and KPIs mentioned. Include formulas, targets, and business context where available."""
 
-        content = create_optimized_openai_call(
+        content = await create_optimized_openai_call(
             messages=[
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": user_msg}
             ],
-            max_tokens=2000,
-            timeout=600
+            task="kpi_parsing"
         )
         
         # Clean and parse response
@@ -1085,10 +1177,12 @@ Extract all performance indicators, metrics, and KPIs mentioned. Include formula
                 kpi["description"] = "Description needs to be defined"
         
         
-        return UnstructuredKPIResponse(
+        response = UnstructuredKPIResponse(
             kpi_list=parsed["kpi_list"],
             parsing_notes=parsed.get("parsing_notes", "Successfully extracted KPIs from provided notes")
         )
+        near_duplicates.add("kpi_notes", req.notes_text, response.model_dump())
+        return response
         
     except json.JSONDecodeError as e:
         logger.error(f"JSON parsing failed: {str(e)}")
@@ -1105,6 +1199,15 @@ async def parse_unstructured_dictionary(req: UnstructuredDictRequest):
         if not req.notes_text or len(req.notes_text.strip()) < 10:
             raise HTTPException(400, "Notes text is too short. Please provide more detailed data dictionary information.")
         
+        dictionary_context = context_key(table_context=req.table_context or "")
+        match = near_duplicates.lookup("dictionary_notes", req.notes_text, dictionary_context)
+        if match:
+            previous, similarity = match
+            return UnstructuredDictResponse(
+                data_dictionary=previous["data_dictionary"],
+                parsing_notes=f"{previous['parsing_notes']} (Reused from near-identical notes, similarity {similarity:.2f}.)"
+            )
+        
         system_msg = """You are an expert data architect. Parse unstructured notes about data fields and tables into a structured data dictionary JSON format.
 
 CRITICAL REQUIREMENTS:
@@ -1147,13 +1250,12 @@ Examples of what to extract:
 
 Extract all data fields, tables, and business rules mentioned. Include data types, constraints, and business context where available."""
 
-        content = create_optimized_openai_call(
+        content = await create_optimized_openai_call(
             messages=[
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": user_msg}
             ],
-            max_tokens=2000,
-            timeout=600
+            task="dictionary_parsing"
         )
         
         # Clean and parse response
@@ -1181,10 +1283,12 @@ Extract all data fields, tables, and business rules mentioned. Include data type
         
         total_fields = sum(len(fields) for fields in parsed["data_dictionary"].values())
         
-        return UnstructuredDictResponse(
+        response = UnstructuredDictResponse(
             data_dictionary=parsed["data_dictionary"],
             parsing_notes=parsed.get("parsing_notes", f"Successfully extracted {len(parsed['data_dictionary'])} tables with {total_fields} fields from provided notes")
         )
+        near_duplicates.add("dictionary_notes", req.notes_text, response.model_dump(), dictionary_context)
+        return response
         
     except json.JSONDecodeError as e:
         logger.error(f"JSON parsing failed: {str(e)}")
@@ -1272,28 +1376,126 @@ async def parse_screenshot_enhanced(
         }]
 
 # ─── Model Generation from SQL ───────────────────────────────────────────────────
+# JSON output tokens per DDL input token - each column line expands into an object
+DDL_OUTPUT_RATIO = 3.0
+MIN_MODEL_COMPLETION_TOKENS = 1500
+# System prompt and framing around the DDL
+DDL_PROMPT_OVERHEAD_TOKENS = 400
+# Upper bound on concurrent chunk calls for one schema that doesn't fit a single call
+MAX_DDL_CHUNKS = 8
+
+def ddl_completion_tokens(ddl_tokens: int) -> int:
+    """Completion budget a DDL -> JSON conversion of `ddl_tokens` needs"""
+    return max(MIN_MODEL_COMPLETION_TOKENS, int(ddl_tokens * DDL_OUTPUT_RATIO))
+
+def ddl_fits_one_call(ddl_tokens: int, model: str) -> bool:
+    """True if both the DDL prompt and its JSON answer fit one call on `model`"""
+    completion = ddl_completion_tokens(ddl_tokens)
+    return (completion <= token_budget.max_output_tokens(model)
+            and ddl_tokens + DDL_PROMPT_OVERHEAD_TOKENS <= token_budget.prompt_budget(model, completion))
+
+def merge_tables(*table_lists: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Concatenate table lists, keeping the first table of each name (case-insensitive)"""
+    merged, seen = [], set()
+    for tables in table_lists:
+        for table in tables:
+            key = str(safe_get_dict(table).get("name", "")).lower()
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(table)
+    return merged
+
+def dedupe_relationships(relationships: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    unique, seen = [], set()
+    for rel in relationships:
+        rel = safe_get_dict(rel)
+        key = tuple(str(rel.get(k, "")).lower() for k in ("from", "to", "from_column", "to_column"))
+        if key not in seen:
+            seen.add(key)
+            unique.append(rel)
+    return unique
+
+def mark_foreign_keys(tables: List[Dict[str, Any]], relationships: List[Dict[str, Any]]):
+    """Flag is_foreign_key on the from-columns of relationships declared outside CREATE TABLE"""
+    from_columns = {(str(r.get("from", "")).lower(), str(r.get("from_column", "")).lower())
+                    for r in relationships if isinstance(r, dict)}
+    for table in tables:
+        table_name = str(safe_get_dict(table).get("name", "")).lower()
+        for column in safe_get_list(safe_get_dict(table).get("columns", [])):
+            if isinstance(column, dict) and (table_name, str(column.get("name", "")).lower()) in from_columns:
+                column["is_foreign_key"] = True
+
 @app.post("/api/v1/generate-model", response_model=ModelGenResponse)
 async def generate_model(req: ModelGenRequest):
-    """Cost-optimized model generation - Smart processing with minimal API calls"""
+    """Model generation - DDL and relationships are parsed locally, the LLM only sees what the parser can't read"""
     try:
-        # Calculate total input size
-        total_size = sum(len(ddl) for ddl in req.tables_sql) + len(req.relationships_sql)
-        logger.info(f"Processing {len(req.tables_sql)} DDL files, total size: {total_size} chars")
-        
-        # SMART SIZING: Determine processing approach based on size
-        if total_size > 30000:  # Very large schema
-            raise HTTPException(400, 
-                f"Schema too large ({total_size:,} characters). "
-                "Please use the Enterprise Template approach or focus on core tables (10-20 most important tables)."
-            )
+        local = ddl_parser.parse_schema(req.tables_sql)
+        logger.info(f"Local DDL parser: {len(local.tables)} tables, {len(local.relationships)} relationships, "
+                    f"{len(local.unparsed)} statements left for the LLM")
+        if not local.tables and not local.unparsed:
+            # Nothing recognisable as CREATE TABLE - let the LLM make sense of it
+            return await generate_model_with_llm(req)
+        
+        # Statements converted on an earlier upload come from the table cache
+        cached_tables, cached_relationships, unconverted = await table_cache.lookup(local.unparsed)
+        tables = merge_tables(local.tables, cached_tables)
+        relationships = local.relationships + cached_relationships
+        if unconverted:
+            llm_model = (await generate_model_with_llm(
+                ModelGenRequest(tables_sql=unconverted, relationships_sql="")
+            )).data_model
+            llm_tables = safe_get_list(llm_model.get("tables", []))
+            llm_relationships = safe_get_list(llm_model.get("relationships", []))
+            await table_cache.store_converted(unconverted, llm_tables, llm_relationships)
+            tables = merge_tables(tables, llm_tables)
+            relationships = relationships + llm_relationships
+        
+        # ALTER TABLE foreign keys among the DDL files that the parser couldn't read join the relationships file
+        relationships_sql = "\n\n".join([req.relationships_sql.strip()] + local.unparsed_relationships).strip()
+        if relationships_sql:
+            try:
+                relationships = relationships + await process_relationships_only(
+                    relationships_sql, table_keys={**ddl_parser.candidate_keys(tables), **local.keys}
+                )
+            except Exception as e:
+                logger.warning(f"Relationships processing failed: {str(e)}")
         
-        elif total_size > 15000:  # Large schema - Use chunking but fewer chunks
-            logger.info("Large schema detected - using optimized 2-chunk processing")
-            return await process_large_schema_optimized(req, total_size)
+        relationships = dedupe_relationships(relationships)
+        mark_foreign_keys(tables, relationships)
+        return ModelGenResponse(data_model={"tables": tables, "relationships": relationships})
         
-        else:  # Medium/Small schema - Single API call
-            logger.info("Medium/small schema - using single API call")
-            return await process_schema_single_call(req, total_size)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Model generation error: {str(e)}")
+        raise HTTPException(500, f"Model generation failed: {str(e)}")
+
+async def generate_model_with_llm(req: ModelGenRequest) -> ModelGenResponse:
+    """LLM model generation - Smart processing with minimal API calls"""
+    try:
+        # Size the schema in real tokens for the models that will read it
+        total_size = sum(len(ddl) for ddl in req.tables_sql) + len(req.relationships_sql)
+        single_model = route_for("data_model")["model"]
+        chunk_model = route_for("ddl_chunk")["model"]
+        schema_tokens = token_budget.count_tokens("\n\n".join(req.tables_sql + [req.relationships_sql]), single_model)
+        logger.info(f"Processing {len(req.tables_sql)} DDL files, total size: {total_size} chars, ~{schema_tokens:,} tokens "
+                    f"({token_budget.tokenizer_name(single_model)})")
+        
+        # SMART SIZING: Determine processing approach based on what fits each model's window
+        if ddl_fits_one_call(schema_tokens, single_model):  # Medium/Small schema - Single API call
+            logger.info("Schema fits one call - using single API call")
+            return await process_schema_single_call(req, ddl_completion_tokens(schema_tokens))
+        
+        chunk_tokens = [token_budget.count_tokens(ddl, chunk_model) for ddl in req.tables_sql]
+        chunks = plan_ddl_chunks(chunk_tokens, chunk_model)
+        if chunks is None:
+            # Too many tables (or one huge file) for whole-file chunks - go statement by statement
+            logger.info(f"Schema beyond {MAX_DDL_CHUNKS}-chunk processing - using hierarchical ingestion")
+            return await process_schema_hierarchical(req, chunk_model)
+        
+        # Large schema - Use the fewest chunks that fit, processed concurrently
+        logger.info(f"Large schema detected - using concurrent {len(chunks)}-chunk processing")
+        return await process_large_schema_optimized(req, chunk_tokens, chunks)
         
     except HTTPException:
         raise
@@ -1302,7 +1504,7 @@ async def generate_model(req: ModelGenRequest):
         raise HTTPException(500, f"Model generation failed: {str(e)}")
 
 
-async def process_schema_single_call(req: ModelGenRequest, total_size: int):
+async def process_schema_single_call(req: ModelGenRequest, completion_tokens: int):
     """Process schema with single API call - most cost effective"""
     
     # Combine all DDLs into one optimized prompt
@@ -1336,15 +1538,24 @@ Expected JSON format:
   ]
 }"""
 
+    messages = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": combined_ddl}
+    ]
+    # Sized from the DDL's token count, then from what schemas this size actually produced
+    completion_tokens, timeout_seconds = llm_gateway.suggest_budget(
+        messages, "data_model", completion_tokens, route_for("data_model")["timeout"],
+        minimum=token_budget.count_tokens(combined_ddl, route_for("data_model")["model"])
+    )
+    
     try:
         # Single API call with optimized settings
-        content = create_optimized_openai_call(
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": combined_ddl}
-            ],
-            max_tokens=min(4000, max(1500, total_size // 3)),  # Dynamic token allocation
-            timeout=120  # Reasonable timeout
+        content = await create_optimized_openai_call(
+            messages=messages,
+            task="data_model",
+            max_tokens=completion_tokens,
+            timeout=timeout_seconds,
+            priority=PRIORITY_BULK
         )
         
         # Clean and parse response
@@ -1388,45 +1599,56 @@ Expected JSON format:
         raise HTTPException(500, f"Processing failed: {str(e)}")
 
 
-async def process_large_schema_optimized(req: ModelGenRequest, total_size: int):
-    """Process large schema with minimal chunking - 2 API calls maximum"""
+def balance_chunks(token_counts: List[int], n: int) -> List[List[int]]:
+    """Indices of the DDL list split into `n` chunks of roughly equal tokens (largest file first into the lightest chunk)"""
+    chunks: List[List[int]] = [[] for _ in range(n)]
+    loads = [0] * n
+    for i in sorted(range(len(token_counts)), key=lambda i: token_counts[i], reverse=True):
+        lightest = loads.index(min(loads))
+        chunks[lightest].append(i)
+        loads[lightest] += token_counts[i]
+    return [sorted(chunk) for chunk in chunks if chunk]
+
+def plan_ddl_chunks(token_counts: List[int], model: str) -> Optional[List[List[int]]]:
+    """Fewest balanced chunks (at least 2, at most MAX_DDL_CHUNKS) that each fit one call on `model`"""
+    for n in range(2, min(len(token_counts), MAX_DDL_CHUNKS) + 1):
+        chunks = balance_chunks(token_counts, n)
+        if all(ddl_fits_one_call(sum(token_counts[i] for i in chunk), model) for chunk in chunks):
+            return chunks
+    return None
+
+async def process_large_schema_optimized(req: ModelGenRequest, chunk_tokens: List[int], chunks: List[List[int]]):
+    """Process large schema as balanced chunks, all in flight at once alongside the relationships call"""
     
-    logger.info("Using cost-optimized large schema processing")
+    total = len(chunks)
+    logger.info(f"Using concurrent large schema processing: {total} chunks of "
+                f"{', '.join(str(sum(chunk_tokens[i] for i in chunk)) for chunk in chunks)} tokens")
     
-    # Smart chunking: Split into 2 roughly equal chunks
-    mid_point = len(req.tables_sql) // 2
-    chunk1_ddls = req.tables_sql[:mid_point]
-    chunk2_ddls = req.tables_sql[mid_point:]
+    async def run_chunk(num: int, chunk: List[int]):
+        budget = ddl_completion_tokens(sum(chunk_tokens[i] for i in chunk))
+        return await process_ddl_chunk([req.tables_sql[i] for i in chunk], num, total, budget)
     
-    all_tables = []
-    all_relationships = []
+    # Chunks and relationships share nothing, so they wait on the gateway's limits rather than on each other
+    calls = [run_chunk(num, chunk) for num, chunk in enumerate(chunks, 1)]
+    if req.relationships_sql.strip():
+        calls.append(process_relationships_only(req.relationships_sql))
+    results = await asyncio.gather(*calls, return_exceptions=True)
     
-    # Process first chunk
-    try:
-        chunk1_result = await process_ddl_chunk(chunk1_ddls, 1, 2)
-        if chunk1_result and "tables" in chunk1_result:
-            all_tables.extend(chunk1_result["tables"])
-            logger.info(f"Chunk 1: Added {len(chunk1_result['tables'])} tables")
-    except Exception as e:
-        logger.warning(f"Chunk 1 failed: {str(e)}")
+    table_lists = []
+    for num, result in enumerate(results[:total], 1):
+        if isinstance(result, Exception):
+            logger.warning(f"Chunk {num} failed: {str(result)}")
+        elif result and "tables" in result:
+            table_lists.append(safe_get_list(result["tables"]))
+            logger.info(f"Chunk {num}: Added {len(result['tables'])} tables")
+    all_tables = merge_tables(*table_lists)
     
-    # Process second chunk
-    try:
-        chunk2_result = await process_ddl_chunk(chunk2_ddls, 2, 2)
-        if chunk2_result and "tables" in chunk2_result:
-            all_tables.extend(chunk2_result["tables"])
-            logger.info(f"Chunk 2: Added {len(chunk2_result['tables'])} tables")
-    except Exception as e:
-        logger.warning(f"Chunk 2 failed: {str(e)}")
-    
-    # Process relationships (if any tables were successful)
-    if all_tables and req.relationships_sql.strip():
-        try:
-            rel_result = await process_relationships_only(req.relationships_sql)
-            if rel_result:
-                all_relationships = rel_result
-        except Exception as e:
-            logger.warning(f"Relationships processing failed: {str(e)}")
+    all_relationships = []
+    if len(results) > total:
+        if isinstance(results[total], Exception):
+            logger.warning(f"Relationships processing failed: {str(results[total])}")
+        elif results[total]:
+            all_relationships = dedupe_relationships(results[total])
     
     if not all_tables:
         raise HTTPException(500, "Failed to process any tables. Try with fewer tables or use Enterprise Template.")
@@ -1439,22 +1661,49 @@ async def process_large_schema_optimized(req: ModelGenRequest, total_size: int):
     return ModelGenResponse(data_model=final_model)
 
 
-async def process_ddl_chunk(ddl_list, chunk_num, total_chunks):
+async def process_schema_hierarchical(req: ModelGenRequest, chunk_model: str):
+    """Process a schema of any size in statement batches, merging as they finish"""
+    try:
+        model = await schema_ingest.run(
+            req.tables_sql, req.relationships_sql,
+            count_tokens=lambda text: token_budget.count_tokens(text, chunk_model),
+            fits=lambda tokens: ddl_fits_one_call(tokens, chunk_model),
+            convert_tables=lambda statements, num, tokens: process_ddl_chunk(
+                statements, num, None, ddl_completion_tokens(tokens)
+            ),
+            convert_relationships=lambda sql, tokens: process_relationships_only(sql, ddl_completion_tokens(tokens)),
+        )
+    except ValueError as e:
+        raise HTTPException(500, f"Failed to process any tables ({str(e)}). Check that the DDL contains CREATE TABLE statements.")
+    return ModelGenResponse(data_model=model)
+
+
+async def process_ddl_chunk(ddl_list, chunk_num, total_chunks, completion_tokens=None):
     """Process a chunk of DDL files efficiently"""
     
     combined_ddl = "\n\n".join(ddl_list)
     
-    system_msg = f"""Convert SQL DDL chunk {chunk_num}/{total_chunks} to JSON.
+    # Streamed batches don't know the total up front
+    chunk_label = f"{chunk_num}/{total_chunks}" if total_chunks else str(chunk_num)
+    system_msg = f"""Convert SQL DDL chunk {chunk_label} to JSON.
 Return ONLY valid JSON with tables array. Use types: string, int, date, decimal.
 Format: {{"tables": [{{"name": "table", "columns": [{{"name": "col", "type": "string", "nullable": true, "is_primary_key": false, "is_foreign_key": false}}]}}]}}"""
     
-    content = create_optimized_openai_call(
-        messages=[
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": f"Tables:\n{combined_ddl}"}
-        ],
-        max_tokens=2000,
-        timeout=600
+    messages = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": f"Tables:\n{combined_ddl}"}
+    ]
+    completion_tokens, timeout_seconds = llm_gateway.suggest_budget(
+        messages, "ddl_chunk", completion_tokens or route_for("ddl_chunk")["max_tokens"],
+        route_for("ddl_chunk")["timeout"], minimum=token_budget.count_tokens(combined_ddl, route_for("ddl_chunk")["model"])
+    )
+    
+    content = await create_optimized_openai_call(
+        messages=messages,
+        task="ddl_chunk",
+        max_tokens=completion_tokens,
+        timeout=timeout_seconds,
+        priority=PRIORITY_BULK
     )
     
     # Clean and parse
@@ -1464,118 +1713,115 @@ Format: {{"tables": [{{"name": "table", "columns": [{{"name": "col", "type": "st
     if content.startswith('```'):
         content = content.replace('```', '')
     
-    return json.loads(content)
+    # A cut-off answer still yields its complete tables, flagged "truncated"
+    return parse_with_salvage(content, "tables")
 
 
-async def process_relationships_only(relationships_sql):
-    """Process relationships with minimal API call"""
+async def process_relationships_only(relationships_sql, completion_tokens=None, table_keys=None):
+    """Process relationships - foreign keys and relationships.json locally, the LLM only for the rest"""
+    
+    local = ddl_parser.parse_relationships(relationships_sql, table_keys)
+    if local.relationships and not local.unparsed:
+        logger.info(f"Relationships extracted locally: {len(local.relationships)}")
+        return local.relationships
+    if local.relationships:
+        # Only the statements the parser couldn't read go to the LLM
+        logger.info(f"Relationships extracted locally: {len(local.relationships)}, "
+                    f"{len(local.unparsed)} statements left for the LLM")
+        relationships_sql = "\n\n".join(local.unparsed)
     
     system_msg = "Extract relationships from SQL. Return JSON: {'relationships': [...]}"
     
-    content = create_optimized_openai_call(
+    content = await create_optimized_openai_call(
         messages=[
             {"role": "system", "content": system_msg},
             {"role": "user", "content": relationships_sql}
         ],
-        max_tokens=800,
-        timeout=600
+        task="relationships",
+        max_tokens=completion_tokens,
+        priority=PRIORITY_BULK
     )
     
     content = content.strip()
     if content.startswith('```json'):
         content = content.replace('```json', '').replace('```', '')
     
-    result = json.loads(content)
-    return result.get("relationships", [])
+    result = parse_with_salvage(content, "relationships")
+    return local.relationships + safe_get_list(result.get("relationships", []))
 
 # ─── Layout or Data Prep Generation ─────────────────────────────────────────────
-@app.post("/api/v1/generate-layout", response_model=GenerateResponse)
-async def generate_layout(req: GenerateRequest):
-    """Generate layout instructions or data preparation steps"""
-    import time
-    start_time = time.time()
+def build_data_prep_messages(req: GenerateRequest):
+    """Validate a data-prep request and build its chat messages; returns (messages, model_dict)"""
+    # Validate input
+    if not req.model_metadata:
+        raise HTTPException(
+            status_code=400, 
+            detail="model_metadata is required for data preparation"
+        )
+    
+    if not req.platform_selected:
+        raise HTTPException(
+            status_code=400,
+            detail="platform_selected is required"
+        )
+    
+    logger.info(f"Generating data prep for {req.platform_selected}")
+    
+    
+    # Ensure model_metadata is properly formatted
+    model_dict = safe_get_dict(req.model_metadata)
+    if not model_dict:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid model_metadata format. Expected dictionary with 'tables' and 'relationships' keys."
+        )
+    
+    tables = safe_get_list(model_dict.get("tables", []))
+    logger.info(f"Found {len(tables)} tables in model")
+    
+    if not tables:
+        raise HTTPException(
+            status_code=400,
+            detail="No tables found in model_metadata. Please check your data model structure."
+        )
     
+    # Build comprehensive prompt with error handling
     try:
-        logger.info(f"🚀 **BACKEND**: Starting generate-layout request at {time.strftime('%H:%M:%S')}")
-        logger.info(f"📊 **REQUEST INFO**: Platform: {req.platform_selected}, Data prep only: {req.data_prep_only}")
-        
-        # Data-Prep Only branch - ENHANCED VERSION with error handling
-        if req.data_prep_only:
-            # Validate input
-            if not req.model_metadata:
-                raise HTTPException(
-                    status_code=400, 
-                    detail="model_metadata is required for data preparation"
-                )
-            
-            if not req.platform_selected:
-                raise HTTPException(
-                    status_code=400,
-                    detail="platform_selected is required"
-                )
-            
-            logger.info(f"Generating data prep for {req.platform_selected}")
-            
-            
-            # Ensure model_metadata is properly formatted
-            model_dict = safe_get_dict(req.model_metadata)
-            if not model_dict:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid model_metadata format. Expected dictionary with 'tables' and 'relationships' keys."
-                )
-            
-            tables = safe_get_list(model_dict.get("tables", []))
-            logger.info(f"Found {len(tables)} tables in model")
-            
-            if not tables:
-                raise HTTPException(
-                    status_code=400,
-                    detail="No tables found in model_metadata. Please check your data model structure."
-                )
-            
-            # Build comprehensive prompt with error handling
-            try:
-                enhanced_prompt = build_data_prep_prompt(
-                    platform=req.platform_selected,
-                    model_metadata=model_dict,  # Use the safely parsed dictionary
-                    custom_requirements=req.custom_prompt or "",
-                    kpi_list=req.kpi_list,
-                    data_dictionary=req.data_dictionary,
-                    complexity=req.instruction_complexity or "intermediate",
-                    objectives=req.selected_objectives or []
-                )
-            except Exception as prompt_error:
-                logger.error(f"Error building prompt: {str(prompt_error)}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Error analyzing data model: {str(prompt_error)}"
-                )
-            
-            system_msg = (
-                f"You are a senior {req.platform_selected} data engineer with 10+ years experience. "
-                "Generate SPECIFIC, actionable data preparation instructions. "
-                "Reference exact column names from the data model. "
-                "Include code snippets, validation steps, and troubleshooting tips. "
-                "Be precise about data types, null handling, and business rules. "
-                "Address each data quality issue identified in the analysis."
-            )
-            
-            # Updated for OpenAI v1.0+
-            try:
-                raw_instructions = create_optimized_openai_call(
-                    messages=[
-                        {"role": "system", "content": system_msg},
-                        {"role": "user", "content": enhanced_prompt}
-                    ],
-                    max_tokens=2500,  # Reduced to speed up response
-                    timeout=600
-                )
-            except Exception as openai_error:
-                logger.error(f"OpenAI timeout or error: {str(openai_error)}")
-                # Provide a fallback response
-                raw_instructions = f"""
-# {req.platform_selected} Data Preparation Steps
+        enhanced_prompt = build_data_prep_prompt(
+            platform=req.platform_selected,
+            model_metadata=model_dict,  # Use the safely parsed dictionary
+            custom_requirements=req.custom_prompt or "",
+            kpi_list=req.kpi_list,
+            data_dictionary=req.data_dictionary,
+            complexity=req.instruction_complexity or "intermediate",
+            objectives=req.selected_objectives or []
+        )
+    except Exception as prompt_error:
+        logger.error(f"Error building prompt: {str(prompt_error)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error analyzing data model: {str(prompt_error)}"
+        )
+    
+    system_msg = (
+        f"You are a senior {req.platform_selected} data engineer with 10+ years experience. "
+        "Generate SPECIFIC, actionable data preparation instructions. "
+        "Reference exact column names from the data model. "
+        "Include code snippets, validation steps, and troubleshooting tips. "
+        "Be precise about data types, null handling, and business rules. "
+        "Address each data quality issue identified in the analysis."
+    )
+    
+    messages = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": enhanced_prompt}
+    ]
+    return messages, model_dict
+
+def data_prep_fallback_instructions(platform_selected: str) -> str:
+    """Static data-prep steps returned when the AI service is unavailable"""
+    return f"""
+# {platform_selected} Data Preparation Steps
 
 ## Data Model Analysis
 Your data model has been analyzed and the following issues were identified:
@@ -1591,248 +1837,455 @@ Your data model has been analyzed and the following issues were identified:
 
 Please try again or contact support if the issue persists.
 """
-            
-            # Post-process to add validation sections
-            final_instructions = enhance_with_validation_steps(
-                raw_instructions, 
-                model_dict,  # Use the parsed dictionary
-                req.platform_selected
-            )
-            
-            elapsed_time = time.time() - start_time
-            
-            return GenerateResponse(
-                wireframe_json="", 
-                layout_instructions=tidy_md(final_instructions)
-            )
 
-        # Full Layout branch
-        # Build platform-specific formula guidance
-        platform_lower = req.platform_selected.lower()
-        if "power bi" in platform_lower:
-            formula_guidance = """
+def finalize_data_prep_instructions(raw_instructions: str, model_dict: dict, platform_selected: str) -> str:
+    """Append validation sections and tidy the markdown of data-prep output"""
+    final_instructions = enhance_with_validation_steps(
+        raw_instructions, 
+        model_dict,  # Use the parsed dictionary
+        platform_selected
+    )
+    return tidy_md(final_instructions)
+
+def pack_model_metadata(model_dict: dict, tables: list, budget_tokens: int, model: str):
+    """Fit the data model into `budget_tokens`: full tables first, compact 'col (type)' form when
+    a full table doesn't fit, relationships last. Returns (packed_model, tokens_used)."""
+    packed_tables = []
+    used = 0
+    dropped = 0
+    for table in tables:
+        table_dict = safe_get_dict(table)
+        if not table_dict:
+            continue
+        cost = token_budget.count_tokens(json.dumps(table_dict), model) + 1
+        if used + cost > budget_tokens:
+            # Keep only names and types
+            table_name = table_dict.get("table_name", "") or table_dict.get("name", "")
+            compact_columns = []
+            for col in safe_get_list(table_dict.get("columns", [])):
+                if isinstance(col, str):
+                    compact_columns.append(col)
+                else:
+                    col_dict = safe_get_dict(col)
+                    col_name = col_dict.get("column_name", "") or col_dict.get("name", "")
+                    col_type = col_dict.get("data_type", "") or col_dict.get("type", "")
+                    compact_columns.append(f"{col_name} ({col_type})")
+            table_dict = {"name": table_name, "columns": compact_columns}
+            cost = token_budget.count_tokens(json.dumps(table_dict), model) + 1
+            if used + cost > budget_tokens:
+                dropped += 1
+                continue
+        packed_tables.append(table_dict)
+        used += cost
+    
+    packed = {"tables": packed_tables}
+    relationships = safe_get_list(model_dict.get("relationships", []))
+    if relationships:
+        kept, rel_used, _ = token_budget.pack(relationships, budget_tokens - used, model, render=json.dumps)
+        packed["relationships"] = kept
+        used += rel_used
+    if dropped:
+        logger.info(f"Dropped {dropped} of {len(tables)} tables to fit the {model} window")
+    return packed, used
+
+def build_layout_messages(req: GenerateRequest, markdown_only: bool = False):
+    """Build dashboard layout messages and budgets; returns (messages, max_tokens, timeout_seconds)"""
+    # Build platform-specific formula guidance
+    platform_lower = req.platform_selected.lower()
+    if "power bi" in platform_lower:
+        formula_guidance = """
 ## Measures (DAX Formulas)
 Create these measures in Power BI using DAX syntax. Copy these exact formulas into your Measures:
 
 ## Calculated Columns (DAX Formulas)  
 Create these calculated columns in your data model using DAX syntax:
 """
-            formula_examples = "Example DAX: `Total Sales = SUM(Sales[Amount])` or `Sales YTD = TOTALYTD([Total Sales], Calendar[Date])`"
-        elif "tableau" in platform_lower:
-            formula_guidance = """
+        formula_examples = "Example DAX: `Total Sales = SUM(Sales[Amount])` or `Sales YTD = TOTALYTD([Total Sales], Calendar[Date])`"
+    elif "tableau" in platform_lower:
+        formula_guidance = """
 ## Measures (Calculated Fields)
 Create these calculated fields in Tableau. Use these exact formulas in Analysis > Create Calculated Field:
 
 ## Calculated Columns (Table Calculations)
 Create these table-level calculations in your data source:
 """
-            formula_examples = "Example Tableau: `SUM([Sales])` or `WINDOW_SUM(SUM([Sales]))` or `{FIXED [Region] : SUM([Sales])}`"
-        else:
-            formula_guidance = """
+        formula_examples = "Example Tableau: `SUM([Sales])` or `WINDOW_SUM(SUM([Sales]))` or `{FIXED [Region] : SUM([Sales])}`"
+    else:
+        formula_guidance = """
 ## Measures (Aggregated Metrics)
 Create these measures/metrics in your BI tool:
 
 ## Calculated Columns (Derived Fields)
 Create these calculated fields in your data model:
 """
-            formula_examples = "Use platform-appropriate syntax for calculations"
-        
-        system_msg = (
-            f"You are an AI expert in BI dashboards for {req.platform_selected}.\n\n"
-            f"CRITICAL: **ALWAYS** start your response with these two dedicated sections:\n\n"
-            f"{formula_guidance}\n"
-            f"{formula_examples}\n\n"
-            f"**Format each formula as:**\n"
-            f"### [Measure/Column Name]\n"
-            f"```\n"
-            f"[Exact Formula]\n"
-            f"```\n"
-            f"**Purpose**: [Brief explanation of what this calculates]\n\n"
-            f"**After the formulas**, create your dashboard layout with:\n"
-            f"**Then**, for each visual, output `## <VisualType>` and a numbered Markdown list:\n"
-            "1. Which visual to insert\n"
-            "2. Fields in Values/Axis/Legend/Tooltips (reference the measures you created above)\n"
-            "3. Sorts, filters, groupings\n"
-            "4. Suggested formatting\n\n"
-            "IMPORTANT: If KPI definitions are provided, prioritize these metrics in your dashboard layout. "
-            "If a data dictionary is provided, use the business context to make informed decisions about field usage and visualization types.\n\n"
-            "Always reference the measures and calculated columns you created in the Fields sections of your visuals.\n\n"
+        formula_examples = "Use platform-appropriate syntax for calculations"
+    
+    if markdown_only:
+        # Streaming clients render tokens directly, so skip the JSON envelope
+        output_format = "Return only the Markdown instructions, without any JSON wrapper."
+    else:
+        output_format = (
             "Return only valid JSON with keys:\n"
             "• wireframe_json: the original sketch_description (as object)\n"
             "• layout_instructions: the Markdown instructions"
         )
+    
+    system_msg = (
+        f"You are an AI expert in BI dashboards for {req.platform_selected}.\n\n"
+        f"CRITICAL: **ALWAYS** start your response with these two dedicated sections:\n\n"
+        f"{formula_guidance}\n"
+        f"{formula_examples}\n\n"
+        f"**Format each formula as:**\n"
+        f"### [Measure/Column Name]\n"
+        f"```\n"
+        f"[Exact Formula]\n"
+        f"```\n"
+        f"**Purpose**: [Brief explanation of what this calculates]\n\n"
+        f"**After the formulas**, create your dashboard layout with:\n"
+        f"**Then**, for each visual, output `## <VisualType>` and a numbered Markdown list:\n"
+        "1. Which visual to insert\n"
+        "2. Fields in Values/Axis/Legend/Tooltips (reference the measures you created above)\n"
+        "3. Sorts, filters, groupings\n"
+        "4. Suggested formatting\n\n"
+        "IMPORTANT: If KPI definitions are provided, prioritize these metrics in your dashboard layout. "
+        "If a data dictionary is provided, use the business context to make informed decisions about field usage and visualization types.\n\n"
+        "Always reference the measures and calculated columns you created in the Fields sections of your visuals.\n\n"
+        + output_format
+    )
+    
+    # Analyze model complexity to optimize payload and timeout
+    model_dict = safe_get_dict(req.model_metadata or {})
+    tables = safe_get_list(model_dict.get("tables", []))
+    total_columns = sum(len(safe_get_list(safe_get_dict(t).get("columns", []))) for t in tables)
+    
+    # Determine complexity and optimize accordingly
+    is_complex = len(tables) > 10 or total_columns > 100
+    is_simple = len(tables) <= 5 and total_columns <= 50
+    
+    logger.info(f"Dashboard generation: {len(tables)} tables, {total_columns} columns, complex: {is_complex}")
+    
+    # Dynamic timeout and token allocation based on complexity
+    if is_complex:
+        timeout_seconds = 900  # 15 minutes for complex models
+        max_tokens = 2500
+    elif is_simple:
+        timeout_seconds = 600   # 10 minutes for simple models
+        max_tokens = 1500
+    else:
+        timeout_seconds = 720  # 12 minutes for medium models
+        max_tokens = 1800
+    
+    user_msg_data = {
+        "sketch_description": req.sketch_description,
+        "custom_prompt": req.custom_prompt,
+    }
+    
+    # Fill the layout model's remaining window with KPIs first, then schema, then dictionary
+    layout_model = route_for("layout")["model"]
+    fixed_tokens = token_budget.count_message_tokens([
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": json.dumps(user_msg_data)}
+    ], layout_model)
+    context_budget = token_budget.prompt_budget(layout_model, max_tokens) - fixed_tokens
+    
+    if req.kpi_list:
+        kpis, used, dropped_kpis = token_budget.pack(req.kpi_list, context_budget, layout_model, render=json.dumps)
+        user_msg_data["kpi_definitions"] = kpis
+        context_budget -= used
+        if dropped_kpis:
+            logger.info(f"Dropped {dropped_kpis} KPI definitions to fit the {layout_model} window")
+    
+    packed_model, used = pack_model_metadata(model_dict, tables, context_budget, layout_model)
+    user_msg_data["model_metadata"] = packed_model
+    context_budget -= used
+    
+    if req.data_dictionary:
+        fields = [
+            (table_name, col_name, safe_get_dict(col_info).get('description', 'No description'))
+            for table_name, columns in req.data_dictionary.items()
+            for col_name, col_info in safe_get_dict(columns).items()
+        ]
+        kept, used, dropped_fields = token_budget.pack(fields, context_budget, layout_model, render=lambda f: f"{f[0]}.{f[1]}: {f[2]}")
+        simplified_dict = {}
+        for table_name, col_name, description in kept:
+            simplified_dict.setdefault(table_name, {})[col_name] = description
+        user_msg_data["data_dictionary"] = simplified_dict
+        if dropped_fields:
+            logger.info(f"Dropped {dropped_fields} data dictionary fields to fit the {layout_model} window")
+    
+    # Compact JSON - indentation only costs tokens
+    user_msg = json.dumps(user_msg_data)
+    
+    messages = [
+        {"role":"system","content":system_msg},
+        {"role":"user","content":user_msg}
+    ]
+    if not markdown_only:
+        # Replace the complexity guess with what layouts of this size actually needed
+        max_tokens, timeout_seconds = llm_gateway.suggest_budget(messages, "layout", max_tokens, timeout_seconds)
+    
+    logger.info(f"Using timeout: {timeout_seconds}s, max_tokens: {max_tokens}")
+    return messages, max_tokens, timeout_seconds
+
+def parse_layout_response(content: str) -> GenerateResponse:
+    """Parse the AI layout response into a GenerateResponse, repairing malformed JSON"""
+    # Parse JSON from the AI, then tidy the instructions
+    try:
+        result = json.loads(content)
+        instr = tidy_md(result.get("layout_instructions",""))
+        return GenerateResponse(
+            wireframe_json=result.get("wireframe_json",""),
+            layout_instructions=instr
+        )
+    except Exception as parse_error:
+        logger.warning(f"Failed to parse AI response as JSON: {str(parse_error)}")
         
-        # Analyze model complexity to optimize payload and timeout
-        model_dict = safe_get_dict(req.model_metadata or {})
-        tables = safe_get_list(model_dict.get("tables", []))
-        total_columns = sum(len(safe_get_list(safe_get_dict(t).get("columns", []))) for t in tables)
-        
-        # Determine complexity and optimize accordingly
-        is_complex = len(tables) > 10 or total_columns > 100
-        is_simple = len(tables) <= 5 and total_columns <= 50
-        
-        logger.info(f"Dashboard generation: {len(tables)} tables, {total_columns} columns, complex: {is_complex}")
-        
-        # Build optimized user message based on complexity
-        user_msg_data = {
-            "sketch_description": req.sketch_description,
-            "custom_prompt": req.custom_prompt,
-        }
-        
-        # Optimize model metadata based on complexity
-        if is_complex:
-            # For complex models, send only essential info
-            simplified_model = {
-                "tables": []
-            }
-            for table in tables[:15]:  # Limit to 15 tables
-                table_dict = safe_get_dict(table)
-                if table_dict:
-                    table_name = table_dict.get("table_name", "") or table_dict.get("name", "")
-                    columns = safe_get_list(table_dict.get("columns", []))
-                    
-                    # Simplify columns - keep only essential info
-                    simplified_columns = []
-                    for col in columns[:10]:  # Limit to 10 columns per table
-                        if isinstance(col, str):
-                            simplified_columns.append(col)
-                        else:
-                            col_dict = safe_get_dict(col)
-                            if col_dict:
-                                col_name = col_dict.get("column_name", "") or col_dict.get("name", "")
-                                col_type = col_dict.get("data_type", "") or col_dict.get("type", "")
-                                simplified_columns.append(f"{col_name} ({col_type})")
-                    
-                    simplified_model["tables"].append({
-                        "name": table_name,
-                        "columns": simplified_columns
-                    })
-            user_msg_data["model_metadata"] = simplified_model
-        else:
-            # For simple models, send full metadata
-            user_msg_data["model_metadata"] = req.model_metadata
-        
-        # Add KPI context to user message (adjust limits based on complexity)
-        if req.kpi_list:
-            kpi_limit = 5 if is_complex else 10
-            user_msg_data["kpi_definitions"] = req.kpi_list[:kpi_limit]
-        
-        # Add data dictionary context (adjust limits based on complexity)
-        if req.data_dictionary:
-            simplified_dict = {}
-            table_limit = 2 if is_complex else 3
-            col_limit = 3 if is_complex else 5
-            for table_name, columns in list(req.data_dictionary.items())[:table_limit]:
-                simplified_dict[table_name] = {}
-                for col_name, col_info in list(columns.items())[:col_limit]:
-                    simplified_dict[table_name][col_name] = col_info.get('description', 'No description')
-            user_msg_data["data_dictionary"] = simplified_dict
-        
-        user_msg = json.dumps(user_msg_data, indent=2)
-        
-        # Dynamic timeout and token allocation based on complexity
-        if is_complex:
-            timeout_seconds = 900  # 15 minutes for complex models
-            max_tokens = 2500
-        elif is_simple:
-            timeout_seconds = 600   # 10 minutes for simple models
-            max_tokens = 1500
+        # Enhanced JSON extraction with better regex patterns
+        try:
+            # Try multiple patterns to extract layout_instructions
+            patterns = [
+                # Standard JSON field with escaped quotes (backslashes excluded from the
+                # runs so truncated JSON can't trigger catastrophic backtracking)
+                r'"layout_instructions":\s*"([^"\\]*(?:\\.[^"\\]*)*)"',
+                # JSON field with single quotes 
+                r"'layout_instructions':\s*'([^'\\]*(?:\\.[^'\\]*)*)'",
+                # Multiline JSON field
+                r'"layout_instructions":\s*"((?:[^"\\]|\\.)*)"\s*[,}]',
+                # Without quotes (if AI returns unquoted)
+                r'"layout_instructions":\s*([^,}]+)',
+                # Alternative field names
+                r'"instructions":\s*"([^"\\]*(?:\\.[^"\\]*)*)"',
+                r'"dashboard_instructions":\s*"([^"\\]*(?:\\.[^"\\]*)*)"'
+            ]
+            
+            extracted_instructions = None
+            for pattern in patterns:
+                layout_match = re.search(pattern, content, re.DOTALL)
+                if layout_match:
+                    extracted_instructions = layout_match.group(1)
+                    break
+            
+            if extracted_instructions:
+                # Comprehensive unescape
+                extracted_instructions = extracted_instructions.replace('\\"', '"')
+                extracted_instructions = extracted_instructions.replace('\\n', '\n')
+                extracted_instructions = extracted_instructions.replace('\\r', '\r')
+                extracted_instructions = extracted_instructions.replace('\\t', '\t')
+                extracted_instructions = extracted_instructions.replace('\\\\', '\\')
+                
+                # Clean up common AI artifacts
+                extracted_instructions = re.sub(r'\\[a-z]', '', extracted_instructions)  # Remove escape sequences
+                extracted_instructions = re.sub(r'[∗∧¨◊]+', '', extracted_instructions)  # Remove Unicode artifacts
+                
+                return GenerateResponse(
+                    wireframe_json="",
+                    layout_instructions=tidy_md(extracted_instructions)
+                )
+                
+        except Exception as extract_error:
+            logger.warning(f"Failed to extract layout_instructions: {str(extract_error)}")
+        
+        # Final fallback: return raw content with basic cleanup
+        cleaned_content = content
+        
+        # Remove obvious JSON structure artifacts
+        cleaned_content = re.sub(r'^\s*{\s*', '', cleaned_content)  # Remove opening brace
+        cleaned_content = re.sub(r'\s*}\s*$', '', cleaned_content)  # Remove closing brace
+        cleaned_content = re.sub(r'"wireframe_json":\s*[^,}]+,?\s*', '', cleaned_content)  # Remove wireframe_json
+        cleaned_content = re.sub(r'"[^"]*":\s*"[^"]*",?\s*', '', cleaned_content)  # Remove other JSON fields
+        
+        # Basic cleanup
+        cleaned_content = cleaned_content.replace('\\n', '\n').replace('\\"', '"').replace('\\\\', '\\')
+        cleaned_content = re.sub(r'[∗∧¨◊]+', '', cleaned_content)  # Remove Unicode artifacts
+        
+        # If still looks like JSON, just return the original for frontend to handle
+        if cleaned_content.strip().startswith('{') and cleaned_content.strip().endswith('}'):
+            return GenerateResponse(wireframe_json="", layout_instructions=content)
+        
+        return GenerateResponse(wireframe_json="", layout_instructions=tidy_md(cleaned_content))
+
+# ─── Latency-Budgeted Generation ─────────────────────────────────────────────────
+CHART_KEYWORDS = [
+    ("KPI cards", ["kpi", "card", "metric", "scorecard"]),
+    ("Line chart", ["line chart", "trend", "over time", "sparkline"]),
+    ("Bar chart", ["bar chart", "bar", "column chart", "top "]),
+    ("Pie / donut chart", ["pie", "donut", "share", "breakdown"]),
+    ("Table", ["table", "grid", "matrix", "detail"]),
+    ("Map", ["map", "geo", "region"]),
+    ("Filters / slicers", ["filter", "slicer", "selector", "date range"]),
+]
+
+def render_layout_locally(req: GenerateRequest) -> GenerateResponse:
+    """Deterministic layout instructions from the sketch, KPI list and data model (no LLM)"""
+    platform = req.platform_selected
+    sketch = req.sketch_description or ""
+    sketch_lower = sketch.lower()
+    lines = [f"# {platform} Dashboard Build Instructions",
+             "_Generated locally from your sketch, KPIs and data model to meet the requested response time._"]
+
+    sketch_lines = [line.strip(" -*") for line in sketch.splitlines() if line.strip(" -*=")]
+    if sketch_lines:
+        lines.append("\n## Layout")
+        lines += [f"{i}. {line}" for i, line in enumerate(sketch_lines[:25], 1)]
+
+    visuals = [name for name, words in CHART_KEYWORDS if any(word in sketch_lower for word in words)]
+    if visuals:
+        lines.append("\n## Visuals")
+        for i, name in enumerate(visuals, 1):
+            lines.append(f"{i}. **{name}** - add a {name.lower()} visual to the position shown in the sketch "
+                         "and bind it to the measures below")
+
+    kpis = req.kpi_list or []
+    if kpis:
+        measure_kind = "DAX measure" if "power bi" in platform.lower() else (
+            "calculated field" if "tableau" in platform.lower() else "measure")
+        lines.append("\n## Measures")
+        for kpi in kpis:
+            name = kpi.get("name") or kpi.get("kpi_name") or "KPI"
+            formula = kpi.get("calculation") or kpi.get("formula") or kpi.get("description", "")
+            lines.append(f"- **{name}** ({measure_kind}): `{formula}`" if formula else f"- **{name}** ({measure_kind})")
+
+    analysis = analyze_data_model_for_prep(req.model_metadata or {})
+    if analysis["tables"]:
+        lines.append("\n## Data Model")
+        for table in analysis["tables"]:
+            fields = table["date_columns"][:3] + table["numeric_columns"][:5]
+            lines.append(f"- **{table['name']}**" + (f": {', '.join(fields)}" if fields else ""))
+        for rel in analysis["relationships"]:
+            lines.append(f"- Relate {rel['from_table']}.{rel['from_column']} → {rel['to_table']}.{rel['to_column']}")
+
+    lines.append("\n## Build Steps")
+    lines += ["1. Connect to the data source and load the tables above",
+              "2. Create the relationships and the measures",
+              "3. Place the visuals following the layout order",
+              "4. Add the filters and check totals against the source"]
+    return GenerateResponse(wireframe_json=sketch, layout_instructions=tidy_md("\n".join(lines)))
+
+def layout_context_key(req: GenerateRequest) -> str:
+    """Everything but the sketch must match exactly for a near-duplicate layout to be reused"""
+    return context_key(
+        platform=req.platform_selected, custom_prompt=req.custom_prompt, model_metadata=req.model_metadata,
+        kpi_list=req.kpi_list, data_dictionary=req.data_dictionary,
+        include_data_prep=req.include_data_prep, complexity=req.instruction_complexity,
+        objectives=req.selected_objectives,
+    )
+
+async def plan_strategy(kind: str, req: GenerateRequest, messages, max_tokens=None):
+    """(strategy, cached reply or None, budget in seconds or None) for req.max_latency_ms"""
+    budget = req.max_latency_ms / 1000.0 if req.max_latency_ms else None
+    cached = await llm_gateway.cached_reply(messages, task=kind, max_tokens=max_tokens)
+    return planner.plan(kind, budget, cached is not None), cached, budget
+
+async def within_budget(deltas, budget):
+    """Re-yield `deltas`; asyncio.TimeoutError once `budget` seconds have passed (None: no limit)"""
+    iterator = deltas.__aiter__()
+    deadline = None if budget is None else time.perf_counter() + budget
+    try:
+        while True:
+            try:
+                if deadline is None:
+                    delta = await iterator.__anext__()
+                else:
+                    delta = await asyncio.wait_for(iterator.__anext__(), max(0.0, deadline - time.perf_counter()))
+            except StopAsyncIteration:
+                return
+            yield delta
+    finally:
+        await iterator.aclose()
+
+async def generate_with_plan(kind: str, req: GenerateRequest, messages, finish, render_local,
+                             max_tokens=None, timeout_seconds=None) -> GenerateResponse:
+    """Serve `kind` ('layout' or 'data_prep') with the strategy the planner picks for req.max_latency_ms.
+
+    Without a budget LLM errors propagate so the caller's existing fallback applies; with one
+    a failed LLM strategy degrades to local rendering.
+    """
+    strategy, cached, budget = await plan_strategy(kind, req, messages, max_tokens)
+    start = time.perf_counter()
+    try:
+        if strategy == STRATEGY_CACHE:
+            response = finish(cached)
+        elif strategy == STRATEGY_LOCAL:
+            response = render_local()
         else:
-            timeout_seconds = 720  # 12 minutes for medium models
-            max_tokens = 1800
+            # One attempt, and the whole call - queueing included - ends with the budget
+            content = await asyncio.wait_for(create_optimized_openai_call(
+                messages=messages,
+                task=kind if strategy == STRATEGY_FULL else f"{kind}_fast",
+                max_tokens=max_tokens,
+                timeout=timeout_seconds,
+                priority=PRIORITY_INTERACTIVE,
+                budget=budget
+            ), budget)
+            response = finish(content)
+    except Exception as e:
+        planner.observe(kind, strategy, time.perf_counter() - start)
+        if budget is None or strategy in (STRATEGY_CACHE, STRATEGY_LOCAL):
+            raise
+        logger.warning(f"{kind} via {strategy} failed within the {budget:.1f}s budget ({str(e)}); rendering locally")
+        response, strategy = render_local(), STRATEGY_LOCAL_FALLBACK
+    else:
+        planner.observe(kind, strategy, time.perf_counter() - start)
+    response.strategy = strategy
+    return response
+
+@app.post("/api/v1/generate-layout", response_model=GenerateResponse)
+async def generate_layout(req: GenerateRequest):
+    """Generate layout instructions or data preparation steps"""
+    import time
+    start_time = time.time()
+    
+    try:
+        logger.info(f"🚀 **BACKEND**: Starting generate-layout request at {time.strftime('%H:%M:%S')}")
+        logger.info(f"📊 **REQUEST INFO**: Platform: {req.platform_selected}, Data prep only: {req.data_prep_only}")
+        
+        # Data-Prep Only branch - ENHANCED VERSION with error handling
+        if req.data_prep_only:
+            messages, model_dict = build_data_prep_messages(req)
+            
+            def finish_data_prep(raw_instructions):
+                return GenerateResponse(
+                    wireframe_json="", 
+                    layout_instructions=finalize_data_prep_instructions(raw_instructions, model_dict, req.platform_selected)
+                )
+            
+            def render_data_prep_locally():
+                analysis = analyze_data_model_for_prep(model_dict)
+                return finish_data_prep(generate_platform_specific_instructions(req.platform_selected, analysis))
+            
+            try:
+                return await generate_with_plan("data_prep", req, messages, finish_data_prep, render_data_prep_locally)
+            except Exception as openai_error:
+                logger.error(f"OpenAI timeout or error: {str(openai_error)}")
+                # Provide a fallback response
+                return finish_data_prep(data_prep_fallback_instructions(req.platform_selected))
+
+        # Full Layout branch - a re-pasted sketch with small edits reuses the earlier layout
+        layout_context = layout_context_key(req)
+        match = near_duplicates.lookup("layout", req.sketch_description, layout_context)
+        if match:
+            previous, similarity = match
+            return GenerateResponse(**dict(previous, strategy=STRATEGY_NEAR_DUPLICATE))
         
-        logger.info(f"Using timeout: {timeout_seconds}s, max_tokens: {max_tokens}")
+        messages, max_tokens, timeout_seconds = build_layout_messages(req)
         
-        # Updated for OpenAI v1.0+
         try:
-            content = create_optimized_openai_call(
-                messages=[
-                    {"role":"system","content":system_msg},
-                    {"role":"user","content":user_msg}
-                ],
-                max_tokens=max_tokens,
-                timeout=timeout_seconds
+            # Parse JSON from the AI, then tidy the instructions
+            response = await generate_with_plan(
+                "layout", req, messages, parse_layout_response, lambda: render_layout_locally(req),
+                max_tokens=max_tokens, timeout_seconds=timeout_seconds
             )
+            if response.strategy in (STRATEGY_FULL, STRATEGY_CACHE):
+                # Only full-model answers are worth handing to later requests
+                near_duplicates.add("layout", req.sketch_description, response.model_dump(exclude={"strategy"}), layout_context)
+            return response
         except Exception as e:
+            logger.error(f"Layout generation failed: {str(e)}")
             # Fallback for layout generation
-            content = json.dumps({
+            return parse_layout_response(json.dumps({
                 "wireframe_json": req.sketch_description,
                 "layout_instructions": "AI service temporarily unavailable. Please try again."
-            })
-
-        # Parse JSON from the AI, then tidy the instructions
-        try:
-            result = json.loads(content)
-            instr = tidy_md(result.get("layout_instructions",""))
-            return GenerateResponse(
-                wireframe_json=result.get("wireframe_json",""),
-                layout_instructions=instr
-            )
-        except Exception as parse_error:
-            logger.warning(f"Failed to parse AI response as JSON: {str(parse_error)}")
-            
-            # Enhanced JSON extraction with better regex patterns
-            try:
-                # Try multiple patterns to extract layout_instructions
-                patterns = [
-                    # Standard JSON field with escaped quotes
-                    r'"layout_instructions":\s*"([^"]*(?:\\.[^"]*)*)"',
-                    # JSON field with single quotes 
-                    r"'layout_instructions':\s*'([^']*(?:\\.[^']*)*)'",
-                    # Multiline JSON field
-                    r'"layout_instructions":\s*"((?:[^"\\]|\\.)*)"\s*[,}]',
-                    # Without quotes (if AI returns unquoted)
-                    r'"layout_instructions":\s*([^,}]+)',
-                    # Alternative field names
-                    r'"instructions":\s*"([^"]*(?:\\.[^"]*)*)"',
-                    r'"dashboard_instructions":\s*"([^"]*(?:\\.[^"]*)*)"'
-                ]
-                
-                extracted_instructions = None
-                for pattern in patterns:
-                    layout_match = re.search(pattern, content, re.DOTALL)
-                    if layout_match:
-                        extracted_instructions = layout_match.group(1)
-                        break
-                
-                if extracted_instructions:
-                    # Comprehensive unescape
-                    extracted_instructions = extracted_instructions.replace('\\"', '"')
-                    extracted_instructions = extracted_instructions.replace('\\n', '\n')
-                    extracted_instructions = extracted_instructions.replace('\\r', '\r')
-                    extracted_instructions = extracted_instructions.replace('\\t', '\t')
-                    extracted_instructions = extracted_instructions.replace('\\\\', '\\')
-                    
-                    # Clean up common AI artifacts
-                    extracted_instructions = re.sub(r'\\[a-z]', '', extracted_instructions)  # Remove escape sequences
-                    extracted_instructions = re.sub(r'[∗∧¨◊]+', '', extracted_instructions)  # Remove Unicode artifacts
-                    
-                    return GenerateResponse(
-                        wireframe_json="",
-                        layout_instructions=tidy_md(extracted_instructions)
-                    )
-                    
-            except Exception as extract_error:
-                logger.warning(f"Failed to extract layout_instructions: {str(extract_error)}")
-            
-            # Final fallback: return raw content with basic cleanup
-            cleaned_content = content
-            
-            # Remove obvious JSON structure artifacts
-            cleaned_content = re.sub(r'^\s*{\s*', '', cleaned_content)  # Remove opening brace
-            cleaned_content = re.sub(r'\s*}\s*$', '', cleaned_content)  # Remove closing brace
-            cleaned_content = re.sub(r'"wireframe_json":\s*[^,}]+,?\s*', '', cleaned_content)  # Remove wireframe_json
-            cleaned_content = re.sub(r'"[^"]*":\s*"[^"]*",?\s*', '', cleaned_content)  # Remove other JSON fields
-            
-            # Basic cleanup
-            cleaned_content = cleaned_content.replace('\\n', '\n').replace('\\"', '"').replace('\\\\', '\\')
-            cleaned_content = re.sub(r'[∗∧¨◊]+', '', cleaned_content)  # Remove Unicode artifacts
-            
-            # If still looks like JSON, just return the original for frontend to handle
-            if cleaned_content.strip().startswith('{') and cleaned_content.strip().endswith('}'):
-                return GenerateResponse(wireframe_json="", layout_instructions=content)
-            
-            return GenerateResponse(wireframe_json="", layout_instructions=tidy_md(cleaned_content))
+            }))
 
     except HTTPException:
         raise
@@ -1847,127 +2300,140 @@ Create these calculated fields in your data model:
         )
 
 # ─── Sprint Board Generation ────────────────────────────────────────────────────
+def build_sprint_messages(req: SprintRequest):
+    """Build sprint planning messages; returns (messages, team_capacity)"""
+    # Calculate team capacity
+    team_capacity = {
+        "total_resources": req.total_resources,
+        "points_per_resource": req.points_per_resource,
+        "total_velocity": req.total_resources * req.points_per_resource
+    }
+    
+    system_msg = (
+        "You are an AI expert in Agile sprint planning that converts dashboard development instructions into detailed user stories.\n\n"
+        "**CRITICAL REQUIREMENTS:**\n"
+        "1. Create comprehensive user stories with detailed descriptions and acceptance criteria\n"
+        "2. Estimate story points accurately (1=simple, 3=moderate, 5=complex, 8=very complex, 13=epic)\n"
+        "3. Consider team experience level for story complexity and point estimation\n"
+        "4. Break down large tasks into smaller, manageable stories\n\n"
+        "**TEAM CONTEXT:**\n"
+        f"- Team Size: {req.total_resources} developers\n"
+        f"- Individual Capacity: {req.points_per_resource} points per person per sprint\n"
+        f"- Total Team Velocity: {team_capacity['total_velocity']} points per sprint\n"
+        f"- Team Experience: {req.experience_level}\n"
+        f"- Priority Focus: {req.priority_focus}\n"
+        f"- Sprint Length: {req.sprint_length_days} days\n\n"
+        "**OUTPUT FORMAT:**\n"
+        "Return JSON with:\n"
+        "• sprint_stories: [{title, points, description, acceptance_criteria, priority, dependencies}, ...]\n"
+        "• total_story_points: sum of all story points\n"
+        "• estimated_sprints: number of sprints needed based on team velocity\n"
+    )
+    
+    user_msg = json.dumps({
+        "layout_instructions": req.layout_instructions,
+        "team_context": {
+            "total_resources": req.total_resources,
+            "points_per_resource": req.points_per_resource, 
+            "total_velocity": team_capacity['total_velocity'],
+            "experience_level": req.experience_level,
+            "priority_focus": req.priority_focus,
+            "sprint_length_days": req.sprint_length_days
+        }
+    }, indent=2)
+    
+    messages = [
+        {"role":"system","content":system_msg},
+        {"role":"user","content":user_msg}
+    ]
+    return messages, team_capacity
+
+def build_sprint_response(parsed: Dict[str, Any], team_capacity: Dict[str, int]) -> SprintResponse:
+    """Distribute parsed sprint stories across sprints and compute capacity metrics"""
+    # Extract stories and calculate metrics
+    sprint_stories = parsed.get("sprint_stories", [])
+    total_story_points = parsed.get("total_story_points", sum(story.get("points", 0) for story in sprint_stories))
+    estimated_sprints = parsed.get("estimated_sprints", max(1, (total_story_points + team_capacity['total_velocity'] - 1) // team_capacity['total_velocity']))
+    
+    # Distribute stories across sprints
+    sprint_breakdown = []
+    if estimated_sprints > 1:
+        current_sprint = 1
+        current_points = 0
+        current_stories = []
+        
+        for story in sprint_stories:
+            story_points = story.get("points", 0)
+            
+            # If adding this story would exceed capacity, start new sprint
+            if current_points + story_points > team_capacity['total_velocity'] and current_stories:
+                sprint_breakdown.append({
+                    "sprint_number": current_sprint,
+                    "stories": current_stories.copy(),
+                    "total_points": current_points,
+                    "capacity_used": f"{current_points}/{team_capacity['total_velocity']}"
+                })
+                current_sprint += 1
+                current_stories = []
+                current_points = 0
+            
+            current_stories.append(story)
+            current_points += story_points
+        
+        # Add the last sprint
+        if current_stories:
+            sprint_breakdown.append({
+                "sprint_number": current_sprint,
+                "stories": current_stories,
+                "total_points": current_points,
+                "capacity_used": f"{current_points}/{team_capacity['total_velocity']}"
+            })
+    else:
+        # Single sprint
+        sprint_breakdown.append({
+            "sprint_number": 1,
+            "stories": sprint_stories,
+            "total_points": total_story_points,
+            "capacity_used": f"{total_story_points}/{team_capacity['total_velocity']}"
+        })
+    
+    # Calculate over/under capacity for first sprint
+    first_sprint_points = sprint_breakdown[0]['total_points'] if sprint_breakdown else 0
+    over_under_capacity = first_sprint_points - team_capacity['total_velocity']
+    
+    return SprintResponse(
+        sprint_stories=sprint_stories,
+        over_under_capacity=over_under_capacity,
+        estimated_sprints=estimated_sprints,
+        sprint_breakdown=sprint_breakdown,
+        total_story_points=total_story_points,
+        team_capacity=team_capacity,
+        truncated=bool(parsed.get("truncated", False))
+    )
+
 @app.post("/api/v1/generate-sprint", response_model=SprintResponse)
 async def generate_sprint(req: SprintRequest):
     """Generate sprint backlog with multi-sprint distribution and resource planning"""
     try:
-        # Calculate team capacity
-        team_capacity = {
-            "total_resources": req.total_resources,
-            "points_per_resource": req.points_per_resource,
-            "total_velocity": req.total_resources * req.points_per_resource
-        }
-        
-        system_msg = (
-            "You are an AI expert in Agile sprint planning that converts dashboard development instructions into detailed user stories.\n\n"
-            "**CRITICAL REQUIREMENTS:**\n"
-            "1. Create comprehensive user stories with detailed descriptions and acceptance criteria\n"
-            "2. Estimate story points accurately (1=simple, 3=moderate, 5=complex, 8=very complex, 13=epic)\n"
-            "3. Consider team experience level for story complexity and point estimation\n"
-            "4. Break down large tasks into smaller, manageable stories\n\n"
-            "**TEAM CONTEXT:**\n"
-            f"- Team Size: {req.total_resources} developers\n"
-            f"- Individual Capacity: {req.points_per_resource} points per person per sprint\n"
-            f"- Total Team Velocity: {team_capacity['total_velocity']} points per sprint\n"
-            f"- Team Experience: {req.experience_level}\n"
-            f"- Priority Focus: {req.priority_focus}\n"
-            f"- Sprint Length: {req.sprint_length_days} days\n\n"
-            "**OUTPUT FORMAT:**\n"
-            "Return JSON with:\n"
-            "• sprint_stories: [{title, points, description, acceptance_criteria, priority, dependencies}, ...]\n"
-            "• total_story_points: sum of all story points\n"
-            "• estimated_sprints: number of sprints needed based on team velocity\n"
-        )
-        
-        user_msg = json.dumps({
-            "layout_instructions": req.layout_instructions,
-            "team_context": {
-                "total_resources": req.total_resources,
-                "points_per_resource": req.points_per_resource, 
-                "total_velocity": team_capacity['total_velocity'],
-                "experience_level": req.experience_level,
-                "priority_focus": req.priority_focus,
-                "sprint_length_days": req.sprint_length_days
-            }
-        }, indent=2)
+        messages, team_capacity = build_sprint_messages(req)
         
         # Updated for OpenAI v1.0+
         try:
-            content = create_optimized_openai_call(
-                messages=[
-                    {"role":"system","content":system_msg},
-                    {"role":"user","content":user_msg}
-                ],
-                max_tokens=2000,
-                timeout=600
+            content = await create_optimized_openai_call(
+                messages=messages,
+                task="sprint",
+                priority=PRIORITY_INTERACTIVE
             )
         except Exception as e:
             raise HTTPException(500, f"Sprint generation failed: {str(e)}")
         
         try:
-            parsed = json.loads(content)
+            # A cut-off completion still yields every story that was complete
+            parsed = parse_with_salvage(content, "sprint_stories")
         except Exception as e:
             raise HTTPException(500, f"Invalid JSON from AI:\n{e}\n\n{content}")
         
-        # Extract stories and calculate metrics
-        sprint_stories = parsed.get("sprint_stories", [])
-        total_story_points = parsed.get("total_story_points", sum(story.get("points", 0) for story in sprint_stories))
-        estimated_sprints = parsed.get("estimated_sprints", max(1, (total_story_points + team_capacity['total_velocity'] - 1) // team_capacity['total_velocity']))
-        
-        # Distribute stories across sprints
-        sprint_breakdown = []
-        if estimated_sprints > 1:
-            current_sprint = 1
-            current_points = 0
-            current_stories = []
-            
-            for story in sprint_stories:
-                story_points = story.get("points", 0)
-                
-                # If adding this story would exceed capacity, start new sprint
-                if current_points + story_points > team_capacity['total_velocity'] and current_stories:
-                    sprint_breakdown.append({
-                        "sprint_number": current_sprint,
-                        "stories": current_stories.copy(),
-                        "total_points": current_points,
-                        "capacity_used": f"{current_points}/{team_capacity['total_velocity']}"
-                    })
-                    current_sprint += 1
-                    current_stories = []
-                    current_points = 0
-                
-                current_stories.append(story)
-                current_points += story_points
-            
-            # Add the last sprint
-            if current_stories:
-                sprint_breakdown.append({
-                    "sprint_number": current_sprint,
-                    "stories": current_stories,
-                    "total_points": current_points,
-                    "capacity_used": f"{current_points}/{team_capacity['total_velocity']}"
-                })
-        else:
-            # Single sprint
-            sprint_breakdown.append({
-                "sprint_number": 1,
-                "stories": sprint_stories,
-                "total_points": total_story_points,
-                "capacity_used": f"{total_story_points}/{team_capacity['total_velocity']}"
-            })
-        
-        # Calculate over/under capacity for first sprint
-        first_sprint_points = sprint_breakdown[0]['total_points'] if sprint_breakdown else 0
-        over_under_capacity = first_sprint_points - team_capacity['total_velocity']
-        
-        return SprintResponse(
-            sprint_stories=sprint_stories,
-            over_under_capacity=over_under_capacity,
-            estimated_sprints=estimated_sprints,
-            sprint_breakdown=sprint_breakdown,
-            total_story_points=total_story_points,
-            team_capacity=team_capacity
-        )
+        return build_sprint_response(parsed, team_capacity)
         
     except HTTPException:
         raise
@@ -1975,12 +2441,235 @@ async def generate_sprint(req: SprintRequest):
         logger.error(f"Error in generate_sprint: {str(e)}")
         raise HTTPException(500, f"Internal server error: {str(e)}")
 
+# ─── Streaming (SSE) Generation ─────────────────────────────────────────────────
+SSE_HEARTBEAT_SECONDS = 15.0
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def sse_with_heartbeat(events, interval: float = SSE_HEARTBEAT_SECONDS):
+    """Interleave SSE comment frames so proxies don't drop quiet connections"""
+    iterator = events.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield ": keep-alive\n\n"
+                continue
+            try:
+                frame = pending.result()
+            except StopAsyncIteration:
+                break
+            yield frame
+            pending = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        if not pending.done():
+            pending.cancel()
+
+def sse_response(events) -> StreamingResponse:
+    """Wrap an async generator of SSE frames in a non-buffered streaming response"""
+    return StreamingResponse(
+        sse_with_heartbeat(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/v1/generate-layout/stream")
+async def generate_layout_stream(req: GenerateRequest):
+    """Stream layout or data-prep markdown as Server-Sent Events (token, done, error).
+
+    Near-duplicate, cache and local answers - and the planner's pick for req.max_latency_ms -
+    arrive as a single done event, as generate-layout would return them.
+    """
+    layout_context = None
+    if req.data_prep_only:
+        messages, model_dict = build_data_prep_messages(req)
+        kind, max_tokens, timeout_seconds = "data_prep", None, None
+        
+        def finish(content):
+            instructions = finalize_data_prep_instructions(content, model_dict, req.platform_selected)
+            return GenerateResponse(wireframe_json="", layout_instructions=instructions)
+        
+        def render_local():
+            analysis = analyze_data_model_for_prep(model_dict)
+            return finish(generate_platform_specific_instructions(req.platform_selected, analysis))
+    else:
+        messages, max_tokens, timeout_seconds = build_layout_messages(req, markdown_only=True)
+        kind = "layout"
+        layout_context = layout_context_key(req)
+        
+        def finish(content):
+            return GenerateResponse(wireframe_json=req.sketch_description, layout_instructions=tidy_md(content))
+        
+        def render_local():
+            return render_layout_locally(req)
+    
+    async def events():
+        if layout_context is not None:
+            match = near_duplicates.lookup("layout", req.sketch_description, layout_context)
+            if match:
+                previous, similarity = match
+                yield sse_event("done", dict(previous, strategy=STRATEGY_NEAR_DUPLICATE))
+                return
+        
+        strategy, cached, budget = await plan_strategy(kind, req, messages, max_tokens)
+        start = time.perf_counter()
+        if strategy in (STRATEGY_CACHE, STRATEGY_LOCAL):
+            response = finish(cached) if strategy == STRATEGY_CACHE else render_local()
+        else:
+            parts = []
+            try:
+                async for delta in within_budget(stream_openai_call(
+                    messages, task=kind if strategy == STRATEGY_FULL else f"{kind}_fast",
+                    max_tokens=max_tokens, timeout=timeout_seconds, budget=budget
+                ), budget):
+                    parts.append(delta)
+                    yield sse_event("token", {"text": delta})
+            except Exception as e:
+                planner.observe(kind, strategy, time.perf_counter() - start)
+                if budget is None:
+                    logger.error(f"Streaming generate-layout failed: {str(e)}")
+                    detail = e.detail if isinstance(e, HTTPException) else str(e)
+                    yield sse_event("error", {"detail": detail})
+                    return
+                logger.warning(f"{kind} stream via {strategy} failed within the {budget:.1f}s budget ({str(e)}); rendering locally")
+                response, strategy = render_local(), STRATEGY_LOCAL_FALLBACK
+            else:
+                response = finish("".join(parts))
+        if strategy != STRATEGY_LOCAL_FALLBACK:
+            planner.observe(kind, strategy, time.perf_counter() - start)
+        response.strategy = strategy
+        
+        if layout_context is not None and strategy in (STRATEGY_FULL, STRATEGY_CACHE):
+            # Only full-model answers are worth handing to later requests
+            near_duplicates.add("layout", req.sketch_description, response.model_dump(exclude={"strategy"}), layout_context)
+        yield sse_event("done", response.model_dump())
+    
+    return sse_response(events())
+
+@app.post("/api/v1/generate-sprint/stream")
+async def generate_sprint_stream(req: SprintRequest):
+    """Stream sprint JSON tokens and each completed story as Server-Sent Events, then the SprintResponse"""
+    messages, team_capacity = build_sprint_messages(req)
+    
+    async def events():
+        stories = ArrayElementStream("sprint_stories")
+        try:
+            async for delta in stream_openai_call(messages, task="sprint"):
+                yield sse_event("token", {"text": delta})
+                for story in stories.feed(delta):
+                    yield sse_event("story", {"index": len(stories.elements) - 1, "story": story})
+        except Exception as e:
+            logger.error(f"Streaming generate-sprint failed: {str(e)}")
+            if not stories.elements:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                yield sse_event("error", {"detail": detail})
+                return
+            # Keep the stories that already arrived
+            parsed = {"sprint_stories": stories.elements, "truncated": True}
+        else:
+            try:
+                parsed = parse_with_salvage(stories.text, "sprint_stories")
+            except ValueError as e:
+                yield sse_event("error", {"detail": f"Invalid JSON from AI: {e}"})
+                return
+        yield sse_event("done", build_sprint_response(parsed, team_capacity).model_dump())
+    
+    return sse_response(events())
+
+# ─── Bulk Generation ─────────────────────────────────────────────────────────────
+class BulkJobSpec(BaseModel):
+    id: Optional[str] = None  # file name of the result; defaults to job-0001, job-0002, ...
+    request: GenerateRequest  # data_prep_only picks data prep, otherwise the full layout
+
+class BulkManifest(BaseModel):
+    jobs: List[BulkJobSpec]
+    backend: Optional[str] = None  # auto, batch or concurrent (BULK_BACKEND)
+
+def prepare_bulk_job(job_id: str, req: GenerateRequest) -> PreparedJob:
+    """Messages and result builder for one manifest entry, as the interactive endpoint would send them"""
+    if req.data_prep_only:
+        messages, model_dict = build_data_prep_messages(req)
+        
+        def finish_data_prep(content):
+            instructions = finalize_data_prep_instructions(content, model_dict, req.platform_selected)
+            return GenerateResponse(wireframe_json="", layout_instructions=instructions).model_dump()
+        return PreparedJob(job_id, "data_prep", messages, "data_prep", finish_data_prep)
+    
+    messages, max_tokens, timeout_seconds = build_layout_messages(req)
+    return PreparedJob(job_id, "layout", messages, "layout", lambda content: parse_layout_response(content).model_dump(),
+                       max_tokens=max_tokens, timeout=timeout_seconds)
+
+@app.post("/api/v1/bulk-jobs", status_code=202)
+async def submit_bulk_jobs(manifest: BulkManifest):
+    """Start a bulk run; results land in BULK_OUTPUT_DIR/<run_id>/ as each job finishes"""
+    if not manifest.jobs:
+        raise HTTPException(400, "The manifest has no jobs")
+    if len(manifest.jobs) > bulk_runner.max_jobs:
+        raise HTTPException(400, f"The manifest has {len(manifest.jobs)} jobs; the limit is {bulk_runner.max_jobs}")
+    
+    job_ids = [spec.id or f"job-{i:04d}" for i, spec in enumerate(manifest.jobs, 1)]
+    invalid = [job_id for job_id in job_ids if not JOB_ID_PATTERN.match(job_id)]
+    if invalid:
+        raise HTTPException(400, f"Job ids may only use letters, digits, '.', '_' and '-': {invalid[:5]}")
+    if len(set(job_ids)) != len(job_ids):
+        raise HTTPException(400, "Job ids must be unique")
+    try:
+        backend = bulk_runner.resolve_backend(manifest.backend)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    # Invalid requests fail on their own instead of rejecting the whole manifest
+    jobs, rejected = [], {}
+    for job_id, spec in zip(job_ids, manifest.jobs):
+        try:
+            jobs.append(prepare_bulk_job(job_id, spec.request))
+        except HTTPException as e:
+            rejected[job_id] = e.detail
+        except Exception as e:
+            rejected[job_id] = str(e)
+    
+    run = bulk_runner.submit(jobs, rejected, backend)
+    return run.summary()
+
+@app.get("/api/v1/bulk-jobs")
+async def list_bulk_jobs():
+    """Recent bulk runs, newest first"""
+    return {"runs": bulk_runner.runs(), **bulk_runner.stats()}
+
+@app.get("/api/v1/bulk-jobs/{run_id}")
+async def get_bulk_job(run_id: str):
+    """Progress, throughput and per-job result files of one bulk run"""
+    run = bulk_runner.get(run_id)
+    if run is None:
+        raise HTTPException(404, f"Unknown bulk run {run_id}")
+    return run.summary(detail=True)
+
 # ─── Health Check ────────────────────────────────────────────────────────────────
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "Agentic BI Assistant"}
 
+# ─── LLM Call Layer Stats ───────────────────────────────────────────────────────
+@app.get("/api/v1/llm-stats")
+async def llm_stats():
+    """Counters for the LLM gateway (per-model calls, pool, cache, single-flight, admission, retries, breaker)"""
+    return {**await llm_gateway.astats(), "idempotency": idempotency_store.stats(), "planner": planner.stats(),
+            "near_duplicates": near_duplicates.stats(), "schema_ingest": schema_ingest.stats(),
+            "table_cache": await table_cache.astats()}
+
+@app.get("/api/v1/llm-metrics")
+async def llm_metrics(group_by: str = "endpoint,task", recent: int = 0):
+    """Per-call token, TTFT and throughput aggregates, grouped by endpoint/task/model/finish_reason"""
+    return {
+        "group_by": group_by.split(","),
+        "groups": llm_gateway.metrics.aggregate(group_by.split(",")),
+        "recent": llm_gateway.metrics.recent(recent),
+        **llm_gateway.metrics.stats(),
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,68 @@
+# model_routing.py - Per-task model routing table (model, max_tokens, timeout, temperature)
+
+import os
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Mechanical extraction (DDL -> JSON, relationship lists, note parsing) runs on the
+# fast model; open-ended generation stays on gpt-4. Values a call site passes
+# explicitly (e.g. complexity-based layout budgets) win over the table.
+DEFAULT_ROUTES: Dict[str, Dict[str, Any]] = {
+    "default":            {"model": "gpt-4",         "max_tokens": 2000, "timeout": 600},
+    # Schema ingestion
+    "data_model":         {"model": "gpt-4o-mini",   "max_tokens": 4000, "timeout": 120},
+    "ddl_chunk":          {"model": "gpt-4o-mini",   "max_tokens": 2000, "timeout": 600},
+    "relationships":      {"model": "gpt-4o-mini",   "max_tokens": 800,  "timeout": 600},
+    # Unstructured notes
+    "kpi_parsing":        {"model": "gpt-4o-mini",   "max_tokens": 2000, "timeout": 600},
+    "dictionary_parsing": {"model": "gpt-4o-mini",   "max_tokens": 2000, "timeout": 600},
+    # Generation
+    "data_prep":          {"model": "gpt-4",         "max_tokens": 2500, "timeout": 600},
+    "layout":             {"model": "gpt-4",         "max_tokens": 1800, "timeout": 720},
+    "sprint":             {"model": "gpt-4",         "max_tokens": 2000, "timeout": 600},
+    "vision":             {"model": "gpt-4o",        "max_tokens": 2000, "timeout": 900},
+    # Small-model strategy picked by strategy_planner when a latency budget rules out gpt-4
+    "layout_fast":        {"model": "gpt-4o-mini",   "max_tokens": 1800, "timeout": 120},
+    "data_prep_fast":     {"model": "gpt-4o-mini",   "max_tokens": 2500, "timeout": 120},
+    # Legacy modules
+    "instructions":       {"model": "gpt-3.5-turbo", "max_tokens": 2000, "timeout": 300, "temperature": 0.2},
+    "wireframe":          {"model": "gpt-4",         "max_tokens": 500,  "timeout": 300, "temperature": 0.3},
+    "layout_steps":       {"model": "gpt-4",         "max_tokens": 800,  "timeout": 300, "temperature": 0.3},
+}
+
+ROUTE_FIELDS = {"model", "max_tokens", "timeout", "temperature"}
+
+
+def load_routes(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """DEFAULT_ROUTES with per-task overrides from the JSON file at LLM_ROUTING_FILE"""
+    routes = {task: dict(route) for task, route in DEFAULT_ROUTES.items()}
+    path = path or os.getenv("LLM_ROUTING_FILE")
+    if not path:
+        return routes
+    try:
+        with open(path) as f:
+            overrides = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring LLM routing file {path}: {str(e)}")
+        return routes
+    for task, route in overrides.items():
+        unknown = set(route) - ROUTE_FIELDS
+        if unknown:
+            logger.warning(f"Ignoring unknown routing fields for {task}: {sorted(unknown)}")
+        routes.setdefault(task, {}).update({k: v for k, v in route.items() if k in ROUTE_FIELDS})
+    logger.info(f"Loaded LLM routing overrides for {sorted(overrides)} from {path}")
+    return routes
+
+
+ROUTES = load_routes()
+
+
+def route_for(task: Optional[str]) -> Dict[str, Any]:
+    """Routing entry for a task (unknown or missing tasks use 'default')"""
+    return ROUTES.get(task or "default", ROUTES["default"])
@@ -0,0 +1,164 @@
+# near_duplicate.py - Local near-duplicate index over prior request inputs (MinHash + LSH)
+#
+# Analysts re-paste the same sketch or notes with whitespace and wording tweaks, which the
+# exact-hash LLM cache never matches. Texts are reduced to word 3-shingles, signed with
+# MinHash and bucketed by LSH bands; candidates are confirmed with the exact Jaccard
+# similarity of their shingle sets. Everything runs in-process, no external services.
+
+import os
+import re
+import json
+import hashlib
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs at Jaccard 0.8 collide in ~99.9% of cases
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+# 31-bit coefficients keep a * hash (32-bit) + b inside uint64
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> Set[str]:
+    """Lower-cased word k-shingles; whitespace and punctuation differences disappear"""
+    words = _WORD.findall(text.lower())
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def signature(shingle_set: Set[str]) -> np.ndarray:
+    """MinHash signature (NUM_PERM values) of a shingle set"""
+    if not shingle_set:
+        return np.zeros(NUM_PERM, dtype=np.uint64)
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") for s in shingle_set),
+        dtype=np.uint64, count=len(shingle_set),
+    )
+    return ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE).min(axis=1)
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def context_key(**fields) -> str:
+    """Digest of the request fields that must match exactly for a near-duplicate to count"""
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class _Entry:
+    def __init__(self, shingle_set: Set[str], bands: List[bytes], context: str, result: Any):
+        self.shingles = shingle_set
+        self.bands = bands
+        self.context = context
+        self.result = result
+
+
+class NearDuplicateIndex:
+    """LRU-bounded MinHash/LSH index of (text, context) -> previous result, per namespace"""
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 1000, enabled: bool = True):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: Dict[str, "OrderedDict[int, _Entry]"] = {}
+        self._buckets: Dict[str, Dict[Tuple[int, bytes], Set[int]]] = {}
+        self._next_id = 0
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def _namespace_stats(self, namespace: str) -> Dict[str, Any]:
+        return self._stats.setdefault(namespace, {
+            "lookups": 0, "hits": 0, "hit_similarity_total": 0.0, "recent_best_scores": deque(maxlen=20),
+        })
+
+    @staticmethod
+    def _bands(sig: np.ndarray) -> List[bytes]:
+        return [chunk.tobytes() for chunk in np.split(sig, BANDS)]
+
+    def lookup(self, namespace: str, text: str, context: str = "") -> Optional[Tuple[Any, float]]:
+        """(previous_result, similarity) for the most similar prior input above the threshold"""
+        if not self.enabled:
+            return None
+        stats = self._namespace_stats(namespace)
+        stats["lookups"] += 1
+        shingle_set = shingles(text)
+        entries = self._entries.get(namespace, {})
+        buckets = self._buckets.get(namespace, {})
+        candidates: Set[int] = set()
+        for band, key in enumerate(self._bands(signature(shingle_set))):
+            candidates |= buckets.get((band, key), set())
+
+        best_id, best_score = None, 0.0
+        for entry_id in candidates:
+            entry = entries[entry_id]
+            if entry.context != context:
+                continue
+            score = jaccard(shingle_set, entry.shingles)
+            if score > best_score:
+                best_id, best_score = entry_id, score
+        stats["recent_best_scores"].append(round(best_score, 3))
+        if best_id is None or best_score < self.threshold:
+            return None
+
+        stats["hits"] += 1
+        stats["hit_similarity_total"] += best_score
+        entries.move_to_end(best_id)
+        logger.info(f"Near-duplicate {namespace} input (similarity {best_score:.3f}); reusing the previous result")
+        return entries[best_id].result, best_score
+
+    def add(self, namespace: str, text: str, result: Any, context: str = ""):
+        if not self.enabled:
+            return
+        shingle_set = shingles(text)
+        entry = _Entry(shingle_set, self._bands(signature(shingle_set)), context, result)
+        entries = self._entries.setdefault(namespace, OrderedDict())
+        buckets = self._buckets.setdefault(namespace, {})
+        entry_id = self._next_id
+        self._next_id += 1
+        entries[entry_id] = entry
+        for band, key in enumerate(entry.bands):
+            buckets.setdefault((band, key), set()).add(entry_id)
+        while len(entries) > self.max_entries:
+            old_id, old = entries.popitem(last=False)
+            for band, key in enumerate(old.bands):
+                bucket = buckets.get((band, key))
+                if bucket is not None:
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del buckets[(band, key)]
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, stats in self._stats.items():
+            namespaces[namespace] = {
+                "entries": len(self._entries.get(namespace, {})),
+                "lookups": stats["lookups"],
+                "hits": stats["hits"],
+                "hit_rate": round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0,
+                "avg_hit_similarity": round(stats["hit_similarity_total"] / stats["hits"], 3) if stats["hits"] else None,
+                "recent_best_scores": list(stats["recent_best_scores"]),
+            }
+        return {"enabled": self.enabled, "threshold": self.threshold, "namespaces": namespaces}
+
+
+def build_near_duplicate_index_from_env() -> NearDuplicateIndex:
+    return NearDuplicateIndex(
+        threshold=float(os.getenv("NEAR_DUP_THRESHOLD", "0.85")),
+        max_entries=int(os.getenv("NEAR_DUP_MAX_ENTRIES", "1000")),
+        enabled=os.getenv("NEAR_DUP_ENABLED", "true").lower() in ("1", "true", "yes"),
+    )
@@ -0,0 +1,180 @@
+# rate_limiter.py - Process-wide admission control for LLM calls (RPM/TPM pacing + priority queue)
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from token_budget import count_message_tokens
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_DEFAULT: "default",
+    PRIORITY_BULK: "bulk",
+}
+
+def estimate_request_tokens(messages: List[Dict[str, Any]], max_tokens: int, model: str = "gpt-4o") -> int:
+    """Prompt tokens (tokenizer-counted) + completion budget for TPM accounting"""
+    return count_message_tokens(messages, model) + int(max_tokens)
+
+
+class TokenBucket:
+    """Continuously refilling bucket; capacity is the per-minute budget"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Admission:
+    """Ticket for one admitted call; set used_tokens once the real usage is known"""
+
+    def __init__(self, tokens: int, priority: int, waited: float):
+        self.tokens = tokens
+        self.priority = priority
+        self.waited = waited
+        self.used_tokens: Optional[int] = None
+
+
+class AdmissionController:
+    """Paces calls under RPM/TPM budgets and a concurrency cap, highest priority first"""
+
+    def __init__(self, rpm: float, tpm: float, max_concurrent: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrent = max_concurrent
+        self._queue: List[list] = []
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+        self._cond_loop = None
+        self._active = 0
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.admitted_by_priority: Dict[str, int] = {}
+
+    def _condition(self) -> asyncio.Condition:
+        # Bind lazily so the controller survives being used from a fresh event loop
+        loop = asyncio.get_running_loop()
+        if self._cond is None or self._cond_loop is not loop:
+            self._cond = asyncio.Condition()
+            self._cond_loop = loop
+        return self._cond
+
+    def _delay_for(self, tokens: int) -> float:
+        return max(self.requests.delay_for(1), self.tokens.delay_for(tokens))
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_DEFAULT) -> Admission:
+        entry = [priority, next(self._seq), tokens]
+        start = time.monotonic()
+        cond = self._condition()
+        async with cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    delay = None
+                    if self._queue[0] is entry and self._active < self.max_concurrent:
+                        delay = self._delay_for(tokens)
+                        if delay <= 0:
+                            heapq.heappop(self._queue)
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            self._active += 1
+                            # Let the next waiter re-check its position
+                            cond.notify_all()
+                            break
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    cond.notify_all()
+                raise
+
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        self.admitted_by_priority[name] = self.admitted_by_priority.get(name, 0) + 1
+        if waited > 1:
+            logger.info(f"LLM call admitted after {waited:.1f}s in queue (priority={name}, tokens~{tokens})")
+        return Admission(tokens, priority, waited)
+
+    async def release(self, admission: Admission):
+        cond = self._condition()
+        async with cond:
+            self._active -= 1
+            if admission.used_tokens is not None and admission.used_tokens < admission.tokens:
+                # Refund the unused part of the completion budget
+                self.tokens.give_back(admission.tokens - admission.used_tokens)
+            cond.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int, priority: int = PRIORITY_DEFAULT):
+        admission = await self.acquire(tokens, priority)
+        try:
+            yield admission
+        finally:
+            await self.release(admission)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rpm_limit": self.requests.capacity,
+            "tpm_limit": self.tokens.capacity,
+            "max_concurrent": self.max_concurrent,
+            "active": self._active,
+            "queue_depth": len(self._queue),
+            "admitted": self.admitted,
+            "admitted_by_priority": dict(self.admitted_by_priority),
+            "avg_wait_seconds": round(self.total_wait / self.admitted, 3) if self.admitted else 0.0,
+            "max_wait_seconds": round(self.max_wait, 3),
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level, 1),
+        }
+
+
+def build_admission_from_env() -> AdmissionController:
+    """Create the process-wide controller from LLM_RPM_LIMIT / LLM_TPM_LIMIT / LLM_MAX_CONCURRENCY"""
+    return AdmissionController(
+        rpm=float(os.getenv("LLM_RPM_LIMIT", "500")),
+        tpm=float(os.getenv("LLM_TPM_LIMIT", "40000")),
+        max_concurrent=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    )
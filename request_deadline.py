@@ -0,0 +1,169 @@
+# request_deadline.py - Per-request deadlines and cancellation when the HTTP client goes away
+#
+# Clients send their own timeout in the X-Request-Timeout header (seconds, relative so
+# clock skew between hosts doesn't matter). DeadlineMiddleware turns it into a monotonic
+# deadline in a contextvar that llm_gateway reads to size each upstream call, and cancels
+# the handler - and with it every in-flight LLM call - if the client disconnects or the
+# deadline passes. Server-Sent Event streams get no deadline: a streaming client's timeout
+# is the gap between chunks, not the whole response, so they are only cancelled on disconnect.
+
+import os
+import json
+import time
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# ─── Configuration ───────────────────────────────────────────────────────────────
+DEADLINE_HEADER = "x-request-timeout"
+# Answer this long before the client gives up, so it sees a 504 instead of its own timeout
+DEADLINE_MARGIN = float(os.getenv("REQUEST_DEADLINE_MARGIN_SECONDS", "2"))
+# Applied when a request carries no header (unset = no server-side deadline)
+DEFAULT_BUDGET = float(os.getenv("REQUEST_DEFAULT_TIMEOUT_SECONDS", "0")) or None
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+_stats = {"requests": 0, "with_deadline": 0, "client_disconnects": 0, "deadline_exceeded": 0}
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline leaves no time for another upstream call"""
+
+    def __init__(self, overrun: float = 0.0):
+        self.overrun = overrun
+        super().__init__(f"Request deadline exceeded by {overrun:.1f}s")
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline (None without a deadline)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def extend(seconds: float):
+    """Move the current context's deadline (if any) `seconds` later"""
+    deadline = _deadline.get()
+    if deadline is not None:
+        _deadline.set(deadline + seconds)
+
+
+def clamp_timeout(timeout: float) -> float:
+    """`timeout` shortened to the time left; raises DeadlineExceeded when none is left"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded(-left)
+    return min(timeout, left)
+
+
+def parse_budget(value: Optional[str]) -> Optional[float]:
+    """Header value in seconds -> budget in seconds (None if missing or invalid)"""
+    if not value:
+        return DEFAULT_BUDGET
+    try:
+        budget = float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {DEADLINE_HEADER} header: {value!r}")
+        return DEFAULT_BUDGET
+    return budget if budget > 0 else DEFAULT_BUDGET
+
+
+def is_event_stream(scope, headers: Dict[bytes, bytes]) -> bool:
+    """SSE request: a /stream route or a client asking for text/event-stream"""
+    return scope.get("path", "").endswith("/stream") or b"text/event-stream" in headers.get(b"accept", b"")
+
+
+class DeadlineMiddleware:
+    """ASGI middleware: sets the request deadline and cancels the handler on disconnect or expiry"""
+
+    def __init__(self, app, margin: float = DEADLINE_MARGIN):
+        self.app = app
+        self.margin = margin
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        _stats["requests"] += 1
+        headers = dict(scope.get("headers") or [])
+        budget = None
+        if not is_event_stream(scope, headers):
+            budget = parse_budget(headers.get(DEADLINE_HEADER.encode(), b"").decode("latin-1"))
+        deadline = None
+        if budget is not None:
+            _stats["with_deadline"] += 1
+            deadline = time.monotonic() + max(0.0, budget - self.margin)
+
+        response_started = False
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        # Only this middleware reads the socket; the app gets every message through a queue
+        inbox: asyncio.Queue = asyncio.Queue()
+
+        async def listen():
+            while True:
+                message = await receive()
+                inbox.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        token = _deadline.set(deadline)
+        try:
+            # The handler task copies the context, deadline included
+            handler = asyncio.ensure_future(self.app(scope, inbox.get, tracked_send))
+        finally:
+            _deadline.reset(token)
+        listener = asyncio.ensure_future(listen())
+
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait({handler, listener}, timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if handler in done:
+                await handler
+                return
+
+            if listener in done:
+                _stats["client_disconnects"] += 1
+                logger.info(f"Client disconnected from {scope.get('path')}; cancelling in-flight work")
+            else:
+                _stats["deadline_exceeded"] += 1
+                logger.warning(f"{scope.get('path')} passed its {budget:.0f}s deadline; cancelling in-flight work")
+            handler.cancel()
+            try:
+                await handler
+            except asyncio.CancelledError:
+                pass
+            if listener not in done and not response_started:
+                await send_deadline_exceeded(send, budget)
+        finally:
+            listener.cancel()
+            if not handler.done():
+                handler.cancel()
+
+
+async def send_deadline_exceeded(send, budget: float):
+    body = json.dumps({"detail": f"Request exceeded its {budget:.0f}s deadline"}).encode()
+    await send({"type": "http.response.start", "status": 504,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def stats() -> Dict[str, Any]:
+    return {"margin_seconds": DEADLINE_MARGIN, "default_budget_seconds": DEFAULT_BUDGET, **_stats}
@@ -6,5 +6,5 @@ router = APIRouter()
 
 @router.post("/generate-instructions")
 async def create_instructions(payload: DashboardRequest):
-    instructions = generate_instructions(payload)
+    instructions = await generate_instructions(payload)
     return {"instructions": instructions}
\ No newline at end of file
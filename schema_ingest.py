@@ -0,0 +1,249 @@
+# schema_ingest.py - Hierarchical DDL -> data model conversion for schemas of any size
+#
+# Schemas too large for the chunk fan-out in generate-model (hundreds of tables, or one
+# huge file) are handled statement by statement:
+#   1. statements are streamed out of the uploaded files and packed into batches of at
+#      most SCHEMA_BATCH_TOKENS (and never more than one call can take)
+#   2. at most SCHEMA_INGEST_CONCURRENCY batches are in flight; each result is merged into
+#      the accumulated tables as soon as it lands and then dropped. A batch whose answer
+#      was cut off keeps its complete tables and re-sends only the missing statements,
+#      halving them until they fit
+#   3. a final pass extracts relationships (relationships_sql plus any ALTER TABLE ...
+#      FOREIGN KEY found among the tables) and keeps only those whose tables both
+#      exist in the merged model
+# Per-call context is bounded by the batch size, memory by the concurrency window.
+
+import os
+import re
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from ddl_parser import created_table_name, is_create_table, split_statements
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+_RELATIONSHIP_STATEMENT = re.compile(r"\b(REFERENCES|FOREIGN\s+KEY)\b", re.IGNORECASE)
+
+
+def iter_statements(sql_files: Iterable[str]) -> Iterator[str]:
+    """Statements of every file in order, one file split at a time"""
+    for sql in sql_files:
+        for statement in split_statements(sql):
+            yield statement + ";"
+
+
+def is_relationship_statement(statement: str) -> bool:
+    """ALTER TABLE ... FOREIGN KEY and similar: relationships without a table definition"""
+    return not is_create_table(statement) and bool(_RELATIONSHIP_STATEMENT.search(statement))
+
+
+def iter_batches(statements: Iterable[str], count_tokens: Callable[[str], int], max_tokens: int,
+                 fits: Optional[Callable[[int], bool]] = None) -> Iterator[Tuple[List[str], int]]:
+    """Pack statements in order into (batch, tokens) of at most `max_tokens` that `fits` accepts.
+
+    A single statement over the limit still goes out, alone.
+    """
+    batch: List[str] = []
+    batch_tokens = 0
+    for statement in statements:
+        tokens = count_tokens(statement)
+        total = batch_tokens + tokens
+        if batch and (total > max_tokens or (fits is not None and not fits(total))):
+            yield batch, batch_tokens
+            batch, total = [], tokens
+        batch.append(statement)
+        batch_tokens = total
+    if batch:
+        yield batch, batch_tokens
+
+
+def table_key(name: Any) -> str:
+    """Comparable table name: unquoted, unqualified, lower case"""
+    name = re.sub(r'["`\[\]]', "", str(name or "")).strip()
+    return name.rsplit(".", 1)[-1].lower()
+
+
+class SchemaAccumulator:
+    """Tables merged incrementally by name, then relationships resolved against them"""
+
+    def __init__(self):
+        self._tables: Dict[str, Dict[str, Any]] = {}
+        self._relationships: List[Dict[str, Any]] = []
+        self.duplicate_tables = 0
+
+    def add_tables(self, tables: Iterable[Any]):
+        for table in tables:
+            if not isinstance(table, dict):
+                continue
+            key = table_key(table.get("name"))
+            if not key:
+                continue
+            if key in self._tables:
+                self.duplicate_tables += 1
+            else:
+                self._tables[key] = table
+
+    def add_relationships(self, relationships: Iterable[Any]):
+        self._relationships.extend(r for r in relationships if isinstance(r, dict))
+
+    @property
+    def table_count(self) -> int:
+        return len(self._tables)
+
+    def resolve(self) -> Tuple[Dict[str, Any], int]:
+        """({"tables", "relationships"}, unresolved count): relationships are renamed to the
+        merged tables' names, deduplicated, and their from-columns flagged as foreign keys"""
+        resolved, seen, unresolved = [], set(), 0
+        for rel in self._relationships:
+            source = self._tables.get(table_key(rel.get("from")))
+            target = self._tables.get(table_key(rel.get("to")))
+            if source is None or target is None:
+                unresolved += 1
+                continue
+            rel = dict(rel, **{"from": source["name"], "to": target["name"]})
+            key = tuple(str(rel.get(k, "")).lower() for k in ("from", "to", "from_column", "to_column"))
+            if key in seen:
+                continue
+            seen.add(key)
+            resolved.append(rel)
+            for column in source.get("columns") or []:
+                if isinstance(column, dict) and str(column.get("name", "")).lower() == str(rel.get("from_column", "")).lower():
+                    column["is_foreign_key"] = True
+        return {"tables": list(self._tables.values()), "relationships": resolved}, unresolved
+
+
+async def _bounded(batches: Iterator[Tuple[List[str], int]], concurrency: int,
+                   worker: Callable[[int, List[str], int], Awaitable[Any]],
+                   on_result: Callable[[int, Any], None]) -> Tuple[int, int]:
+    """Run `worker` over `batches` with at most `concurrency` in flight; returns (batches, failed)"""
+    pending: Dict[asyncio.Future, int] = {}
+    total = failed = 0
+
+    def collect(done: Set[asyncio.Future]):
+        nonlocal failed
+        for future in done:
+            num = pending.pop(future)
+            if future.exception() is not None:
+                failed += 1
+                logger.warning(f"Schema batch {num} failed: {str(future.exception())}")
+            else:
+                on_result(num, future.result())
+
+    try:
+        for batch, tokens in batches:
+            if len(pending) >= concurrency:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+            total += 1
+            pending[asyncio.ensure_future(worker(total, batch, tokens))] = total
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            collect(done)
+    finally:
+        for future in pending:
+            future.cancel()
+    return total, failed
+
+
+class SchemaIngest:
+    """Batches, converts and merges a schema with bounded context per call and bounded work in flight"""
+
+    def __init__(self, batch_tokens: int = 4000, concurrency: int = 4):
+        self.batch_tokens = batch_tokens
+        self.concurrency = concurrency
+        self.counters = {"runs": 0, "table_batches": 0, "split_batches": 0, "relationship_batches": 0, "failed_batches": 0,
+                         "tables": 0, "relationships": 0, "unresolved_relationships": 0}
+
+    async def run(self, sql_files: List[str], relationships_sql: str,
+                  count_tokens: Callable[[str], int], fits: Callable[[int], bool],
+                  convert_tables: Callable[[List[str], int, int], Awaitable[Dict[str, Any]]],
+                  convert_relationships: Callable[[str, int], Awaitable[List[Dict[str, Any]]]]) -> Dict[str, Any]:
+        """Data model for `sql_files`.
+
+        convert_tables(statements, batch_num, tokens) -> {"tables": [...], "truncated": bool};
+        convert_relationships(sql, tokens) -> [relationship, ...]
+        """
+        self.counters["runs"] += 1
+        accumulator = SchemaAccumulator()
+        relationship_statements: List[str] = []
+
+        def table_statements() -> Iterator[str]:
+            for statement in iter_statements(sql_files):
+                if is_relationship_statement(statement):
+                    relationship_statements.append(statement)
+                else:
+                    yield statement
+
+        async def convert(num: int, batch: List[str], tokens: int) -> List[Dict[str, Any]]:
+            try:
+                result = await convert_tables(batch, num, tokens)
+            except ValueError as e:
+                # Nothing usable came back (e.g. cut off before the first table)
+                logger.warning(f"Schema batch {num}: unusable answer for {len(batch)} statements ({str(e)})")
+                result = {"tables": [], "truncated": True}
+            tables = [t for t in result.get("tables") or [] if isinstance(t, dict)]
+            if not result.get("truncated"):
+                return tables
+            converted = {table_key(t.get("name")) for t in tables}
+            missing = [s for s in batch if table_key(created_table_name(s)) not in converted]
+            if not missing:
+                return tables
+            if len(missing) == len(batch):
+                if len(batch) == 1:
+                    raise ValueError(f"could not convert {created_table_name(batch[0]) or 'statement'} in one call")
+                # No progress: halve the batch
+                parts = [missing[:len(missing) // 2], missing[len(missing) // 2:]]
+            else:
+                parts = [missing]
+            self.counters["split_batches"] += len(parts)
+            logger.info(f"Schema batch {num}: answer cut off after {len(tables)} tables, "
+                        f"re-sending {len(missing)} statements in {len(parts)} part(s)")
+            for part in parts:
+                tables.extend(await convert(num, part, sum(count_tokens(s) for s in part)))
+            return tables
+
+        def merge_tables(num: int, tables: List[Dict[str, Any]]):
+            accumulator.add_tables(tables)
+            logger.info(f"Schema batch {num}: {len(tables)} tables ({accumulator.table_count} so far)")
+
+        table_batches, failed = await _bounded(
+            iter_batches(table_statements(), count_tokens, self.batch_tokens, fits), self.concurrency,
+            convert, merge_tables
+        )
+        self.counters["table_batches"] += table_batches
+        self.counters["failed_batches"] += failed
+        if not accumulator.table_count:
+            raise ValueError(f"No tables converted from {table_batches} batches")
+
+        # Final pass: relationships only once every table they may point at is known
+        rel_statements = relationship_statements + list(iter_statements([relationships_sql]))
+        rel_batches, rel_failed = await _bounded(
+            iter_batches(rel_statements, count_tokens, self.batch_tokens, fits), self.concurrency,
+            lambda num, batch, tokens: convert_relationships("\n".join(batch), tokens),
+            lambda num, relationships: accumulator.add_relationships(relationships or [])
+        )
+        self.counters["relationship_batches"] += rel_batches
+        self.counters["failed_batches"] += rel_failed
+
+        model, unresolved = accumulator.resolve()
+        self.counters["tables"] += len(model["tables"])
+        self.counters["relationships"] += len(model["relationships"])
+        self.counters["unresolved_relationships"] += unresolved
+        logger.info(f"Hierarchical ingestion: {len(model['tables'])} tables from {table_batches} batches "
+                    f"({failed} failed, {accumulator.duplicate_tables} duplicates), "
+                    f"{len(model['relationships'])} relationships ({unresolved} unresolved)")
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        return {"batch_tokens": self.batch_tokens, "concurrency": self.concurrency, **self.counters}
+
+
+def build_schema_ingest_from_env() -> SchemaIngest:
+    return SchemaIngest(
+        batch_tokens=int(os.getenv("SCHEMA_BATCH_TOKENS", "4000")),
+        concurrency=int(os.getenv("SCHEMA_INGEST_CONCURRENCY", "4")),
+    )
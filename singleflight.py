@@ -0,0 +1,122 @@
+# singleflight.py - Coalesce identical in-flight async calls onto one execution
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _SharedStream:
+    """Buffered chunks of one upstream stream, replayable by late joiners"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+
+class SingleFlight:
+    """Run at most one upstream call per key; duplicate callers attach to the same task"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self._waiters: Dict[str, int] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def _start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _t, k=key: self._forget(k, _t))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced duplicate in-flight LLM request ({key[:12]})")
+        self._waiters[key] += 1
+        return task
+
+    def _leave(self, key: str, task: asyncio.Task, cancelled: bool):
+        if cancelled and not task.done() and self._waiters.get(key) == 1:
+            # Last interested caller left - free the upstream slot
+            task.cancel()
+        if self._inflight.get(key) is task:
+            self._waiters[key] -= 1
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+            self._streams.pop(key, None)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() once per key, sharing its result or exception with duplicates"""
+        task = self._start(key, fn)
+        cancelled = False
+        try:
+            # Shield so one impatient caller can't cancel the call for everyone else
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            self._leave(key, task, cancelled)
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Iterate fn() once per key; duplicates replay buffered chunks then follow live"""
+        shared = self._streams.get(key) if key in self._inflight else None
+        if shared is None:
+            shared = _SharedStream()
+
+            async def pump():
+                try:
+                    async for chunk in fn():
+                        async with shared.changed:
+                            shared.chunks.append(chunk)
+                            shared.changed.notify_all()
+                except BaseException as e:
+                    shared.error = e
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                finally:
+                    async with shared.changed:
+                        shared.finished = True
+                        shared.changed.notify_all()
+
+            task = self._start(key, pump)
+            self._streams[key] = shared
+        else:
+            task = self._start(key, None)
+
+        index = 0
+        cancelled = False
+        try:
+            while True:
+                async with shared.changed:
+                    await shared.changed.wait_for(lambda: len(shared.chunks) > index or shared.finished)
+                    pending = shared.chunks[index:]
+                    finished = shared.finished
+                for chunk in pending:
+                    yield chunk
+                index += len(pending)
+                if finished and index >= len(shared.chunks):
+                    break
+            if shared.error is not None:
+                raise shared.error
+        except (asyncio.CancelledError, GeneratorExit):
+            cancelled = True
+            raise
+        finally:
+            self._leave(key, task, cancelled)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,92 @@
+# strategy_planner.py - Pick a generation strategy that fits a caller's latency budget
+#
+# Strategies, best output first: a cached full-model answer, the full model, the small
+# fast model, then deterministic local rendering (no LLM). With a budget the planner takes
+# the best strategy whose observed latency percentile fits; without one it keeps the
+# full model. Estimates start from conservative priors and switch to live samples.
+
+import os
+import logging
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from hedging import LatencyTracker
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+STRATEGY_CACHE = "cache"
+STRATEGY_FULL = "full"
+STRATEGY_SMALL = "small_model"
+STRATEGY_LOCAL = "local"
+STRATEGY_LOCAL_FALLBACK = "local_fallback"
+# Served from near_duplicate's index of earlier inputs, before any planning
+STRATEGY_NEAR_DUPLICATE = "near_duplicate"
+
+# LLM strategies in order of preference when no cached answer exists
+LLM_STRATEGIES = (STRATEGY_FULL, STRATEGY_SMALL)
+
+# Seconds assumed before a strategy has enough samples of its own
+DEFAULT_PRIORS: Dict[str, float] = {
+    STRATEGY_CACHE: 0.05,
+    STRATEGY_FULL: 90.0,
+    STRATEGY_SMALL: 20.0,
+    STRATEGY_LOCAL: 0.2,
+}
+
+
+class StrategyPlanner:
+    """Chooses cache / full / small_model / local per request from recorded latencies"""
+
+    def __init__(self, percentile: float = 90.0, min_samples: int = 5,
+                 priors: Optional[Dict[str, float]] = None):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.priors = dict(DEFAULT_PRIORS, **(priors or {}))
+        self.latency = LatencyTracker()
+        self.chosen: Dict[str, int] = {}
+
+    def estimate(self, kind: str, strategy: str) -> float:
+        """Expected seconds for `strategy` on `kind` (the live percentile once sampled enough)"""
+        key = f"{kind}:{strategy}"
+        if self.latency.count(key) < self.min_samples:
+            return self.priors.get(strategy, DEFAULT_PRIORS[STRATEGY_FULL])
+        return self.latency.percentile(key, self.percentile)
+
+    def plan(self, kind: str, budget_seconds: Optional[float], cache_hit: bool) -> str:
+        if cache_hit:
+            strategy = STRATEGY_CACHE
+        elif budget_seconds is None:
+            strategy = STRATEGY_FULL
+        else:
+            strategy = next((s for s in LLM_STRATEGIES if self.estimate(kind, s) <= budget_seconds), STRATEGY_LOCAL)
+            logger.info(f"Planned {kind} within {budget_seconds:.1f}s: {strategy} "
+                        f"(full ~{self.estimate(kind, STRATEGY_FULL):.1f}s, small ~{self.estimate(kind, STRATEGY_SMALL):.1f}s)")
+        key = f"{kind}:{strategy}"
+        self.chosen[key] = self.chosen.get(key, 0) + 1
+        return strategy
+
+    def observe(self, kind: str, strategy: str, seconds: float):
+        # Failed and timed-out attempts count too, so a slow strategy's estimate keeps rising
+        self.latency.observe(f"{kind}:{strategy}", seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "percentile": self.percentile,
+            "chosen": dict(sorted(self.chosen.items())),
+            "estimates_seconds": {
+                key: round(self.estimate(*key.split(":", 1)), 3) for key in sorted(self.latency.keys())
+            },
+        }
+
+
+def build_strategy_planner_from_env() -> StrategyPlanner:
+    return StrategyPlanner(
+        percentile=float(os.getenv("PLANNER_PERCENTILE", "90")),
+        min_samples=int(os.getenv("PLANNER_MIN_SAMPLES", "5")),
+        priors={
+            STRATEGY_FULL: float(os.getenv("PLANNER_PRIOR_FULL_SECONDS", DEFAULT_PRIORS[STRATEGY_FULL])),
+            STRATEGY_SMALL: float(os.getenv("PLANNER_PRIOR_SMALL_SECONDS", DEFAULT_PRIORS[STRATEGY_SMALL])),
+        },
+    )
@@ -3,6 +3,7 @@
 import os
 import json
 import re
+import uuid
 import requests
 import streamlit as st
 import base64
@@ -771,6 +772,9 @@ st.sidebar.markdown(
     unsafe_allow_html=True
 )
 # ─── FastAPI POST helper ─────────────────────────────────────────────────────────
+# 504: our deadline passed while the generation kept running; 503: breaker open or queue full
+RETRY_STATUSES = {503, 504}
+
 def call_api(endpoint, payload, timeout=900, max_retries=2):
     """Helper function to call FastAPI endpoints with retry logic and better timeout handling"""
     import time
@@ -778,7 +782,11 @@ def call_api(endpoint, payload, timeout=900, max_retries=2):
     url = f"{FASTAPI_URL}/{endpoint}"
     headers = {
         "Authorization": f"Bearer {API_TOKEN}",
-        "Content-Type":  "application/json"
+        "Content-Type":  "application/json",
+        # The backend sizes its LLM calls to this and stops work once we stop waiting
+        "X-Request-Timeout": str(timeout),
+        # Same key on every retry: the backend attaches to the running generation instead of starting another
+        "Idempotency-Key": str(uuid.uuid4())
     }
     
     for attempt in range(max_retries + 1):
@@ -795,9 +803,11 @@ def call_api(endpoint, payload, timeout=900, max_retries=2):
             
             elapsed_time = time.time() - start_time
             
+            if r.status_code in RETRY_STATUSES and attempt < max_retries:
+                # Deadline hit or backend overloaded - the retry attaches to (or restarts) the generation
+                continue
             if r.status_code != 200:
-                if attempt == max_retries:  # Last attempt
-                    st.error(f"❌ {endpoint} error {r.status_code}: {r.text}")
+                st.error(f"❌ {endpoint} error {r.status_code}: {r.text}")
                 return {}
             return r.json()
             
@@ -839,6 +849,60 @@ def call_api(endpoint, payload, timeout=900, max_retries=2):
     
     return {}
 
+def call_api_stream(endpoint, payload, timeout=900, render=None, on_event=None):
+    """Call a FastAPI SSE endpoint, passing accumulated text to render() as tokens arrive.
+
+    Other events (e.g. generate-sprint's "story") go to on_event(event, data).
+    """
+    url = f"{FASTAPI_URL}/{endpoint}/stream"
+    headers = {
+        "Authorization": f"Bearer {API_TOKEN}",
+        "Content-Type":  "application/json",
+        # No X-Request-Timeout: `timeout` is the gap allowed between chunks, not a total budget
+        "Accept":        "text/event-stream"
+    }
+
+    text = ""
+    try:
+        # (connect, read) timeout - the read timeout applies between chunks, and the
+        # server sends keep-alive comments, so long generations no longer time out
+        with requests.post(url, headers=headers, json=payload, stream=True, timeout=(10, timeout)) as r:
+            if r.status_code != 200:
+                st.error(f"❌ {endpoint} error {r.status_code}: {r.text}")
+                return {}
+
+            event = "message"
+            for line in r.iter_lines(decode_unicode=True):
+                if not line:
+                    event = "message"
+                    continue
+                if line.startswith(":"):
+                    continue
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                    continue
+                if not line.startswith("data:"):
+                    continue
+
+                data = json.loads(line[len("data:"):].strip())
+                if event == "token":
+                    text += data.get("text", "")
+                    if render:
+                        render(text)
+                elif event == "done":
+                    return data
+                elif event == "error":
+                    st.error(f"❌ {endpoint} error: {data.get('detail', 'unknown error')}")
+                    return {}
+                elif on_event:
+                    on_event(event, data)
+    except requests.exceptions.Timeout:
+        st.error(f"❌ **TIMEOUT DETECTED**: No data received from {endpoint} for {timeout}s")
+    except requests.exceptions.RequestException as e:
+        st.error(f"❌ Connection error: {str(e)}")
+
+    return {}
+
 # ─── AI Vision Helper Functions ──────────────────────────────────────────────────
 def optimize_image_for_analysis(uploaded_file):
     """Optimize image for faster AI analysis while maintaining quality for GPT-4o Vision"""
@@ -934,6 +998,7 @@ def upload_and_analyze_image(uploaded_file, platform, analysis_type="ai_vision")
                     f"{FASTAPI_URL}/analyze-image",
                     files=files,
                     data=data,
+                    headers={"X-Request-Timeout": "900", "Idempotency-Key": str(uuid.uuid4())},
                     timeout=900  # Increased to 15 minutes to match backend (was working before)
                 )
                 # Clear the processing message on success
@@ -996,6 +1061,7 @@ def upload_and_analyze_image(uploaded_file, platform, analysis_type="ai_vision")
             response = requests.post(
                 f"{FASTAPI_URL}/detect-layout",
                 files=files,
+                headers={"X-Request-Timeout": "600"},
                 timeout=600  # 10 minutes - matches backend
             )
             
@@ -1176,14 +1242,11 @@ CREATE TABLE customers (
                 st.markdown("""
                 **📋 For large schemas:**
                 - ✅ Processing may take 2-5 minutes
-                - ✅ Consider starting with core tables first
-                - ✅ You can always add more tables later
-                - ✅ Enterprise schemas work best with manual JSON editing
+                - ✅ Standard CREATE TABLE statements are converted locally, instantly
+                - ✅ Anything else is processed in batches and merged, whatever the schema size
+                - ✅ Relationships are resolved once all tables are in
                 """)
                 
-                if len(ddl_files) > 10:
-                    st.info("💡 **Tip:** Try uploading 5-10 most important tables first, then expand your model later.")
-                
                 proceed = st.checkbox("I understand this may take several minutes to process")
                 if not proceed:
                     st.stop()
@@ -2115,8 +2178,10 @@ Provide comprehensive data preparation instructions with:
                         progress_placeholder.text("🤖 Generating AI-powered instructions...")
                         progress_bar.progress(50)
                         
-                        # Use fewer retries with longer timeouts (was working before)
-                        resp = call_api("generate-layout", enhanced_payload, timeout=timeout, max_retries=0)
+                        # Stream tokens so instructions render while the model is still writing
+                        live_output = st.empty()
+                        resp = call_api_stream("generate-layout", enhanced_payload, timeout=timeout, render=live_output.markdown)
+                        live_output.empty()
                         
                         progress_bar.progress(90)
                         progress_placeholder.text("📝 Finalizing instructions...")
@@ -2359,7 +2424,9 @@ Bottom: Detailed sales table by store"""
                     is_complex = len(tables) > 10 or total_columns > 100
                     
                     timeout = 240 if is_complex else 150  # 4 minutes for complex, 2.5 for others
-                    out = call_api("generate-layout", {
+                    # Stream the markdown so the first instructions show up within seconds
+                    live_output = st.empty()
+                    out = call_api_stream("generate-layout", {
                         "sketch_description": desc,
                         "platform_selected": platform,
                         "custom_prompt": prompt,
@@ -2368,8 +2435,9 @@ Bottom: Detailed sales table by store"""
                         "data_prep_only": False,
                         "kpi_list": state.kpi_list,
                         "data_dictionary": state.data_dictionary
-                    }, timeout=timeout)
-                    
+                    }, timeout=timeout, render=live_output.markdown)
+                    live_output.empty()
+
                     state.wireframe_json = out.get("wireframe_json", "")
                     state.dev_instructions = out.get("layout_instructions", "")
             elif go and not desc.strip():
@@ -2421,7 +2489,8 @@ Bottom: Detailed sales table by store"""
                             is_complex = len(tables) > 10 or total_columns > 100
                             
                             timeout = 240 if is_complex else 150  # 4 minutes for complex, 2.5 for others
-                            out = call_api("generate-layout", {
+                            live_output = st.empty()
+                            out = call_api_stream("generate-layout", {
                                 "sketch_description": state.ai_analysis_result,
                                 "platform_selected": platform,
                                 "custom_prompt": enhanced_prompt,
@@ -2430,7 +2499,8 @@ Bottom: Detailed sales table by store"""
                                 "data_prep_only": False,
                                 "kpi_list": state.kpi_list,
                                 "data_dictionary": state.data_dictionary
-                            }, timeout=timeout)
+                            }, timeout=timeout, render=live_output.markdown)
+                            live_output.empty()
                             
                             state.wireframe_json = out.get("wireframe_json", "")
                             state.dev_instructions = out.get("layout_instructions", "")
@@ -2774,7 +2844,18 @@ elif state.page == "Sprint Board":
 - Sprint Length: {sprint_length} days
 """
                         
-                        spr = call_api("generate-sprint", {
+                        live_output = st.empty()
+                        live_stories = []
+                        
+                        def show_story(event, data):
+                            # Each story is shown as soon as the server has parsed it
+                            if event != "story":
+                                return
+                            story = data.get("story", {})
+                            live_stories.append(f"- **{story.get('title', 'Untitled')}** ({story.get('points', '?')} pts)")
+                            live_output.markdown(f"**{len(live_stories)} stories so far**\n" + "\n".join(live_stories))
+                        
+                        spr = call_api_stream("generate-sprint", {
                             "wireframe_json": wf_json,
                             "layout_instructions": enhanced_instructions,
                             "sprint_length_days": sprint_length,
@@ -2783,7 +2864,11 @@ elif state.page == "Sprint Board":
                             "points_per_resource": points_per_resource,
                             "experience_level": experience_level,
                             "priority_focus": priority_focus
-                        })
+                        }, render=lambda text: None if live_stories else live_output.code(text[-2000:], language="json"),
+                           on_event=show_story)
+                        live_output.empty()
+                        if spr.get("truncated"):
+                            st.warning(f"⚠️ The AI response was cut off; keeping the {len(spr.get('sprint_stories', []))} complete stories.")
                         
                         # Store enhanced response data
                         state.sprint_stories = spr.get("sprint_stories", [])
@@ -0,0 +1,114 @@
+# table_cache.py - Converted tables cached by the content hash of their CREATE TABLE statement
+#
+# Re-uploading a schema after editing one table should only convert that table. Each
+# statement is normalized (comments dropped, whitespace collapsed, keywords lower-cased -
+# see ddl_parser) and hashed; the table JSON the model produced for it, plus the
+# relationships its inline foreign keys gave, are stored under that hash in the same two
+# tiers as llm_cache (memory LRU + SQLite, in a file of their own). Only statements the
+# local parser can't read reach the LLM, so only those are cached.
+
+import os
+import json
+import hashlib
+import logging
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from ddl_parser import KEYWORDS, created_table_name, split_statements, tokenize
+from llm_cache import PROMPT_TEMPLATE_VERSION, LLMResponseCache, MemoryLRU, SQLiteTier
+from schema_ingest import table_key
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+
+def normalize_statement(statement: str) -> str:
+    """Comment-, whitespace- and keyword-case-insensitive form of one statement (identifier case is kept)"""
+    return " ".join(" ".join(token.text.lower() if token.upper in KEYWORDS else token.text for token in tokenize(part))
+                    for part in split_statements(statement))
+
+
+def statement_hash(statement: str) -> str:
+    canonical = f"{PROMPT_TEMPLATE_VERSION}\n{normalize_statement(statement)}"
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _decode_entry(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    """A stored entry, or None when there is none or it can't be read (a miss either way)"""
+    if value is None:
+        return None
+    try:
+        entry = json.loads(value)
+    except ValueError:
+        entry = None
+    if isinstance(entry, dict) and isinstance(entry.get("table"), dict):
+        return entry
+    logger.warning(f"Ignoring unreadable table cache entry: {value[:80]!r}")
+    return None
+
+
+class TableCache:
+    """Per-statement store of converted tables: lookup before conversion, store after"""
+
+    def __init__(self, store: LLMResponseCache):
+        self.store = store
+
+    async def lookup(self, statements: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
+        """(cached tables, their relationships, statements still to convert)"""
+        tables, relationships, misses = [], [], []
+        for statement in statements:
+            entry = _decode_entry(await self.store.aget(statement_hash(statement)))
+            if entry is None:
+                misses.append(statement)
+                continue
+            tables.append(entry["table"])
+            relationships.extend(entry.get("relationships") or [])
+        if statements:
+            logger.info(f"Table cache: {len(statements) - len(misses)}/{len(statements)} statements already converted")
+        return tables, relationships, misses
+
+    async def store_converted(self, statements: List[str], tables: List[Dict[str, Any]],
+                              relationships: Optional[List[Dict[str, Any]]] = None) -> int:
+        """Cache each statement's table (matched by name); returns how many were stored"""
+        by_name = {table_key(t.get("name")): t for t in tables if isinstance(t, dict)}
+        stored = 0
+        for statement in statements:
+            name = table_key(created_table_name(statement))
+            table = by_name.get(name) if name else None
+            if table is None:
+                continue
+            # Only the statement's own foreign keys; relationships_sql may change independently
+            text = normalize_statement(statement).lower()
+            own = [r for r in relationships or [] if isinstance(r, dict) and table_key(r.get("from")) == name
+                   and "references" in text and table_key(r.get("to")) in text]
+            await self.store.aset(statement_hash(statement), json.dumps({"table": table, "relationships": own}))
+            stored += 1
+        return stored
+
+    def stats(self) -> Dict[str, Any]:
+        return self.store.stats()
+
+    async def astats(self) -> Dict[str, Any]:
+        return await self.store.astats()
+
+
+def build_table_cache_from_env() -> TableCache:
+    enabled = os.getenv("TABLE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    memory = MemoryLRU(
+        max_entries=int(os.getenv("TABLE_CACHE_MEMORY_ENTRIES", "2000")),
+        ttl_seconds=float(os.getenv("TABLE_CACHE_TTL_SECONDS", str(30 * 86400))),
+    )
+    disk = None
+    disk_path = os.getenv("TABLE_CACHE_PATH", ".cache/table_cache.sqlite3")
+    if enabled and disk_path:
+        try:
+            disk = SQLiteTier(
+                disk_path,
+                max_entries=int(os.getenv("TABLE_CACHE_DISK_ENTRIES", "50000")),
+                ttl_seconds=float(os.getenv("TABLE_CACHE_TTL_SECONDS", str(30 * 86400))),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Table cache disk tier disabled: {str(e)}")
+    return TableCache(LLMResponseCache(memory, disk, enabled=enabled))
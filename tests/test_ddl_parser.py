@@ -0,0 +1,149 @@
+import os
+import time
+import asyncio
+from pathlib import Path
+
+import httpx
+
+import ddl_parser
+
+DDL_DIR = Path(__file__).resolve().parent.parent / "test_cases" / "retail_cpg_sales" / "ddl"
+TABLE_FILES = ["01_products.sql", "02_customers.sql", "03_stores.sql", "04_sales_transactions.sql",
+               "05_inventory_movements.sql"]
+TABLES = {"products", "customers", "stores", "sales_transactions", "inventory_movements"}
+
+
+def read(name: str) -> str:
+    return (DDL_DIR / name).read_text(encoding="utf-8")
+
+
+def columns_of(schema: ddl_parser.ParsedSchema, table: str):
+    return {c["name"]: c for t in schema.tables if t["name"] == table for c in t["columns"]}
+
+
+def relationship_keys(relationships):
+    return {(r["from"], r["from_column"], r["to"], r["to_column"]) for r in relationships}
+
+
+# ─── Test case schema ────────────────────────────────────────────────────────────
+def test_test_case_ddl_parses_locally_in_milliseconds():
+    sql = [read(name) for name in TABLE_FILES]
+    start = time.perf_counter()
+    schema = ddl_parser.parse_schema(sql)
+    elapsed = time.perf_counter() - start
+
+    assert {t["name"] for t in schema.tables} == TABLES
+    assert len(schema.relationships) == 4
+    assert schema.unparsed == [] and schema.unparsed_relationships == []
+    assert elapsed < 0.1
+
+
+def test_complete_schema_file_matches_the_split_files():
+    split = ddl_parser.parse_schema([read(name) for name in TABLE_FILES])
+    complete = ddl_parser.parse_schema([read("00_retail_cpg_complete_schema.sql")])
+    assert {t["name"] for t in complete.tables} == TABLES
+    assert complete.unparsed == []
+    assert relationship_keys(complete.relationships) == relationship_keys(split.relationships)
+
+
+def test_relationship_files_agree():
+    keys = ddl_parser.parse_schema([read(name) for name in TABLE_FILES]).keys
+    parsed = {name: ddl_parser.parse_relationships(read(name), keys)
+              for name in ("06_relationships.sql", "relationships_simple.sql", "relationships.json")}
+    expected = relationship_keys(parsed["relationships.json"].relationships)
+    assert len(expected) == 4
+    for name, result in parsed.items():
+        assert result.unparsed == [], name
+        assert relationship_keys(result.relationships) == expected, name
+
+
+def test_generate_model_makes_no_llm_call(monkeypatch):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+    import llm_gateway
+    import main
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("the test case DDL must not reach the LLM")
+
+    monkeypatch.setattr(llm_gateway, "chat", no_llm)
+    monkeypatch.setattr(llm_gateway, "chat_stream", no_llm)
+
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/v1/generate-model", json={
+                "tables_sql": [read(name) for name in TABLE_FILES],
+                "relationships_sql": read("relationships.json"),
+            })
+
+    response = asyncio.run(post())
+    assert response.status_code == 200
+    model = response.json()["data_model"]
+    assert {t["name"] for t in model["tables"]} == TABLES
+    assert len(model["relationships"]) == 4
+    sales = {c["name"]: c for t in model["tables"] if t["name"] == "sales_transactions" for c in t["columns"]}
+    assert sales["product_id"]["is_foreign_key"]
+
+
+# ─── Dialects ────────────────────────────────────────────────────────────────────
+def test_bracket_identifiers():
+    schema = ddl_parser.parse_schema([
+        "CREATE TABLE [dbo].[Order Lines] ([Line ID] INT NOT NULL PRIMARY KEY, "
+        "[Order ID] INT REFERENCES [dbo].[Orders]([Order ID]));"
+    ])
+    columns = columns_of(schema, "Order Lines")
+    assert columns["Line ID"]["is_primary_key"]
+    assert columns["Order ID"]["is_foreign_key"]
+    assert relationship_keys(schema.relationships) == {("Order Lines", "Order ID", "Orders", "Order ID")}
+
+
+def test_backtick_identifiers():
+    schema = ddl_parser.parse_schema([
+        "CREATE TABLE `shop`.`orders` (`order_id` BIGINT AUTO_INCREMENT, `placed_at` DATETIME, "
+        "PRIMARY KEY (`order_id`)) ENGINE=InnoDB;"
+    ])
+    columns = columns_of(schema, "orders")
+    assert columns["order_id"]["type"] == "int" and columns["order_id"]["is_primary_key"]
+    assert columns["placed_at"]["type"] == "date"
+
+
+def test_quoted_identifiers():
+    schema = ddl_parser.parse_schema([
+        'CREATE TABLE "Sales"."Customer" ("Customer Id" INTEGER PRIMARY KEY, "Full Name" VARCHAR(100));'
+    ])
+    columns = columns_of(schema, "Customer")
+    assert columns["Customer Id"]["is_primary_key"]
+    assert columns["Full Name"]["type"] == "string"
+
+
+def test_decimal_with_precision_and_scale():
+    schema = ddl_parser.parse_schema([
+        "CREATE TABLE prices (sku VARCHAR(20), amount DECIMAL(10, 2) NOT NULL, qty NUMBER(10), rate NUMBER(18,4));"
+    ])
+    columns = columns_of(schema, "prices")
+    assert [columns[name]["type"] for name in ("sku", "amount", "qty", "rate")] == ["string", "decimal", "int", "decimal"]
+    assert columns["amount"]["nullable"] is False
+
+
+def test_composite_primary_key():
+    schema = ddl_parser.parse_schema([
+        "CREATE TABLE order_lines (order_id INT, line_no INT, qty INT, PRIMARY KEY (order_id, line_no));"
+    ])
+    columns = columns_of(schema, "order_lines")
+    assert [name for name, c in columns.items() if c["is_primary_key"]] == ["order_id", "line_no"]
+    assert schema.keys["order_lines"] == [["order_id", "line_no"]]
+
+    # A foreign key over the whole composite key is one-to-one
+    relationships = ddl_parser.parse_relationships(
+        "ALTER TABLE order_lines ADD CONSTRAINT fk_shipment FOREIGN KEY (order_id, line_no) "
+        "REFERENCES shipments (order_id, line_no);", schema.keys
+    ).relationships
+    assert {r["type"] for r in relationships} == {"one-to-one"}
+    assert len(relationships) == 2
+
+
+def test_create_table_as_select_is_left_for_the_llm():
+    statement = "CREATE TABLE top_customers AS SELECT * FROM customers WHERE spend > 100"
+    schema = ddl_parser.parse_schema([statement + ";"])
+    assert schema.tables == []
+    assert schema.unparsed == [statement + ";"]
@@ -0,0 +1,41 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+import request_deadline
+from idempotency import IdempotencyMiddleware, IdempotencyStore
+from request_deadline import DeadlineMiddleware
+
+
+def make_app(store: IdempotencyStore, calls: list) -> DeadlineMiddleware:
+    app = FastAPI()
+
+    @app.post("/api/v1/generate-layout")
+    async def generate():
+        calls.append(request_deadline.remaining())
+        await asyncio.sleep(0.6)
+        return {"ok": True}
+
+    return DeadlineMiddleware(IdempotencyMiddleware(app, store=store, paths=["/api/v1/generate-layout"]), margin=0.0)
+
+
+def test_retry_after_deadline_attaches_to_the_running_execution():
+    calls = []
+    store = IdempotencyStore(orphan_grace=5.0)
+    app = make_app(store, calls)
+    headers = {"X-Request-Timeout": "0.3", "Idempotency-Key": "layout-1"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.post("/api/v1/generate-layout", headers=headers, json={})
+            retry = await client.post("/api/v1/generate-layout", headers=dict(headers, **{"X-Request-Timeout": "5"}), json={})
+            return first, retry
+
+    first, retry = asyncio.run(scenario())
+    assert first.status_code == 504
+    assert retry.status_code == 200 and retry.json() == {"ok": True}
+    # One execution, with the first caller's deadline extended by the orphan grace
+    assert len(calls) == 1 and 5.0 < calls[0] <= 5.3
+    assert store.attached == 1
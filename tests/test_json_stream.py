@@ -0,0 +1,27 @@
+import pytest
+
+from json_stream import ArrayElementStream, parse_with_salvage
+
+
+def test_complete_document_is_returned_as_is():
+    assert parse_with_salvage('{"sprint_stories": [{"a": 1}]}', "sprint_stories") == {"sprint_stories": [{"a": 1}]}
+
+
+def test_truncated_array_keeps_complete_elements():
+    text = '{"sprint_stories": [{"a": 1}, {"b": [2, 3]}, {"c": "cut off mid-'
+    assert parse_with_salvage(text, "sprint_stories") == {"sprint_stories": [{"a": 1}, {"b": [2, 3]}], "truncated": True}
+
+
+def test_nothing_to_salvage_raises():
+    with pytest.raises(ValueError):
+        parse_with_salvage('{"sprint_stories": [{"a": ', "sprint_stories")
+
+
+def test_elements_arrive_as_they_complete():
+    stream = ArrayElementStream("tables")
+    completed = []
+    # Brackets and commas inside strings don't end an element
+    for char in '{"tables": [{"name": "a, ]}"}, {"name": "b"}], "relationships": []}':
+        completed += stream.feed(char)
+    assert completed == [{"name": "a, ]}"}, {"name": "b"}]
+    assert stream.array_closed
@@ -0,0 +1,52 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+import request_deadline
+from request_deadline import DeadlineMiddleware
+
+
+def make_app(duration: float) -> FastAPI:
+    app = FastAPI()
+
+    async def events():
+        # Ticks well inside any between-chunk timeout, but longer than the header in total
+        for i in range(int(duration / 0.1)):
+            await asyncio.sleep(0.1)
+            yield f"event: token\ndata: {{\"left\": {request_deadline.remaining()!r}}}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    @app.post("/api/v1/generate-layout/stream")
+    async def stream():
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/api/v1/generate-layout")
+    async def plain():
+        await asyncio.sleep(duration)
+        return {"ok": True}
+
+    return DeadlineMiddleware(app, margin=0.0)
+
+
+async def post(app, path: str, headers):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post(path, headers=headers)
+
+
+def test_stream_runs_past_request_timeout_header():
+    app = make_app(duration=1.0)
+    response = asyncio.run(post(app, "/api/v1/generate-layout/stream",
+                                {"X-Request-Timeout": "0.3", "Accept": "text/event-stream"}))
+    assert response.status_code == 200
+    assert response.text.rstrip().endswith("event: done\ndata: {}")
+    # LLM calls made while streaming are not cut to the header either
+    assert '"left": None' in response.text
+
+
+def test_plain_request_still_gets_504_at_its_deadline():
+    app = make_app(duration=1.0)
+    response = asyncio.run(post(app, "/api/v1/generate-layout", {"X-Request-Timeout": "0.3"}))
+    assert response.status_code == 504
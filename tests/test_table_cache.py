@@ -0,0 +1,43 @@
+import asyncio
+
+from llm_cache import LLMResponseCache, MemoryLRU
+from table_cache import TableCache, statement_hash
+
+UPPER = 'CREATE TABLE "Orders" (Order_Id INT NOT NULL PRIMARY KEY, amount DECIMAL(10,2) REFERENCES x(id))'
+LOWER = 'create table "Orders" (\n  Order_Id int not null primary key, -- key\n  amount decimal(10, 2) references x(id))'
+
+
+def make_cache() -> TableCache:
+    return TableCache(LLMResponseCache(MemoryLRU(max_entries=10, ttl_seconds=60), None))
+
+
+def test_keyword_case_comments_and_whitespace_dont_change_the_hash():
+    assert statement_hash(UPPER) == statement_hash(LOWER)
+    # Identifiers keep their case
+    assert statement_hash(UPPER) != statement_hash(UPPER.replace("Order_Id", "order_id"))
+    assert statement_hash(UPPER) != statement_hash(UPPER.replace('"Orders"', '"orders"'))
+
+
+def test_stored_table_is_found_under_other_keyword_casing():
+    cache = make_cache()
+
+    async def scenario():
+        await cache.store_converted([UPPER], [{"name": "Orders", "columns": []}])
+        return await cache.lookup([LOWER])
+
+    tables, relationships, misses = asyncio.run(scenario())
+    assert tables == [{"name": "Orders", "columns": []}]
+    assert misses == []
+
+
+def test_unreadable_entry_is_a_miss():
+    cache = make_cache()
+    other = "CREATE TABLE z (a INT)"
+
+    async def scenario():
+        await cache.store.aset(statement_hash(UPPER), "{not json")
+        await cache.store.aset(statement_hash(other), "[1, 2]")
+        return await cache.lookup([UPPER, other])
+
+    tables, relationships, misses = asyncio.run(scenario())
+    assert tables == [] and misses == [UPPER, other]
@@ -0,0 +1,158 @@
+# token_budget.py - Tokenizer-backed prompt counting and context-window budgeting
+#
+# Counts with tiktoken (a core requirement). If the import fails or its encoding files
+# can't be loaded (e.g. offline), falls back to a conservative character heuristic so
+# budgets err on the safe side.
+
+import math
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # Broken install - counted with the heuristic below
+    tiktoken = None
+
+# ─── Model limits ───────────────────────────────────────────────────────────────
+CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4": 8192,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+
+MAX_OUTPUT_TOKENS: Dict[str, int] = {
+    "gpt-4": 8192,
+    "gpt-4o": 16384,
+    "gpt-4o-mini": 16384,
+    "gpt-3.5-turbo": 4096,
+}
+
+DEFAULT_CONTEXT_WINDOW = 8192
+DEFAULT_MAX_OUTPUT = 4096
+
+# Chat format overhead per message and for priming the reply (OpenAI cookbook)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+# Flat cost of one high-detail image part
+IMAGE_TOKENS = 1000
+# Kept free for tokenizer drift between our count and the provider's
+SAFETY_MARGIN = 64
+# Fallback when no tokenizer is available - DDL and JSON run ~3 chars/token, prose ~4
+HEURISTIC_CHARS_PER_TOKEN = 3.0
+
+_encoders: Dict[str, Any] = {}
+_tokenizer_failed = False
+
+
+class ContextOverflowError(ValueError):
+    """The prompt leaves no room for the minimum completion in the model's window"""
+
+    def __init__(self, model: str, prompt_tokens: int, window: int):
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.window = window
+        super().__init__(f"Prompt needs {prompt_tokens:,} tokens; {model} context window is {window:,}")
+
+
+def context_window(model: str) -> int:
+    return CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def max_output_tokens(model: str) -> int:
+    return MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT)
+
+
+def _encoder(model: str):
+    global _tokenizer_failed
+    if tiktoken is None or _tokenizer_failed:
+        return None
+    if model not in _encoders:
+        try:
+            try:
+                _encoders[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encoders[model] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # Encoding files are downloaded on first use; offline hosts fall back for good
+            _tokenizer_failed = True
+            logger.warning(f"tiktoken unavailable ({str(e)}); using ~{HEURISTIC_CHARS_PER_TOKEN} chars/token")
+            return None
+    return _encoders[model]
+
+
+def tokenizer_name(model: str = "gpt-4o") -> str:
+    encoder = _encoder(model)
+    return f"tiktoken:{encoder.name}" if encoder is not None else "heuristic"
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Tokens in a plain string for `model`"""
+    if not text:
+        return 0
+    encoder = _encoder(model)
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / HEURISTIC_CHARS_PER_TOKEN)
+
+
+def count_message_tokens(messages: List[Dict[str, Any]], model: str = "gpt-4o") -> int:
+    """Prompt tokens for a chat request, including per-message framing and image parts"""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + count_tokens(str(message.get("role", "")), model)
+        content = message.get("content", "")
+        if isinstance(content, list):
+            for part in content:
+                if part.get("type") == "image_url":
+                    total += IMAGE_TOKENS
+                else:
+                    total += count_tokens(str(part.get("text", "")), model)
+        else:
+            total += count_tokens(str(content or ""), model)
+    return total
+
+
+def prompt_budget(model: str, reserve_completion: int) -> int:
+    """Prompt tokens available once `reserve_completion` is set aside for the answer"""
+    return max(0, context_window(model) - reserve_completion - SAFETY_MARGIN)
+
+
+def completion_budget(messages: List[Dict[str, Any]], model: str, desired: Optional[int] = None,
+                      minimum: int = 256) -> int:
+    """max_tokens that fits the real remaining window, capped at `desired` and the model's output limit.
+
+    Raises ContextOverflowError if fewer than `minimum` tokens remain.
+    """
+    prompt_tokens = count_message_tokens(messages, model)
+    remaining = context_window(model) - prompt_tokens - SAFETY_MARGIN
+    if remaining < minimum:
+        raise ContextOverflowError(model, prompt_tokens, context_window(model))
+    budget = min(remaining, max_output_tokens(model))
+    if desired is not None:
+        budget = min(budget, max(desired, minimum))
+    return budget
+
+
+def pack(items: Iterable[Any], budget_tokens: int, model: str = "gpt-4o",
+         render=str) -> Tuple[List[Any], int, int]:
+    """Greedily keep items (in order) whose rendered text fits `budget_tokens`.
+
+    Returns (kept_items, tokens_used, dropped_count); items that don't fit are skipped
+    so smaller later items can still use the space.
+    """
+    kept, used, dropped = [], 0, 0
+    for item in items:
+        cost = count_tokens(render(item), model) + 1  # +1 for the separator
+        if used + cost <= budget_tokens:
+            kept.append(item)
+            used += cost
+        else:
+            dropped += 1
+    return kept, used, dropped
+
+
+def stats() -> Dict[str, Any]:
+    return {"tokenizer": tokenizer_name(), "safety_margin": SAFETY_MARGIN}
@@ -1,7 +1,4 @@
-import openai
-import os
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from llm_gateway import chat_sync
 
 def generate_wireframe_json_from_description(description: str) -> str:
     prompt = f"""You are a dashboard assistant. A wireframe layout was described as:
@@ -17,14 +14,10 @@ Return a JSON object with:
 
 Only return valid JSON. No explanation."""
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[
+    return chat_sync(
+        [
             {"role": "system", "content": "You convert layout sketches to structured JSON for dashboards."},
             {"role": "user", "content": prompt}
         ],
-        temperature=0.3,
-        max_tokens=500
-    )
-
-    return response['choices'][0]['message']['content']
\ No newline at end of file
+        task="wireframe"
+    )
\ No newline at end of file